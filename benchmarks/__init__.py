@@ -0,0 +1,9 @@
+"""Benchmarks of the mod_mongo_live_config hot paths.
+
+They need alignak to be importable, and are run as modules, for example:
+
+    python -m benchmarks.bench_setattr
+
+bench_suite measures the whole module on a synthetic configuration, see
+synthetic, and writes its results as JSON to compare revisions.
+"""
@@ -0,0 +1,129 @@
+"""Benchmark of the dirty attributes tracking: memory and time needed to
+record the changes of a flush window of 100k services, with per object
+sets of attributes names and with the ChangeBuffer attributes masks.
+"""
+
+from __future__ import print_function
+
+import sys
+import timeit
+
+from alignak.objects.service import Service
+
+from mod_mongo_live_config.change_buffer import ChangeBuffer
+from mod_mongo_live_config.sanitize import types_infos
+
+try:
+    xrange
+except NameError:
+    xrange = range
+
+#############################################################################
+
+# what a check result typically changes on a service:
+CHECK_RESULT_ATTRIBUTES = (
+    'state', 'state_id', 'last_chk', 'next_chk', 'output', 'perf_data',
+    'latency', 'execution_time', 'attempt', 'last_state_change',
+)
+
+
+class SetsChangeBuffer(ChangeBuffer):
+    """The former tracking: a single buffer, with a set of attributes
+    names per object."""
+
+    def __init__(self):
+        super(SetsChangeBuffer, self).__init__()
+        self._current = self.make_objects_updates()
+
+    def add(self, cls, obj, attr):
+        while True:
+            generation = self._generation
+            objects = self._current[cls]
+            attrs = objects.get(obj)
+            if attrs is None:
+                attrs = objects.setdefault(obj, set())
+                self._new_pending()
+            attrs.add(attr)
+            if generation == self._generation:
+                return
+
+    def pending(self):
+        return [self._current]
+
+    def swap(self):
+        previous = self._current
+        self._current = self.make_objects_updates()
+        self._generation += 1
+        res = {}
+        for cls, objects in list(previous.items()):
+            res[cls] = dict((obj, frozenset(attrs))
+                            for obj, attrs in list(objects.items()))
+        return res
+
+
+class MasksChangeBuffer(ChangeBuffer):
+
+    def pending(self):
+        return self._buffers
+
+
+def deep_size(buffers):
+    """Size of the pending structures, without the objects and the
+    attributes names which are shared with the rest of the process."""
+    size = 0
+    for buf in buffers:
+        size += sys.getsizeof(buf)
+        for objects in buf.values():
+            size += sys.getsizeof(objects)
+            for value in objects.values():
+                size += sys.getsizeof(value)
+    return size
+
+
+def record_window(buf, objects):
+    for obj in objects:
+        for attr in CHECK_RESULT_ATTRIBUTES:
+            buf.add(Service, obj, attr)
+
+
+def measure(make_buffer, objects, repeat=3):
+    best_time = None
+    size = None
+    for _ in xrange(repeat):
+        buf = make_buffer()
+        t0 = timeit.default_timer()
+        record_window(buf, objects)
+        elapsed = timeit.default_timer() - t0
+        size = deep_size(buf.pending())
+        t0 = timeit.default_timer()
+        buf.swap()
+        elapsed += timeit.default_timer() - t0
+        if best_time is None or elapsed < best_time:
+            best_time = elapsed
+    return best_time, size
+
+
+def run(n_services=100000):
+    """Return a dict: method -> (seconds per window, bytes pending)."""
+    # only the objects identity matters here:
+    objects = [object() for _ in xrange(n_services)]
+    index = {Service: types_infos[Service].attributes_index}
+    return {
+        'sets': measure(SetsChangeBuffer, objects),
+        'masks': measure(lambda: MasksChangeBuffer(None, index), objects),
+    }
+
+
+def main():
+    n_services = 100000
+    results = run(n_services)
+    print("%d dirty services, %d attributes each:" % (
+        n_services, len(CHECK_RESULT_ATTRIBUTES)))
+    print("%-6s %12s %14s" % ('', 'time', 'memory'))
+    for name in ('sets', 'masks'):
+        elapsed, size = results[name]
+        print("%-6s %9.1f ms %11.1f MB" % (name, elapsed * 1e3, size / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark of the dump documents throughput, in documents per second, when
+the documents are sent to pymongo as dicts and as RawBSONDocument.
+
+With dump_processes the documents cross a pipe, pickled, from the processes
+to the arbiter, which then has pymongo encode them: the arbiter process is
+the bottleneck, so its share of the work is measured apart. In a single
+process the encoding is the same walk either way, the raw documents only
+add their wrapping, which is why raw_documents applies to the processes.
+"""
+
+from __future__ import print_function
+
+import pickle
+import timeit
+
+import bson
+from alignak.objects.module import Module
+from alignak.objects.service import Service
+
+import mod_mongo_live_config
+from mod_mongo_live_config.raw_documents import encode_document, raw_document
+from mod_mongo_live_config.sanitize import types_infos
+
+from benchmarks.bench_sanitize import make_population
+
+#############################################################################
+
+
+def make_documents(module, services):
+    infos = types_infos[Service]
+    return [module._make_document(Service, infos, srv) for srv in services]
+
+
+def best_time(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = timeit.default_timer()
+        func()
+        elapsed = timeit.default_timer() - t0
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def run(n_hosts=200, services_per_host=20):
+    """Return a dict: (step, method) -> documents per second."""
+    module = mod_mongo_live_config.get_instance(Module({
+        'module_alias': 'bench', 'module_type': 'mongo_live_config',
+        'backend': 'memory'}))
+    _, services = make_population(n_hosts, services_per_host)
+    documents = make_documents(module, services)
+    n_documents = len(documents)
+    protocol = pickle.HIGHEST_PROTOCOL
+
+    pickled_dicts = pickle.dumps(documents, protocol)
+    encoded = [encode_document(dobj) for dobj in documents]
+    pickled_raw = pickle.dumps(encoded, protocol)
+
+    steps = {
+        # what pymongo does of the dicts it is given:
+        ('in process', 'dict'): lambda: [bson.BSON.encode(dobj) for dobj in documents],
+        ('in process', 'raw'): lambda: [raw_document(encode_document(dobj)).raw
+                                        for dobj in documents],
+        ('processes', 'dict'): lambda: [bson.BSON.encode(dobj)
+                                        for dobj in pickle.loads(pickled_dicts)],
+        ('processes', 'raw'): lambda: [raw_document(data).raw
+                                       for data in pickle.loads(pickled_raw)],
+    }
+    return dict((step, n_documents / best_time(func))
+                for step, func in steps.items())
+
+
+def main():
+    results = run()
+    print("arbiter side, documents/sec (services)")
+    print("%-11s %12s %12s" % ('', 'dict', 'raw'))
+    for step in ('in process', 'processes'):
+        print("%-11s %12.0f %12.0f" % (
+            step, results[(step, 'dict')], results[(step, 'raw')]))
+
+
+if __name__ == '__main__':
+    main()
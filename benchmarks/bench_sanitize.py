@@ -0,0 +1,146 @@
+"""Benchmark of the per object serialization (sanitization) cost, with the
+generic recursive dispatch (as it was before the compiled sanitizers) and
+with the compiled per attribute sanitizers.
+"""
+
+from __future__ import print_function
+
+import timeit
+
+from alignak.objects.host import Host
+from alignak.objects.service import Service
+
+from mod_mongo_live_config.monitored_mutable import Monitored_Mutable
+from mod_mongo_live_config.sanitize import (
+    types_infos,
+    get_value_by_type_name_val,
+    none_object,
+    _alignak_objects_types,
+    _sanitizer_handlers,
+)
+
+try:
+    xrange
+except NameError:
+    xrange = range
+
+#############################################################################
+
+
+def make_population(n_hosts=200, services_per_host=20):
+    """Return the hosts and services of a somehow realistic configuration:
+    with the values a running scheduler would have on them."""
+    hosts = []
+    services = []
+    for h_idx in xrange(n_hosts):
+        host_name = 'host-%05d' % h_idx
+        host = Host({
+            'host_name': host_name,
+            'alias': 'The host %s' % h_idx,
+            'address': '10.0.%d.%d' % (h_idx // 256, h_idx % 256),
+            'hostgroups': 'linux,datacenter-%d' % (h_idx % 4),
+            '_OS': 'linux',
+        })
+        host.output = 'PING OK - Packet loss = 0%, RTA = 0.42 ms'
+        host.perf_data = 'rta=0.42ms;100;500;0 pl=0%;20;60;0'
+        host.last_chk = 1445000000 + h_idx
+        host.impacts = ['%s/srv-%02d' % (host_name, s_idx)
+                        for s_idx in xrange(services_per_host)]
+        hosts.append(host)
+        for s_idx in xrange(services_per_host):
+            srv = Service({
+                'host_name': host_name,
+                'service_description': 'srv-%02d' % s_idx,
+                'check_interval': '5',
+                '_THRESHOLD': '80',
+            })
+            srv.state = 'OK'
+            srv.output = 'OK - all is fine for %s' % s_idx
+            srv.perf_data = 'used=%d%%;80;90;0;100' % (s_idx * 3)
+            srv.last_chk = 1445000000 + s_idx
+            srv.latency = 0.012
+            srv.execution_time = 0.345
+            srv.source_problems = [host_name]
+            srv.chk_depend_of = [(host_name, ('d', 'u'), 'network_dep', None, True)]
+            services.append(srv)
+    return hosts, services
+
+
+def generic_sanitize_value(value):
+    """The recursive dispatch of sanitize._sanitize_value() as it was before
+    the compiled sanitizers (which also changed it), as the baseline."""
+    if value is none_object:  # special case
+        return None
+
+    handler = _sanitizer_handlers.get(type(value), lambda v: v)
+    value = handler(value)
+
+    if isinstance(value, _alignak_objects_types):
+        return value.get_name()
+
+    if isinstance(value, Monitored_Mutable):
+        base_type = value.get_base_type()
+        return generic_sanitize_value(
+            base_type(generic_sanitize_value(subval) for subval in value))
+    elif isinstance(value, (tuple, list)):
+        return type(value)(generic_sanitize_value(subval)
+                           for subval in value)
+
+    return value
+
+
+def serialize_generic(cls, infos, obj):
+    for attr in infos.accepted_properties:
+        try:
+            value = getattr(obj, attr)
+        except AttributeError:
+            continue
+        generic_sanitize_value(get_value_by_type_name_val(cls, attr, value))
+
+
+def serialize_compiled(cls, infos, obj):
+    sanitizers = infos.sanitizers
+    for attr in infos.accepted_properties:
+        try:
+            value = getattr(obj, attr)
+        except AttributeError:
+            continue
+        sanitizers[attr](value)
+
+
+def time_per_object(serialize, cls, objects, repeat=5):
+    infos = types_infos[cls]
+    best = None
+    for _ in xrange(repeat):
+        t0 = timeit.default_timer()
+        for obj in objects:
+            serialize(cls, infos, obj)
+        elapsed = timeit.default_timer() - t0
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / len(objects)
+
+
+def run(n_hosts=200, services_per_host=20):
+    """Return a dict: (class name, method) -> seconds per object."""
+    hosts, services = make_population(n_hosts, services_per_host)
+    results = {}
+    for cls, objects in ((Host, hosts), (Service, services)):
+        for name, serialize in (('generic', serialize_generic),
+                                ('compiled', serialize_compiled)):
+            results[(cls.__name__, name)] = time_per_object(serialize, cls, objects)
+    return results
+
+
+def main():
+    results = run()
+    print("%-10s %12s %12s" % ('per object', 'generic', 'compiled'))
+    for cls_name in ('Host', 'Service'):
+        print("%-10s %9.1f us %9.1f us" % (
+            cls_name,
+            results[(cls_name, 'generic')] * 1e6,
+            results[(cls_name, 'compiled')] * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Micro-benchmark of the cost of setting an attribute on an alignak object,
+without any hook, with the global Item hook and with the per class hooks,
+alone and within the reads and writes of a check result.
+"""
+
+from __future__ import print_function
+
+import timeit
+
+from alignak.objects.service import Service
+
+from mod_mongo_live_config import hooks
+
+try:
+    xrange
+except NameError:
+    xrange = range
+
+#############################################################################
+
+
+class NullMonitor(object):
+    """Stands for the LiveConfig module but doesn't retain anything,
+    so that only the interception cost is measured."""
+
+    def retain(self, cls, obj, attr, value):
+        pass
+
+
+def set_new_value(srv, number):
+    for i in xrange(number):
+        srv.last_chk = i
+
+
+def set_same_value(srv, number):
+    for _ in xrange(number):
+        srv.state = "OK"
+
+
+def set_unmonitored(srv, number):
+    for i in xrange(number):
+        srv.some_private_attr = i
+
+
+def check_result_mix(srv, number):
+    """Roughly what the scheduler does to a service per check result: it
+    reads much more of its attributes than it sets."""
+    for i in xrange(number):
+        if srv.state == "OK" and srv.state_type == "HARD" and not srv.is_flapping:
+            srv.attempt
+        srv.in_scheduled_downtime
+        srv.problem_has_been_acknowledged
+        srv.max_check_attempts
+        srv.check_interval
+        srv.retry_interval
+        srv.next_chk
+        srv.last_chk
+        srv.last_state_change
+        srv.state = "OK"
+        srv.state_type = "HARD"
+        srv.last_chk = i
+        srv.next_chk = i + 300
+        srv.output = "OK - all is fine"
+        srv.latency = 0.012
+        srv.execution_time = 0.345
+        srv.some_private_attr = i
+
+
+cases = (
+    ('monitored attribute, new value', set_new_value),
+    ('monitored attribute, same value', set_same_value),
+    ('unmonitored attribute', set_unmonitored),
+    ('check result (12 reads, 8 sets)', check_result_mix),
+)
+
+modes = ('none',) + hooks.SETATTR_HOOK_MODES
+
+#############################################################################
+
+
+def time_per_call(func, srv, number, repeat=5):
+    best = None
+    for _ in xrange(repeat):
+        t0 = timeit.default_timer()
+        func(srv, number)
+        elapsed = timeit.default_timer() - t0
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / number
+
+
+def run(number=200000):
+    """Return a dict: (mode, case name) -> seconds per setattr."""
+    results = {}
+    monitor = NullMonitor()
+    for mode in modes:
+        if mode != 'none':
+            hooks.install_hooks(monitor, mode)
+        try:
+            srv = Service({'max_check_attempts': '3', 'check_interval': '5',
+                           'retry_interval': '1'})
+            srv.fill_default()
+            srv.state = "OK"
+            for name, func in cases:
+                results[(mode, name)] = time_per_call(func, srv, number)
+        finally:
+            hooks.uninstall_hooks()
+    return results
+
+
+def main():
+    results = run()
+    print("%-35s" % 'setattr cost' + ''.join(" %12s" % mode for mode in modes))
+    for name, _ in cases:
+        print("%-35s" % name + ''.join(
+            " %9.0f ns" % (results[(mode, name)] * 1e9) for mode in modes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""Throughput benchmarks of the module on a synthetic configuration: the
+arbiter dump, the setattr interception, the sanitization per object type
+and the live updates under a storm of check results.
+
+The results are written as JSON, to be compared with the ones of another
+revision:
+
+    python -m benchmarks.bench_suite --hosts 2000 --output new.json
+    python -m benchmarks.bench_suite --compare old.json new.json
+
+By default the documents are written to the memory backend (which copies
+them), so that no mongod is needed; --backend mongo --uri .. writes them
+to a real one.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import platform
+import sys
+import timeit
+
+from alignak.objects.module import Module
+
+import mod_mongo_live_config
+from mod_mongo_live_config.hooks import uninstall_hooks
+from mod_mongo_live_config.sanitize import types_infos
+
+from benchmarks import bench_setattr
+from benchmarks.synthetic import Arbiter, check_results, make_config
+
+#############################################################################
+
+
+def make_module(backend='memory', uri=None, **kw):
+    dconf = {'module_alias': 'bench', 'module_type': 'mongo_live_config',
+             'backend': backend, 'db': 'bench_live_config'}
+    if uri:
+        dconf['uri'] = uri
+    dconf.update(kw)
+    module = mod_mongo_live_config.get_instance(Module(dconf))
+    module._backend.connect()
+    return module
+
+
+def n_documents(conf):
+    return sum(len(getattr(conf, infos.plural, ()))
+               for infos in types_infos.values())
+
+
+def bench_dump(conf, backend, uri, dump_modes=('drop', 'incremental', 'swap')):
+    """The documents per second of the arbiter dump, in each mode. The
+    incremental one is measured on its second dump, where nothing changed.
+    """
+    arbiter = Arbiter(conf)
+    documents = n_documents(conf)
+    res = {}
+    for dump_mode in dump_modes:
+        module = make_module(backend, uri, dump_mode=dump_mode)
+        try:
+            if dump_mode == 'incremental':
+                module._do_insert(arbiter)
+            t0 = timeit.default_timer()
+            module._do_insert(arbiter)
+            elapsed = timeit.default_timer() - t0
+        finally:
+            module.quit()
+        res[dump_mode] = {'documents': documents, 'seconds': elapsed,
+                          'documents_per_sec': documents / elapsed}
+    return res
+
+
+def bench_setattr_overhead(number):
+    """The nanoseconds per setattr, by hook mode and case."""
+    res = {}
+    for (mode, case), seconds in bench_setattr.run(number).items():
+        res.setdefault(mode, {})[case] = seconds * 1e9
+    return res
+
+
+def bench_sanitize(conf, module, repeat=3):
+    """The microseconds to make the document of an object, by type."""
+    res = {}
+    for cls, infos in types_infos.items():
+        objects = list(getattr(conf, infos.plural, ()))
+        if not objects:
+            continue
+        best = None
+        for _ in range(repeat):
+            t0 = timeit.default_timer()
+            for obj in objects:
+                module._make_document(cls, infos, obj)
+            elapsed = timeit.default_timer() - t0
+            if best is None or elapsed < best:
+                best = elapsed
+        res[cls.__name__] = best / len(objects) * 1e6
+    return res
+
+
+def bench_storm(conf, backend, uri, fraction, rounds):
+    """The live updates of 'rounds' check results of a 'fraction' of the
+    services: the time their attributes take to be set (intercepted),
+    and the documents per second of the flushes (do_updates).
+    """
+    arbiter = Arbiter(conf)
+    module = make_module(backend, uri)
+    set_time = flush_time = 0.0
+    n_objects = n_attributes = 0
+    try:
+        module._do_insert(arbiter)
+        module.hook_pre_scheduler_mod_start(None, start_thread=False)
+        module.test_and_get_objects_updates()
+        for round_idx in range(rounds):
+            results = list(check_results(conf.services, fraction, seed=round_idx))
+            t0 = timeit.default_timer()
+            for srv, values in results:
+                for attr, value in values.items():
+                    setattr(srv, attr, value)
+            set_time += timeit.default_timer() - t0
+            n_attributes += sum(len(values) for _, values in results)
+
+            t0 = timeit.default_timer()
+            objects = module.test_and_get_objects_updates()
+            n_objects += sum(len(cls_objects) for cls_objects in objects.values())
+            module.do_updates(objects)
+            flush_time += timeit.default_timer() - t0
+    finally:
+        module.quit()
+        uninstall_hooks()
+    return {
+        'rounds': rounds,
+        'objects': n_objects,
+        'setattr_ns': set_time / n_attributes * 1e9,
+        'flush_seconds': flush_time,
+        'documents_per_sec': n_objects / flush_time,
+    }
+
+
+def run(n_hosts=1000, services_per_host=20, n_contacts=50, n_timeperiods=5,
+        backend='memory', uri=None, storm_fraction=0.5, storm_rounds=5,
+        setattr_number=200000):
+    """Return the results, as a dict ready for json."""
+    conf = make_config(n_hosts, services_per_host, n_contacts, n_timeperiods)
+    module = make_module()
+    try:
+        sanitize = bench_sanitize(conf, module)
+    finally:
+        module.quit()
+    return {
+        'params': {
+            'hosts': n_hosts, 'services_per_host': services_per_host,
+            'contacts': n_contacts, 'timeperiods': n_timeperiods,
+            'backend': backend, 'storm_fraction': storm_fraction,
+            'storm_rounds': storm_rounds,
+        },
+        'python': platform.python_version(),
+        'dump': bench_dump(conf, backend, uri),
+        'setattr': bench_setattr_overhead(setattr_number),
+        'sanitize': sanitize,
+        'storm': bench_storm(conf, backend, uri, storm_fraction, storm_rounds),
+    }
+
+#############################################################################
+
+
+def flatten(results, prefix=''):
+    """Return the {'dump.drop.seconds': value, ..} of the results."""
+    res = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            res.update(flatten(value, prefix + key + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            res[prefix + key] = value
+    return res
+
+
+def compare(old, new):
+    """Return the lines of the (numeric) results of 'old' and 'new',
+    with the ratio new / old."""
+    old_values = flatten(old)
+    new_values = flatten(new)
+    lines = []
+    for key in sorted(set(old_values) & set(new_values)):
+        if key.startswith('params.'):
+            continue
+        old_value, new_value = old_values[key], new_values[key]
+        ratio = '%8.2fx' % (float(new_value) / old_value) if old_value else '%9s' % '-'
+        lines.append('%-60s %14.3f %14.3f %s' % (key, old_value, new_value, ratio))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--hosts', type=int, default=1000)
+    parser.add_argument('--services-per-host', type=int, default=20)
+    parser.add_argument('--contacts', type=int, default=50)
+    parser.add_argument('--timeperiods', type=int, default=5)
+    parser.add_argument('--backend', choices=('memory', 'mongo'), default='memory')
+    parser.add_argument('--uri', help="the mongodb:// URI of the mongo backend")
+    parser.add_argument('--storm-fraction', type=float, default=0.5,
+                        help="the fraction of the services getting a check "
+                             "result at each round")
+    parser.add_argument('--storm-rounds', type=int, default=5)
+    parser.add_argument('--output', help="where to write the results (json)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help="compare two results files, instead of running")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as fh:
+            old = json.load(fh)
+        with open(args.compare[1]) as fh:
+            new = json.load(fh)
+        print('\n'.join(compare(old, new)))
+        return
+
+    results = run(args.hosts, args.services_per_host, args.contacts,
+                  args.timeperiods, args.backend, args.uri,
+                  args.storm_fraction, args.storm_rounds)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
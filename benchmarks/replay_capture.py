@@ -0,0 +1,133 @@
+"""Replay the attributes changes captured on a scheduler (see the module
+capture_file directive) against a module configured at will: to reproduce
+production write patterns offline, and compare the flush strategies.
+
+    python -m benchmarks.replay_capture changes.cap --speed 10 \\
+        --set flush_interval_ms=500 --set throttle=last_chk=10
+
+The objects of the capture are created from their keys, and each change
+sets a new value to its attribute, so that it goes through the setattr
+hooks as the original one did, at the original pace (divided by --speed,
+0: as fast as possible). The module then flushes them through do_updates,
+and its metrics summary is printed once everything was written.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+import time
+
+from mod_mongo_live_config.capture import read_capture
+from mod_mongo_live_config.metrics import format_summary
+from mod_mongo_live_config.sanitize import types_infos
+
+from benchmarks.bench_suite import make_module
+
+try:
+    basestring
+except NameError:
+    basestring = str
+    long = int
+
+#############################################################################
+
+
+def replay_value(value, number):
+    """Return a new value, of the type of 'value', distinct from it."""
+    if isinstance(value, bool):
+        return not value
+    if isinstance(value, (int, long)):
+        return number
+    if isinstance(value, float):
+        return float(number)
+    if isinstance(value, basestring):
+        return 'replayed %d' % number
+    if isinstance(value, list):
+        return [number]
+    if isinstance(value, dict):
+        return {'replayed': number}
+    return number
+
+
+def make_objects(path):
+    """Return the alignak objects changed in the capture 'path', by
+    (type name, key items). They must be created before the hooks are
+    installed, else all their attributes would be changes too."""
+    classes = dict((cls.__name__, cls) for cls in types_infos)
+    objects = {}
+    for _, type_name, key, _ in read_capture(path):
+        obj_key = (type_name, tuple(sorted(key.items())))
+        if obj_key not in objects:
+            objects[obj_key] = classes[type_name](dict(key))
+    return objects
+
+
+def replay(path, objects, speed=1.0):
+    """Replay the changes of the capture 'path' on the 'objects', see
+    make_objects(). Return the number of changes replayed."""
+    first_timestamp = start = None
+    n_changes = 0
+    for timestamp, type_name, key, attr in read_capture(path):
+        if first_timestamp is None:
+            first_timestamp, start = timestamp, time.time()
+        if speed:
+            delay = start + (timestamp - first_timestamp) / speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        obj = objects[(type_name, tuple(sorted(key.items())))]
+        n_changes += 1
+        setattr(obj, attr, replay_value(getattr(obj, attr, None), n_changes))
+    return n_changes
+
+
+def wait_flushed(module, timeout=60):
+    deadline = time.time() + timeout
+    while len(module._changes) and time.time() < deadline:
+        time.sleep(0.05)
+
+
+def parse_directives(values):
+    res = {}
+    for value in values or ():
+        name, sep, value = value.partition('=')
+        if not sep:
+            raise ValueError("Invalid directive, expected name=value: %r" % name)
+        res[name.strip()] = value.strip()
+    return res
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('capture', help="the capture file")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="how much faster than captured (0: no waits)")
+    parser.add_argument('--backend', choices=('memory', 'mongo'), default='memory')
+    parser.add_argument('--uri', help="the mongodb:// URI of the mongo backend")
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE',
+                        help="a module directive (flush_interval_ms, throttle, ..)")
+    parser.add_argument('--output', help="where to write the summary (json)")
+    args = parser.parse_args(argv)
+
+    objects = make_objects(args.capture)
+    module = make_module(args.backend, args.uri, **parse_directives(args.set))
+    module.hook_pre_scheduler_mod_start(None)
+    try:
+        t0 = time.time()
+        n_changes = replay(args.capture, objects, args.speed)
+        wait_flushed(module)
+        elapsed = time.time() - t0
+    finally:
+        module.quit()
+    summary = module.metrics.summary()
+    print("replayed %d changes in %.3f secs" % (n_changes, elapsed))
+    print(format_summary(summary))
+    if args.output:
+        summary.update(changes=n_changes, seconds=elapsed)
+        with open(args.output, 'w') as fh:
+            json.dump(summary, fh, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
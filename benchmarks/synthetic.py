@@ -0,0 +1,108 @@
+"""Synthetic alignak configurations, of any size, for the benchmarks.
+
+The objects are created the way the arbiter does, through
+Config.types_creations, from raw definitions: a configuration of 10k hosts
+with 20 services each is as easy to get as a tiny one.
+"""
+
+from __future__ import print_function
+
+import random
+from collections import defaultdict
+
+from alignak.objects.config import Config
+
+try:
+    xrange
+except NameError:
+    xrange = range
+
+#############################################################################
+
+# what a check result typically changes on a service, and values for them:
+CHECK_RESULT_ATTRIBUTES = (
+    'state', 'state_id', 'last_chk', 'next_chk', 'output', 'perf_data',
+    'latency', 'execution_time', 'attempt', 'last_state_change',
+)
+
+STATES = (('OK', 0), ('WARNING', 1), ('CRITICAL', 2), ('UNKNOWN', 3))
+
+
+class Arbiter(object):
+    """Stands for the arbiter daemon, the module only needs its conf."""
+
+    def __init__(self, conf):
+        self.conf = conf
+
+
+def make_raw_objects(n_hosts, services_per_host, n_contacts, n_timeperiods):
+    """Return the raw definitions, by type, as read from the cfg files."""
+    raw = defaultdict(list)
+    for idx in xrange(n_timeperiods):
+        raw['timeperiod'].append({
+            'timeperiod_name': 'period-%d' % idx,
+            'alias': 'Period %d' % idx,
+            'monday': '%02d:00-%02d:00' % (idx % 12, idx % 12 + 12),
+            'imported_from': 'synthetic',
+        })
+    for idx in xrange(n_contacts):
+        raw['contact'].append({
+            'contact_name': 'contact-%d' % idx,
+            'email': 'contact-%d@example.com' % idx,
+            'host_notification_period': 'period-%d' % (idx % max(n_timeperiods, 1)),
+            'service_notification_period': 'period-%d' % (idx % max(n_timeperiods, 1)),
+            'imported_from': 'synthetic',
+        })
+    for h_idx in xrange(n_hosts):
+        host_name = 'host-%06d' % h_idx
+        raw['host'].append({
+            'host_name': host_name,
+            'alias': 'The host %d' % h_idx,
+            'address': '10.%d.%d.%d' % (h_idx >> 16, (h_idx >> 8) & 255, h_idx & 255),
+            'hostgroups': 'linux,datacenter-%d' % (h_idx % 4),
+            'contacts': 'contact-%d' % (h_idx % max(n_contacts, 1)),
+            'check_command': 'check-host-alive',
+            '_OS': 'linux',
+            'imported_from': 'synthetic',
+        })
+        for s_idx in xrange(services_per_host):
+            raw['service'].append({
+                'host_name': host_name,
+                'service_description': 'srv-%03d' % s_idx,
+                'check_command': 'check_srv_%d' % (s_idx % 10),
+                'check_interval': '5',
+                '_THRESHOLD': '80',
+                'imported_from': 'synthetic',
+            })
+    return raw
+
+
+def make_config(n_hosts=1000, services_per_host=20, n_contacts=50, n_timeperiods=5):
+    """Return a Config with the objects of a configuration of that size."""
+    raw = make_raw_objects(n_hosts, services_per_host, n_contacts, n_timeperiods)
+    conf = Config()
+    for o_type in Config.types_creations:
+        conf.create_objects_for_type(raw, o_type)
+    return conf
+
+
+def check_results(services, fraction=1.0, seed=0):
+    """Yield, for a 'fraction' of the services, randomly picked, the
+    (service, {attribute: value}) of a check result."""
+    rng = random.Random(seed)
+    now = 1445000000 + rng.randint(0, 1000000)
+    services = list(services)
+    for srv in rng.sample(services, int(len(services) * fraction)):
+        state, state_id = rng.choice(STATES)
+        yield srv, {
+            'state': state,
+            'state_id': state_id,
+            'last_chk': now,
+            'next_chk': now + 300,
+            'output': '%s - value is %d' % (state, rng.randint(0, 100)),
+            'perf_data': 'used=%d%%;80;90;0;100' % rng.randint(0, 100),
+            'latency': rng.random(),
+            'execution_time': rng.random() * 2,
+            'attempt': rng.randint(1, 3),
+            'last_state_change': now - rng.randint(0, 86400),
+        }
@@ -0,0 +1,71 @@
+from .base import (
+    MTIME_FIELD,
+    REVISION_FIELD,
+    STAGING_SUFFIX,
+    Backend,
+    BackendError,
+    BackendUnavailable,
+    WriteCounts,
+)
+
+#############################################################################
+
+from alignak.util import to_bool
+
+#############################################################################
+
+from ..default import (
+    DEFAULT_BACKEND,
+    DEFAULT_CONNECT_TIMEOUT_MS,
+    DEFAULT_DATABASE_HOST,
+    DEFAULT_DATABASE_NAME,
+    DEFAULT_DATABASE_PORT,
+    DEFAULT_JOURNAL,
+    DEFAULT_LIVE_WRITE_CONCERN,
+    DEFAULT_MAX_POOL_SIZE,
+    DEFAULT_SOCKET_TIMEOUT_MS,
+    DEFAULT_URI,
+    DEFAULT_WRITE_CONCERN,
+)
+
+#############################################################################
+
+BACKEND_TYPES = ('mongo', 'memory', 'jsonfile')
+
+
+def make_backend(mod_conf):
+    """ Return the Backend configured by the module directives. """
+    backend = getattr(mod_conf, 'backend', DEFAULT_BACKEND)
+    if backend == 'mongo':
+        from .mongo import MongoBackend, make_write_concern
+        journal = getattr(mod_conf, 'journal', None)
+        journal = DEFAULT_JOURNAL if journal is None else to_bool(journal)
+        w = getattr(mod_conf, 'write_concern', DEFAULT_WRITE_CONCERN)
+        live_w = getattr(mod_conf, 'live_write_concern',
+                         DEFAULT_LIVE_WRITE_CONCERN) or w
+        return MongoBackend(
+            getattr(mod_conf, 'db', DEFAULT_DATABASE_NAME),
+            host=getattr(mod_conf, 'hostname', DEFAULT_DATABASE_HOST),
+            port=int(getattr(mod_conf, 'port', DEFAULT_DATABASE_PORT)),
+            uri=getattr(mod_conf, 'uri', DEFAULT_URI),
+            max_pool_size=int(getattr(mod_conf, 'max_pool_size',
+                                      DEFAULT_MAX_POOL_SIZE)),
+            write_concern=make_write_concern(w, journal),
+            # the journal can't be waited for when not acknowledged:
+            live_write_concern=make_write_concern(
+                live_w, journal and str(live_w).strip() != '0'),
+            connect_timeout_ms=int(getattr(mod_conf, 'connect_timeout_ms',
+                                           DEFAULT_CONNECT_TIMEOUT_MS)),
+            socket_timeout_ms=int(getattr(mod_conf, 'socket_timeout_ms',
+                                          DEFAULT_SOCKET_TIMEOUT_MS)))
+    if backend == 'memory':
+        from .memory import MemoryBackend
+        return MemoryBackend()
+    if backend == 'jsonfile':
+        directory = getattr(mod_conf, 'jsonfile_dir', None)
+        if not directory:
+            raise ValueError("The jsonfile backend requires jsonfile_dir")
+        from .jsonfile import JsonFileBackend
+        return JsonFileBackend(directory)
+    raise ValueError("Invalid backend: %r (expected one of: %s)" % (
+        backend, ', '.join(BACKEND_TYPES)))
@@ -0,0 +1,159 @@
+# with revisions, the fields of the documents holding the number of times
+# they were written and the (UTC) datetime they last were:
+REVISION_FIELD = '_rev'
+MTIME_FIELD = '_mtime'
+
+# the suffix of the staging collections, see Backend.swap_begin():
+STAGING_SUFFIX = '__next'
+
+
+class BackendError(Exception):
+    """ An operation failed on the backend. """
+
+
+class BackendUnavailable(BackendError):
+    """ The backend can't be reached: the operation can be retried once
+    reconnected. """
+
+
+class WriteCounts(object):
+    """ The numbers of documents written, as reported by a backend. """
+
+    FIELDS = ('matched', 'modified', 'upserted', 'inserted', 'removed')
+
+    def __init__(self, matched=0, modified=0, upserted=0, inserted=0, removed=0):
+        self.matched = matched
+        self.modified = modified
+        self.upserted = upserted
+        self.inserted = inserted
+        self.removed = removed
+
+    def add(self, other):
+        """ Add the counts of 'other', if any (None: not known). """
+        if other is not None:
+            for field in self.FIELDS:
+                setattr(self, field, getattr(self, field) + getattr(other, field))
+        return self
+
+    def as_dict(self):
+        return dict((field, getattr(self, field)) for field in self.FIELDS)
+
+    def __eq__(self, other):
+        return isinstance(other, WriteCounts) and self.as_dict() == other.as_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return ' '.join('%s=%s' % (field, getattr(self, field))
+                        for field in self.FIELDS)
+
+
+class Backend(object):
+    """ Where the documents are stored.
+
+    The documents are dicts, stored in collections named by strings. A
+    key is a dict of the fields identifying a document in its collection.
+    The methods raise BackendError (or BackendUnavailable) on failure.
+    The writing ones, but swap_begin() and swap_end(), return the
+    WriteCounts of the write, or None if they are not known (not
+    acknowledged writes, ..).
+    """
+
+    # if the documents given to upsert() and swap_insert() can be
+    # RawBSONDocument:
+    accepts_raw_documents = False
+
+    def connect(self):
+        """ (Re)connect to the storage. """
+
+    def close(self):
+        pass
+
+    def create_index(self, collection, fields, unique):
+        """ Create, if needed, an index on 'fields' (a tuple).
+        :return: True if the index is in place.
+        """
+        raise NotImplementedError
+
+    def create_capped(self, collection, size, max_documents=0):
+        """ Create, if needed, a capped collection: of at most 'size' bytes
+        and 'max_documents' documents (0: no limit but the size), the
+        oldest being dropped beyond.
+        :return: True if 'collection' is a capped collection.
+        """
+        raise NotImplementedError
+
+    def drop(self, collection):
+        raise NotImplementedError
+
+    def find(self, collection, fields):
+        """ Return an iterable of the documents of 'collection', having only
+        'fields' (those they have) and '_id', their identifier. """
+        raise NotImplementedError
+
+    def max_value(self, collection, field):
+        """ Return the greatest value of 'field' in 'collection', None if
+        no document has it. """
+        raise NotImplementedError
+
+    def insert(self, collection, documents):
+        """ Insert documents, written as the live updates are (see update()).
+        :param documents: iterable of documents.
+        """
+        raise NotImplementedError
+
+    def upsert(self, collection, documents):
+        """ Replace, or insert, documents.
+        :param documents: iterable of (key, document).
+        """
+        raise NotImplementedError
+
+    def update(self, collection, updates, revisions=False):
+        """ Set some fields of documents, which are inserted if needed.
+        :param updates: iterable of (key, {field: value}).
+        :param revisions: if True, also increment the REVISION_FIELD of the
+            documents and set their MTIME_FIELD to the current time.
+        """
+        raise NotImplementedError
+
+    def increment(self, collection, increments):
+        """ Add to some numeric fields of documents, which are inserted if
+        needed (their missing fields counting from 0).
+        :param increments: iterable of (key, {field: delta}), the fields
+            being dotted paths ('a.b': the field 'b' of the field 'a').
+        """
+        raise NotImplementedError
+
+    def next_sequence(self, collection, name, count=1):
+        """ Add, atomically, 'count' to the counter 'name' of 'collection'
+        (a document {'name': name, 'value': n}, created if needed).
+        :return: the new value of the counter.
+        """
+        raise NotImplementedError
+
+    def remove(self, collection, ids):
+        """ Remove the documents of the given '_id's. """
+        raise NotImplementedError
+
+    def swap_begin(self, collection):
+        """ Start replacing, at once, all the documents of 'collection':
+        create an empty staging collection, for swap_insert() to fill
+        (by batches) and swap_end() to put in place.
+        :return: the name of the staging collection.
+        """
+        raise NotImplementedError
+
+    def swap_insert(self, staging, documents):
+        """ Insert documents in the 'staging' collection of swap_begin().
+        :param documents: iterable of (key, document), the keys being unique.
+        """
+        raise NotImplementedError
+
+    def swap_end(self, collection, staging, prepare=None):
+        """ Replace, at once, 'collection' by the 'staging' one.
+        :param prepare: if given, called with the name of the staging
+            collection before it replaces 'collection': to create its
+            indexes, ..
+        """
+        raise NotImplementedError
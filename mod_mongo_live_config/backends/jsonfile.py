@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+
+#############################################################################
+
+from .base import MTIME_FIELD, REVISION_FIELD, BackendError
+from .memory import MemoryBackend
+
+#############################################################################
+
+FILE_SUFFIX = '.jsonl'
+
+
+def _dumps(record):
+    # the values mongo understands but json doesn't (datetime, ..) are
+    # written as strings:
+    return json.dumps(record, default=str, sort_keys=True) + '\n'
+
+
+class JsonFileBackend(MemoryBackend):
+    """ Write the documents in 'directory', a file per collection, where each
+    operation is appended as a json line:
+        {"op": "upsert", "key": {..}, "doc": {..}}
+        {"op": "update", "key": {..}, "set": {..}}
+        {"op": "remove", "keys": [{..}, ..]}
+        {"op": "insert", "docs": [{..}, ..]}
+        {"op": "inc", "key": {..}, "inc": {..}}
+        {"op": "capped", "size": 0, "max": n}
+    The files are replayed, and compacted, by connect(), so the documents
+    are also kept in memory, as by the MemoryBackend.
+    """
+
+    def __init__(self, directory):
+        super(JsonFileBackend, self).__init__()
+        self.directory = directory
+        self._files = {}
+        # so that the operations are appended in the order they are done:
+        self._write_lock = threading.RLock()
+
+    def _path(self, collection):
+        return os.path.join(self.directory, collection + FILE_SUFFIX)
+
+    def connect(self):
+        self.close()
+        self.collections.clear()
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            for filename in sorted(os.listdir(self.directory)):
+                if filename.endswith(FILE_SUFFIX):
+                    self._load(filename[:-len(FILE_SUFFIX)])
+        except (IOError, OSError, ValueError) as err:
+            raise BackendError("Could not load %s: %s" % (self.directory, err))
+
+    def _load(self, collection):
+        super_self = super(JsonFileBackend, self)
+        with open(self._path(collection)) as fh:
+            for line in fh:
+                record = json.loads(line)
+                op = record['op']
+                if op == 'upsert':
+                    super_self.upsert(collection, [(record['key'], record['doc'])])
+                elif op == 'update':
+                    super_self.update(collection, [(record['key'], record['set'])])
+                elif op == 'insert':
+                    super_self.insert(collection, record['docs'])
+                elif op == 'inc':
+                    super_self.increment(collection, [(record['key'], record['inc'])])
+                elif op == 'capped':
+                    super_self.create_capped(collection, record['size'], record['max'])
+                elif op == 'remove':
+                    keys = set(frozenset(key.items()) for key in record['keys'])
+                    super_self.remove(collection, [
+                        dobj['_id'] for key, dobj in self.keyed_documents(collection)
+                        if frozenset(key.items()) in keys])
+        # compact it:
+        self._rewrite(collection)
+
+    def close(self):
+        for fh in self._files.values():
+            fh.close()
+        self._files.clear()
+
+    def _append(self, collection, records):
+        fh = self._files.get(collection)
+        try:
+            if fh is None:
+                fh = self._files[collection] = open(self._path(collection), 'a')
+            fh.write(''.join(_dumps(record) for record in records))
+            fh.flush()
+        except (IOError, OSError) as err:
+            raise BackendError("Could not write %s: %s" % (self._path(collection), err))
+
+    def _rewrite(self, collection):
+        """ Replace, at once, the file of 'collection' by its documents. """
+        fh = self._files.pop(collection, None)
+        if fh is not None:
+            fh.close()
+        path = self._path(collection)
+        records = []
+        capped = self.collections.get(collection)
+        if capped is not None and capped.max_documents:
+            records.append({'op': 'capped', 'size': 0, 'max': capped.max_documents})
+        records += [{'op': 'upsert', 'key': key, 'doc': dobj}
+                   for key, dobj in self.keyed_documents(collection)]
+        inserted = self.inserted_documents(collection)
+        if inserted:
+            records.append({'op': 'insert', 'docs': inserted})
+        try:
+            with open(path + '.tmp', 'w') as fh:
+                fh.write(''.join(_dumps(record) for record in records))
+            os.rename(path + '.tmp', path)
+        except (IOError, OSError) as err:
+            raise BackendError("Could not write %s: %s" % (path, err))
+
+    def drop(self, collection):
+        with self._write_lock:
+            super(JsonFileBackend, self).drop(collection)
+            fh = self._files.pop(collection, None)
+            if fh is not None:
+                fh.close()
+            if os.path.exists(self._path(collection)):
+                os.remove(self._path(collection))
+
+    def upsert(self, collection, documents):
+        documents = list(documents)
+        with self._write_lock:
+            counts = super(JsonFileBackend, self).upsert(collection, documents)
+            self._append(collection, [{'op': 'upsert', 'key': key, 'doc': dobj}
+                                      for key, dobj in documents])
+        return counts
+
+    def update(self, collection, updates, revisions=False):
+        updates = list(updates)
+        with self._write_lock:
+            counts = super(JsonFileBackend, self).update(collection, updates, revisions)
+            if revisions:  # as they were set, to be replayed as is
+                updates = [(key, self._stamped(collection, key, values))
+                           for key, values in updates]
+            self._append(collection, [{'op': 'update', 'key': key, 'set': values}
+                                      for key, values in updates])
+        return counts
+
+    def _stamped(self, collection, key, values):
+        dobj = self.document(collection, key)
+        values = dict(values)
+        values[REVISION_FIELD] = dobj[REVISION_FIELD]
+        values[MTIME_FIELD] = dobj[MTIME_FIELD]
+        return values
+
+    def increment(self, collection, increments):
+        increments = list(increments)
+        with self._write_lock:
+            counts = super(JsonFileBackend, self).increment(collection, increments)
+            self._append(collection, [{'op': 'inc', 'key': key, 'inc': deltas}
+                                      for key, deltas in increments])
+        return counts
+
+    def next_sequence(self, collection, name, count=1):
+        with self._write_lock:
+            value = super(JsonFileBackend, self).next_sequence(collection, name, count)
+            self._append(collection, [{'op': 'inc', 'key': {'name': name},
+                                       'inc': {'value': count}}])
+        return value
+
+    def create_capped(self, collection, size, max_documents=0):
+        with self._write_lock:
+            res = super(JsonFileBackend, self).create_capped(
+                collection, size, max_documents)
+            self._rewrite(collection)
+        return res
+
+    def insert(self, collection, documents):
+        documents = list(documents)
+        with self._write_lock:
+            counts = super(JsonFileBackend, self).insert(collection, documents)
+            self._append(collection, [{'op': 'insert', 'docs': documents}])
+        return counts
+
+    def remove(self, collection, ids):
+        with self._write_lock:
+            ids = set(ids)
+            keys = [key for key, dobj in self.keyed_documents(collection)
+                    if dobj['_id'] in ids]
+            counts = super(JsonFileBackend, self).remove(collection, ids)
+            self._append(collection, [{'op': 'remove', 'keys': keys}])
+        return counts
+
+    # the staging collections are only kept in memory, until swap_end():
+    def swap_end(self, collection, staging, prepare=None):
+        with self._write_lock:
+            super(JsonFileBackend, self).swap_end(collection, staging, prepare)
+            self._rewrite(collection)
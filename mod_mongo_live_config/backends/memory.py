@@ -0,0 +1,247 @@
+import copy
+import datetime
+import itertools
+import threading
+from collections import OrderedDict
+
+#############################################################################
+
+from .base import MTIME_FIELD, REVISION_FIELD, STAGING_SUFFIX, Backend, WriteCounts
+
+#############################################################################
+
+
+def _key_of(key):
+    return frozenset(key.items())
+
+
+class MemoryCollection(object):
+    """ The documents of a collection, by '_id', and the '_id' of the
+    documents by key. """
+
+    def __init__(self):
+        # in the order they were first stored, as mongo natural order:
+        self.documents = OrderedDict()
+        self.ids = {}
+        self.indexes = set()  # the (fields, unique) created
+        self.max_documents = 0  # if capped, the oldest are dropped beyond
+
+    def trim(self):
+        if self.max_documents:
+            while len(self.documents) > self.max_documents:
+                self.documents.popitem(last=False)
+
+
+class MemoryBackend(Backend):
+    """ Keep the documents in memory: for the tests and the benchmarks, or
+    where a (local) process reads them back through this very backend.
+    The documents are copied in, so the stored values can't be mutated by
+    the objects they come from.
+    """
+
+    def __init__(self):
+        self.collections = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def _collection(self, name):
+        collection = self.collections.get(name)
+        if collection is None:
+            collection = self.collections[name] = MemoryCollection()
+        return collection
+
+    def documents(self, collection):
+        """ Return the documents of 'collection' (not copied). """
+        collection = self.collections.get(collection)
+        return list(collection.documents.values()) if collection else []
+
+    def keyed_documents(self, collection):
+        """ Return the (key, document) of 'collection' (not copied). """
+        collection = self.collections.get(collection)
+        if collection is None:
+            return []
+        return [(dict(doc_key), collection.documents[doc_id])
+                for doc_key, doc_id in collection.ids.items()]
+
+    def document(self, collection, key):
+        """ Return the document of 'key' in 'collection' (not copied), None
+        if there is none. """
+        collection = self.collections.get(collection)
+        if collection is None:
+            return None
+        doc_id = collection.ids.get(_key_of(key))
+        return None if doc_id is None else collection.documents[doc_id]
+
+    def inserted_documents(self, collection):
+        """ Return the documents of 'collection' which were inserted, so
+        have no key (not copied). """
+        collection = self.collections.get(collection)
+        if collection is None:
+            return []
+        keyed = set(collection.ids.values())
+        return [dobj for doc_id, dobj in collection.documents.items()
+                if doc_id not in keyed]
+
+    def create_index(self, collection, fields, unique):
+        with self._lock:
+            self._collection(collection).indexes.add((tuple(fields), unique))
+        return True
+
+    def create_capped(self, collection, size, max_documents=0):
+        """ Only the number of documents is bounded. """
+        with self._lock:
+            collection = self._collection(collection)
+            collection.max_documents = max_documents
+            collection.trim()
+        return True
+
+    def drop(self, collection):
+        with self._lock:
+            self.collections.pop(collection, None)
+
+    def find(self, collection, fields):
+        with self._lock:
+            collection = self.collections.get(collection)
+            if collection is None:
+                return []
+            return [dict((field, doc[field]) for field in ('_id',) + tuple(fields)
+                         if field in doc)
+                    for doc in collection.documents.values()]
+
+    def max_value(self, collection, field):
+        with self._lock:
+            collection = self.collections.get(collection)
+            if collection is None:
+                return None
+            values = [doc[field] for doc in collection.documents.values()
+                      if field in doc]
+        return max(values) if values else None
+
+    def insert(self, collection, documents):
+        documents = [copy.deepcopy(dobj) for dobj in documents]
+        with self._lock:
+            collection = self._collection(collection)
+            for dobj in documents:
+                dobj['_id'] = next(self._ids)
+                collection.documents[dobj['_id']] = dobj
+            collection.trim()
+        return WriteCounts(inserted=len(documents))
+
+    def _store(self, collection, key, document, counts=None):
+        doc_key = _key_of(key)
+        doc_id = collection.ids.get(doc_key)
+        if doc_id is None:
+            doc_id = collection.ids[doc_key] = next(self._ids)
+            if counts is not None:
+                counts.upserted += 1
+        document['_id'] = doc_id
+        previous = collection.documents.get(doc_id)
+        if previous is not None and counts is not None:
+            counts.matched += 1
+            counts.modified += previous != document
+        collection.documents[doc_id] = document
+
+    def upsert(self, collection, documents):
+        documents = [(key, copy.deepcopy(dobj)) for key, dobj in documents]
+        counts = WriteCounts()
+        with self._lock:
+            collection = self._collection(collection)
+            for key, dobj in documents:
+                dobj.update(key)
+                self._store(collection, key, dobj, counts)
+        return counts
+
+    def update(self, collection, updates, revisions=False):
+        updates = [(key, copy.deepcopy(values)) for key, values in updates]
+        counts = WriteCounts()
+        now = datetime.datetime.utcnow()
+        with self._lock:
+            collection = self._collection(collection)
+            for key, values in updates:
+                doc_id = collection.ids.get(_key_of(key))
+                if doc_id is None:
+                    dobj = dict(key)
+                    dobj.update(values)
+                    self._store(collection, key, dobj, counts)
+                else:
+                    dobj = collection.documents[doc_id]
+                    counts.matched += 1
+                    counts.modified += revisions or any(
+                        name not in dobj or dobj[name] != value
+                        for name, value in values.items())
+                    dobj.update(values)
+                if revisions:
+                    dobj[REVISION_FIELD] = dobj.get(REVISION_FIELD, 0) + 1
+                    dobj[MTIME_FIELD] = now
+        return counts
+
+    def increment(self, collection, increments):
+        increments = [(key, dict(deltas)) for key, deltas in increments]
+        counts = WriteCounts()
+        with self._lock:
+            collection = self._collection(collection)
+            for key, deltas in increments:
+                doc_id = collection.ids.get(_key_of(key))
+                if doc_id is None:
+                    dobj = dict(key)
+                    self._store(collection, key, dobj, counts)
+                else:
+                    dobj = collection.documents[doc_id]
+                    counts.matched += 1
+                    counts.modified += any(deltas.values())
+                for path, delta in deltas.items():
+                    parent = dobj
+                    names = path.split('.')
+                    for name in names[:-1]:
+                        parent = parent.setdefault(name, {})
+                    parent[names[-1]] = parent.get(names[-1], 0) + delta
+        return counts
+
+    def next_sequence(self, collection, name, count=1):
+        with self._lock:
+            collection = self._collection(collection)
+            key = {'name': name}
+            doc_id = collection.ids.get(_key_of(key))
+            if doc_id is None:
+                dobj = dict(key, value=0)
+                self._store(collection, key, dobj)
+            else:
+                dobj = collection.documents[doc_id]
+            dobj['value'] += count
+            return dobj['value']
+
+    def remove(self, collection, ids):
+        counts = WriteCounts()
+        with self._lock:
+            collection = self.collections.get(collection)
+            if collection is None:
+                return counts
+            ids = set(ids)
+            for doc_id in ids:
+                if collection.documents.pop(doc_id, None) is not None:
+                    counts.removed += 1
+            for doc_key, doc_id in list(collection.ids.items()):
+                if doc_id in ids:
+                    del collection.ids[doc_key]
+        return counts
+
+    def swap_begin(self, collection):
+        staging = collection + STAGING_SUFFIX
+        with self._lock:
+            self.collections[staging] = MemoryCollection()
+        return staging
+
+    def swap_insert(self, staging, documents):
+        documents = [(key, copy.deepcopy(dobj)) for key, dobj in documents]
+        with self._lock:
+            collection = self.collections[staging]
+            for key, dobj in documents:
+                dobj.update(key)
+                self._store(collection, key, dobj)
+        return WriteCounts(inserted=len(documents))
+
+    def swap_end(self, collection, staging, prepare=None):
+        if prepare is not None:
+            prepare(staging)
+        with self._lock:
+            self.collections[collection] = self.collections.pop(staging)
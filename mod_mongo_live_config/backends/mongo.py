@@ -0,0 +1,260 @@
+import functools
+
+import pymongo
+from pymongo.errors import (
+    CollectionInvalid,
+    ConfigurationError,
+    ConnectionFailure,
+    PyMongoError,
+)
+from pymongo.collection import ReturnDocument
+from pymongo.operations import DeleteOne, InsertOne, ReplaceOne, UpdateOne
+from pymongo.write_concern import WriteConcern
+
+#############################################################################
+
+from alignak.log import logger
+
+#############################################################################
+
+from .base import (
+    MTIME_FIELD,
+    REVISION_FIELD,
+    STAGING_SUFFIX,
+    Backend,
+    BackendError,
+    BackendUnavailable,
+    WriteCounts,
+)
+
+#############################################################################
+
+
+def _translate_errors(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except ConnectionFailure as err:
+            raise BackendUnavailable(str(err))
+        except PyMongoError as err:
+            raise BackendError(str(err))
+    return wrapper
+
+
+def make_write_concern(w, journal=False):
+    """ Return the WriteConcern for the 'w' directive value:
+    a number of nodes ('0': not acknowledged, fire and forget) or
+    the name of a mode ('majority', ..).
+    """
+    w = str(w).strip()
+    if w.isdigit():
+        w = int(w)
+    try:
+        return WriteConcern(w=w, j=journal or None)
+    except ConfigurationError as err:
+        raise ValueError("Invalid write concern (w=%r, journal=%s): %s" % (
+            w, journal, err))
+
+
+def _index_spec(fields):
+    return [(field, pymongo.ASCENDING) for field in fields]
+
+
+def _has_index(index_information, spec, unique):
+    for infos in index_information.values():
+        if list(infos['key']) == spec and bool(infos.get('unique')) == unique:
+            return True
+    return False
+
+#############################################################################
+
+
+class MongoBackend(Backend):
+    """ Store the documents in a mongo db.
+
+    A single client, so a single connections pool, is used for the whole
+    life of the backend: by the dump and by the live updates. The live
+    updates can have their own write concern: not acknowledged (w=0) to
+    not wait for the server, ..
+
+    All the writes are unordered bulk_write() of ReplaceOne, UpdateOne, ..
+    requests: one round trip per (at most 1000) operations.
+    """
+
+    accepts_raw_documents = True
+
+    def __init__(self, db_name, host=None, port=None, uri=None,
+                 max_pool_size=100, write_concern=None,
+                 live_write_concern=None,
+                 connect_timeout_ms=5000, socket_timeout_ms=7500):
+        """
+        :param uri: a mongodb:// URI (replica set, read preference, ..),
+            used instead of host and port if given.
+        :param write_concern: the WriteConcern of the writes,
+            the default one of the client if None.
+        :param live_write_concern: the WriteConcern of the live updates,
+            the 'write_concern' one if None.
+        """
+        self.db_name = db_name
+        self.host = uri or host
+        self.port = None if uri else port
+        self.max_pool_size = max_pool_size
+        self.write_concern = write_concern
+        self.live_write_concern = live_write_concern or write_concern
+        self.connect_timeout_ms = connect_timeout_ms
+        self.socket_timeout_ms = socket_timeout_ms
+        self.client = None
+        self.db = None
+        self._live_db = None
+
+    def _connect_to_mongo(self):
+        return pymongo.MongoClient(self.host, self.port,
+                                   maxPoolSize=self.max_pool_size,
+                                   connectTimeoutMS=self.connect_timeout_ms,
+                                   #serverSelectionTimeoutMS=5000,
+                                   socketTimeoutMS=self.socket_timeout_ms)
+
+    @_translate_errors
+    def connect(self):
+        """ Create the client, only once: on the next calls, only check
+        that mongo is reachable, the client reconnecting by itself. """
+        if self.client is None:
+            client = self._connect_to_mongo()
+            self.db = client.get_database(self.db_name,
+                                          write_concern=self.write_concern)
+            self._live_db = client.get_database(self.db_name,
+                                                write_concern=self.live_write_concern)
+            self.client = client
+        self.db.collection_names()
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = self.db = self._live_db = None
+
+    def create_index(self, collection, fields, unique):
+        collection = self.db[collection]
+        spec = _index_spec(fields)
+        try:
+            collection.create_index(spec, unique=unique)
+            ok = _has_index(collection.index_information(), spec, unique)
+        except ConnectionFailure as err:
+            raise BackendUnavailable(str(err))
+        except PyMongoError as err:
+            logger.error("Could not create index %s (unique=%s) on collection %s: %s",
+                         fields, unique, collection.name, err)
+            return False
+        if not ok:
+            logger.error("Index %s (unique=%s) is missing on collection %s",
+                         fields, unique, collection.name)
+        return ok
+
+    @_translate_errors
+    def create_capped(self, collection, size, max_documents=0):
+        if collection in self.db.collection_names():
+            if self.db[collection].options().get('capped'):
+                return True
+            logger.error("The collection %s exists and is not capped", collection)
+            return False
+        options = {'capped': True, 'size': size}
+        if max_documents:
+            options['max'] = max_documents
+        try:
+            self.db.create_collection(collection, **options)
+        except CollectionInvalid:  # created meanwhile
+            pass
+        return True
+
+    @_translate_errors
+    def drop(self, collection):
+        self.db[collection].drop()
+
+    @_translate_errors
+    def find(self, collection, fields):
+        return list(self.db[collection].find({}, dict.fromkeys(fields, True)))
+
+    @staticmethod
+    def _bulk_write(collection, requests):
+        if not requests:
+            # mongo requires at least one operation for a bulk write
+            return WriteCounts()
+        try:
+            result = collection.bulk_write(requests, ordered=False)
+        except (TypeError, ValueError) as err:  # an invalid document
+            raise BackendError("Error on write to %s : %s" % (collection.name, err))
+        if not result.acknowledged:
+            return None
+        return WriteCounts(matched=result.matched_count,
+                           # None with the mongo versions before 2.6:
+                           modified=result.modified_count or 0,
+                           upserted=result.upserted_count,
+                           inserted=result.inserted_count,
+                           removed=result.deleted_count)
+
+    @_translate_errors
+    def max_value(self, collection, field):
+        doc = self.db[collection].find_one({field: {'$exists': True}},
+                                           sort=[(field, pymongo.DESCENDING)])
+        return None if doc is None else doc[field]
+
+    @_translate_errors
+    def insert(self, collection, documents):
+        return self._bulk_write(self._live_db[collection], [
+            InsertOne(dobj) for dobj in documents])
+
+    @_translate_errors
+    def upsert(self, collection, documents):
+        return self._bulk_write(self.db[collection], [
+            ReplaceOne(key, dobj, upsert=True) for key, dobj in documents])
+
+    @_translate_errors
+    def update(self, collection, updates, revisions=False):
+        if revisions:
+            def update_doc(values):
+                return {'$set': values, '$inc': {REVISION_FIELD: 1},
+                        '$currentDate': {MTIME_FIELD: True}}
+        else:
+            def update_doc(values):
+                return {'$set': values}
+        return self._bulk_write(self._live_db[collection], [
+            UpdateOne(key, update_doc(values), upsert=True) for key, values in updates])
+
+    @_translate_errors
+    def increment(self, collection, increments):
+        return self._bulk_write(self._live_db[collection], [
+            UpdateOne(key, {'$inc': deltas}, upsert=True) for key, deltas in increments])
+
+    @_translate_errors
+    def next_sequence(self, collection, name, count=1):
+        doc = self.db[collection].find_one_and_update(
+            {'name': name}, {'$inc': {'value': count}}, upsert=True,
+            return_document=ReturnDocument.AFTER)
+        return doc['value']
+
+    @_translate_errors
+    def remove(self, collection, ids):
+        return self._bulk_write(self.db[collection], [
+            DeleteOne({'_id': doc_id}) for doc_id in ids])
+
+    @_translate_errors
+    def swap_begin(self, collection):
+        staging = collection + STAGING_SUFFIX
+        self.db[staging].drop()  # left by an interrupted dump
+        # created even if nothing is inserted, for the rename:
+        try:
+            self.db.create_collection(staging)
+        except CollectionInvalid:  # created meanwhile
+            pass
+        return staging
+
+    @_translate_errors
+    def swap_insert(self, staging, documents):
+        return self._bulk_write(self.db[staging], [
+            InsertOne(dobj) for _, dobj in documents])
+
+    @_translate_errors
+    def swap_end(self, collection, staging, prepare=None):
+        if prepare is not None:
+            prepare(staging)
+        self.db[staging].rename(collection, dropTarget=True)
@@ -0,0 +1,146 @@
+import itertools
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+import bson
+
+#############################################################################
+
+
+def bson_size(document):
+    """ Return the BSON size of 'document'. """
+    raw = getattr(document, 'raw', None)  # already encoded (RawBSONDocument)
+    if raw is not None:
+        return len(raw)
+    return len(bson.BSON.encode(document))
+
+
+def document_size(item):
+    """ Return the BSON size of the document of a (key, document) item. """
+    return bson_size(item[1])
+
+
+def iter_batches(items, batch_size, max_bytes=0, size_of=document_size):
+    """ Group the items in lists of at most 'batch_size' items and, if
+    'max_bytes' is set, of at most 'max_bytes' bytes (but at least one item).
+    The batches are produced as the items come, so they can be sent while
+    the next ones are being made.
+    """
+    batch = []
+    n_bytes = 0
+    for item in items:
+        if max_bytes:
+            size = size_of(item)
+            if batch and n_bytes + size > max_bytes:
+                yield batch
+                batch = []
+                n_bytes = 0
+            n_bytes += size
+        batch.append(item)
+        if batch_size and len(batch) >= batch_size:
+            yield batch
+            batch = []
+            n_bytes = 0
+    if batch:
+        yield batch
+
+#############################################################################
+
+_end = object()  # a sentinel to be used..
+
+
+class PipelinedWriter(object):
+    """ Write batches in dedicated threads, started once for the writer
+    lifetime: so that the next batches can be made meanwhile.
+    The batches of a write are given to a session() which is written, in
+    order, by one of the 'threads' (several sessions can be written at
+    once, up to one per thread). At most 'depth' batches wait per thread,
+    put() blocking until there is room.
+    """
+
+    def __init__(self, threads=1, depth=1):
+        self._queues = [queue.Queue(depth) for _ in range(threads)]
+        self._next_queue = itertools.count()
+        self._threads = []
+        for idx, batches in enumerate(self._queues):
+            thread = threading.Thread(target=self._run, args=(batches,),
+                                      name='mongo_liveconfig_writer-%s' % idx)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    @staticmethod
+    def _run(batches):
+        while True:
+            item = batches.get()
+            if item is _end:
+                return
+            session, batch = item
+            session._write_batch(batch)
+
+    def session(self, write):
+        """ Return the PipelinedSession calling 'write' on its batches. """
+        batches = self._queues[next(self._next_queue) % len(self._queues)]
+        return PipelinedSession(batches, write)
+
+    def close(self):
+        """ Stop the threads, once the batches put are written. """
+        for batches in self._queues:
+            batches.put(_end)
+        for thread in self._threads:
+            thread.join()
+
+
+class PipelinedSession(object):
+    """ The batches of a write, see PipelinedWriter.session().
+
+    The first error raised by 'write' stops the writes of the session (its
+    batches still put are discarded) and is raised again by the next put(),
+    or close().
+    """
+
+    def __init__(self, batches, write):
+        self._batches = batches
+        self._write = write
+        self._error = None
+        self._done = threading.Event()
+
+    def _write_batch(self, batch):
+        # in the writer thread:
+        if batch is _end:
+            self._done.set()
+        elif self._error is None:
+            try:
+                self._write(batch)
+            except Exception as err:
+                self._error = err
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def put(self, batch):
+        self._check()
+        self._batches.put((self, batch))
+
+    def close(self):
+        """ Wait for all the batches to be written. """
+        self._batches.put((self, _end))
+        self._done.wait()
+        self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # wait for the batches put, the original exception being raised:
+            self._error = self._error or exc_value
+            self._batches.put((self, _end))
+            self._done.wait()
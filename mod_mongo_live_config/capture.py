@@ -0,0 +1,198 @@
+import json
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+#############################################################################
+
+from alignak.log import logger
+
+#############################################################################
+
+# a capture file is made of records, each starting with its kind:
+#   MAGIC: the start of a capture (the strings numbers start over).
+#   STRING_RECORD: the definition of a string (type, key or attribute),
+#                  by its number and its utf8 bytes, before its first use.
+#   CHANGE_RECORD: a change: its timestamp and the numbers of the strings
+#                  of its type name, object key (json) and attribute.
+MAGIC = b'MLCCAP01'
+STRING_RECORD = b'S'
+CHANGE_RECORD = b'C'
+_string_header = struct.Struct(b'<IH')
+_change = struct.Struct(b'<dIII')
+
+# the size of a string, in utf8 bytes, must fit its 'H' header:
+MAX_STRING_SIZE = 0xFFFF
+
+
+def _iter_records(fh):
+    """ Yield the (kind, fields, offset of its end) of the records of the
+    capture file 'fh'. A truncated record, at the end of a capture which
+    was interrupted, ends it.
+    """
+    while True:
+        kind = fh.read(1)
+        if kind == STRING_RECORD:
+            header = fh.read(_string_header.size)
+            if len(header) < _string_header.size:
+                return
+            sid, size = _string_header.unpack(header)
+            data = fh.read(size)
+            if len(data) < size:
+                return
+            yield kind, (sid, data.decode('utf-8')), fh.tell()
+        elif kind == CHANGE_RECORD:
+            data = fh.read(_change.size)
+            if len(data) < _change.size:
+                return
+            yield kind, _change.unpack(data), fh.tell()
+        elif kind == MAGIC[:1]:
+            rest = fh.read(len(MAGIC) - 1)
+            if len(rest) < len(MAGIC) - 1:
+                return
+            if kind + rest != MAGIC:
+                raise ValueError("Invalid record at offset %s" % (fh.tell() - len(MAGIC)))
+            yield MAGIC, None, fh.tell()
+        elif not kind:
+            return
+        else:
+            raise ValueError("Invalid record at offset %s" % (fh.tell() - 1))
+
+
+class Capture(object):
+    """ Record the attributes changes, as (timestamp, type, key, attribute),
+    in a compact binary file, to replay them later (see read_capture()):
+    about 21 bytes per change, the strings being written once.
+
+    add() only appends to a bounded deque (a ring buffer: beyond
+    'max_changes' the oldest changes are dropped), which a dedicated
+    thread drains to the file every 'interval' seconds.
+    """
+
+    def __init__(self, path, key_of, max_changes=100000, interval=1.0):
+        """
+        :param key_of: function: (cls, obj) -> the key (dict) of obj.
+        """
+        self.path = path
+        self._key_of = key_of
+        self._ring = deque(maxlen=max_changes)
+        self._interval = interval
+        self._strings = {}
+        self._file = self._open(path)
+        self.n_written = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        name='mongo_liveconfig_capture')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @staticmethod
+    def _open(path):
+        """ Open the capture file, to append a new capture to the ones it
+        already has: after the last complete record, if one was truncated.
+        """
+        if not os.path.exists(path):
+            fh = open(path, 'wb')
+        else:
+            fh = open(path, 'r+b')
+            end = 0
+            for _, _, end in _iter_records(fh):
+                pass
+            fh.seek(end)
+            fh.truncate()
+        fh.write(MAGIC)
+        return fh
+
+    def add(self, cls, obj, attr):
+        self._ring.append((time.time(), cls, obj, attr))
+
+    def _string(self, value, new_strings, chunks):
+        """ Return the number of the string 'value'. A new one is only put
+        in 'new_strings', to be registered once its record is written.
+        """
+        sid = self._strings.get(value)
+        if sid is None:
+            sid = new_strings.get(value)
+        if sid is None:
+            data = value.encode('utf-8')
+            if len(data) > MAX_STRING_SIZE:
+                raise ValueError("string of %s bytes, too long to capture" % len(data))
+            sid = new_strings[value] = len(self._strings) + len(new_strings)
+            chunks.append(STRING_RECORD + _string_header.pack(sid, len(data)) + data)
+        return sid
+
+    def _drain(self):
+        ring = self._ring
+        if len(ring) == ring.maxlen:
+            logger.warning("The capture buffer is full, changes are dropped")
+        chunks = []
+        new_strings = {}
+        string = self._string
+        key_cache = {}
+        n_changes = 0
+        while True:
+            try:
+                timestamp, cls, obj, attr = ring.popleft()
+            except IndexError:
+                break
+            try:
+                key_sid = key_cache.get(obj)
+                if key_sid is None:
+                    key = json.dumps(self._key_of(cls, obj), sort_keys=True)
+                    key_sid = key_cache[obj] = string(key, new_strings, chunks)
+                chunks.append(CHANGE_RECORD + _change.pack(
+                    timestamp, string(cls.__name__, new_strings, chunks), key_sid,
+                    string(attr, new_strings, chunks)))
+            except Exception as err:
+                logger.warning("Change of %s.%s not captured: %s", cls.__name__, attr, err)
+                continue
+            n_changes += 1
+        if chunks:
+            self._file.write(b''.join(chunks))
+            self._file.flush()
+        # only now, else the next records could use strings never written:
+        self._strings.update(new_strings)
+        self.n_written += n_changes
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                self._drain()
+            except Exception as err:
+                logger.exception("Error writing the capture file %s: %s",
+                                 self.path, err)
+
+    def close(self):
+        """ Write the changes left and close the file. """
+        self._stop.set()
+        self._thread.join()
+        self._drain()
+        self._file.close()
+
+
+def read_capture(path):
+    """ Yield the (timestamp, type name, key, attribute) of the changes
+    recorded in the capture file 'path'.
+    """
+    strings = {}
+    keys = {}
+    with open(path, 'rb') as fh:
+        if fh.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not a capture file" % path)
+        fh.seek(0)
+        for kind, fields, _ in _iter_records(fh):
+            if kind == CHANGE_RECORD:
+                timestamp, type_sid, key_sid, attr_sid = fields
+                key = keys.get(key_sid)
+                if key is None:
+                    key = keys[key_sid] = json.loads(strings[key_sid])
+                yield timestamp, strings[type_sid], key, strings[attr_sid]
+            elif kind == STRING_RECORD:
+                sid, value = fields
+                strings[sid] = value
+                keys.pop(sid, None)
+            else:  # a new capture
+                strings.clear()
+                keys.clear()
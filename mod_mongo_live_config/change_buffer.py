@@ -0,0 +1,287 @@
+from collections import defaultdict, OrderedDict
+
+import threading
+import time
+import weakref
+
+#############################################################################
+
+# how many masks an AttributeIndex keeps the names of:
+MAX_CACHED_MASKS = 4096
+
+
+class AttributeIndex(object):
+    """ A stable table of the attributes of a class, giving each its bit so
+    that a set of attributes can be stored as a single integer (mask).
+    Unknown attributes are given the next free bit when first seen.
+    """
+
+    def __init__(self, names=()):
+        self.bits = {}
+        self._names = {}  # bit -> name
+        self._masks_names = {}  # mask -> frozenset of names
+        self._lock = threading.Lock()
+        for name in names:
+            self.bit(name)
+
+    def bit(self, name):
+        bit = self.bits.get(name)
+        if bit is None:
+            with self._lock:
+                bit = self.bits.get(name)
+                if bit is None:
+                    bit = 1 << len(self.bits)
+                    self._names[bit] = name
+                    self.bits[name] = bit
+        return bit
+
+    def names(self, mask):
+        """ Return the frozenset of the attributes names set in 'mask'. """
+        res = self._masks_names.get(mask)
+        if res is None:
+            names = self._names
+            res = []
+            bits = mask
+            while bits:
+                low = bits & -bits
+                res.append(names[low])
+                bits ^= low
+            res = frozenset(res)
+            # the same few masks come again and again (the attributes
+            # changed by a check result, ..), but keep this bounded:
+            if len(self._masks_names) >= MAX_CACHED_MASKS:
+                self._masks_names.clear()
+            self._masks_names[mask] = res
+        return res
+
+    def __len__(self):
+        return len(self.bits)
+
+#############################################################################
+
+
+class ChangeBuffer(object):
+    """ Record the attributes changed on the alignak objects, until they
+    are taken, all at once, by swap().
+
+    The changed attributes of an object are recorded as a bit mask, see
+    AttributeIndex, in a buffer owned by the writing thread: thus no other
+    thread can modify it concurrently, and there is no lock involved.
+
+    A writer checks, after having recorded its change, that no swap()
+    happened meanwhile (with the help of a generation counter). If one
+    did, the change may have been recorded in a buffer already taken by
+    swap(), so the writer records it again in a new one. Thus a change is
+    never lost: it is always in the buffers returned by swap() or in the
+    next ones (possibly in both, which is harmless as the values are read
+    back from the objects when written).
+
+    The 'wakeup' event is set when the first object gets a change recorded
+    and when 'max_pending' objects have changes recorded.
+    """
+
+    def __init__(self, max_pending=None, attributes_indexes=None):
+        """
+        :param attributes_indexes: dict: cls -> its AttributeIndex, the
+            ones of the other classes are created when needed.
+        """
+        self.max_pending = max_pending
+        self.wakeup = threading.Event()
+        self.first_change_time = None
+        self._indexes = dict(attributes_indexes or ())
+        self._indexes_lock = threading.Lock()
+        self._n_pending = 0
+        # how many changes were recorded, an estimate as _n_pending is:
+        self.n_changes = 0
+        self._generation = 0
+        self._local = threading.local()
+        # the buffers of the current generation, one per writing thread:
+        self._buffers = []
+
+    @staticmethod
+    def make_objects_updates():
+        # return a dict suitable for storing the objects updated
+        # keys are Alignak objects type (Item, Host, ..)
+        # values are dict :
+        #   with key: the object updated
+        #      value: the mask of its updated attributes
+        return defaultdict(dict)
+
+    def attributes_index(self, cls):
+        index = self._indexes.get(cls)
+        if index is None:
+            with self._indexes_lock:
+                index = self._indexes.get(cls)
+                if index is None:
+                    index = self._indexes[cls] = AttributeIndex()
+        return index
+
+    def add(self, cls, obj, attr):
+        try:
+            bit = self._indexes[cls].bits[attr]
+        except KeyError:
+            bit = self.attributes_index(cls).bit(attr)
+        self.n_changes += 1
+        local = self._local
+        while True:
+            generation = self._generation
+            buf = local.__dict__.get(generation)
+            if buf is None:
+                # our first change of this generation:
+                local.__dict__.clear()
+                buf = local.__dict__[generation] = self.make_objects_updates()
+                self._buffers.append(buf)
+            objects = buf[cls]
+            mask = objects.get(obj)
+            if mask is None:
+                self._new_pending()
+                mask = 0
+            objects[obj] = mask | bit
+            if generation == self._generation:
+                return
+
+    def _new_pending(self):
+        # concurrent writers could make us miss some increments, or write
+        # back a count read before a swap(): it's only an estimate, so the
+        # first change time is set whenever missing, not on the count.
+        self._n_pending = n_pending = self._n_pending + 1
+        if self.first_change_time is None:
+            self.first_change_time = time.time()
+            self.wakeup.set()
+        elif (self.max_pending and n_pending >= self.max_pending
+                and not self.wakeup.is_set()):
+            self.wakeup.set()
+
+    def __len__(self):
+        """ Return the number of objects currently having changes recorded.
+        As it is computed while writers can be adding, it's only an estimate.
+        """
+        return self._n_pending
+
+    def pending_by_type(self):
+        """ Return the number of objects currently having changes recorded,
+        by class name. An estimate too, see __len__().
+        """
+        objects = defaultdict(set)
+        for buf in list(self._buffers):
+            # copies, as swap() does:
+            for cls, cls_objects in list(buf.items()):
+                objects[cls.__name__].update(list(cls_objects))
+        return dict((name, len(cls_objects)) for name, cls_objects in objects.items())
+
+    def swap(self):
+        """ Take the changes recorded so far and start new buffers.
+        Must be called by only one thread at a time.
+        :return: None if there is no change, else a dict:
+            { cls: { obj: frozenset(attributes) } }
+        """
+        if not self._buffers:
+            return None
+        # reset before the swap: a new change could be counted for the
+        # previous buffers, or a writer could write back a count read
+        # before this reset, so the count is only an estimate. The first
+        # change time is set again by the next change recorded in the
+        # new buffers, see _new_pending().
+        self._n_pending = 0
+        self.first_change_time = None
+        previous, self._buffers = self._buffers, []
+        # the generation must change *before* we look at the buffers: a
+        # writer not seeing it did its change before, else it redoes it.
+        self._generation += 1
+        masks = {}
+        for buf in list(previous):
+            # a writer could still be adding to 'buf' (it will redo its
+            # change in a new buffer), so we work on copies which are
+            # each taken in a single, uninterruptible, operation:
+            for cls, objects in list(buf.items()):
+                cls_masks = masks.setdefault(cls, {})
+                for obj, mask in list(objects.items()):
+                    cls_masks[obj] = cls_masks.get(obj, 0) | mask
+            # don't keep the objects alive until the thread adds again:
+            buf.clear()
+        res = {}
+        for cls, cls_masks in masks.items():
+            names = self._indexes[cls].names
+            res[cls] = dict((obj, names(mask)) for obj, mask in cls_masks.items())
+        return res or None
+
+
+class UnwrittenUpdates(object):
+    """ The objects updates taken from a ChangeBuffer but which could not
+    be written yet (mongo unreachable, ..), until they can be.
+
+    The objects are only weakly referenced: the ones deleted meanwhile
+    (by a configuration reload, ..) are not kept alive and their updates
+    are simply forgotten. If 'max_objects' is set, at most that many
+    objects are kept: beyond, the least recently updated ones are evicted,
+    their updates lost, and counted in 'evicted'.
+    """
+
+    def __init__(self, max_objects=None):
+        self.max_objects = max_objects
+        self.evicted = 0
+        # weakref(obj) -> (cls, attributes), the least recently updated first:
+        self._objects = OrderedDict()
+
+    def __len__(self):
+        return len(self._objects)
+
+    def merge(self, objects):
+        """ Add some objects updates, in the ChangeBuffer.swap() format. """
+        if not objects:
+            return
+        pending = self._objects
+        for cls, cls_objects in objects.items():
+            for obj, attrs in cls_objects.items():
+                # the refs of a same (alive) object are equal:
+                ref = weakref.ref(obj)
+                previous = pending.pop(ref, None)
+                if previous is not None:
+                    attrs = previous[1] | attrs
+                pending[ref] = (cls, attrs)
+        self.purge()
+
+    def purge(self):
+        """ Forget the deleted objects, then evict the oldest ones if there
+        are still too many. """
+        pending = self._objects
+        for ref in [ref for ref in pending if ref() is None]:
+            del pending[ref]
+        if self.max_objects:
+            while len(pending) > self.max_objects:
+                pending.popitem(last=False)
+                self.evicted += 1
+
+    def take(self):
+        """ Return all the (still alive) objects updates, in the
+        ChangeBuffer.swap() format, and forget them. """
+        res = {}
+        for ref, (cls, attrs) in self._objects.items():
+            obj = ref()
+            if obj is not None:
+                res.setdefault(cls, {})[obj] = attrs
+        self._objects.clear()
+        return res
+
+#############################################################################
+
+
+def split_objects_updates(objects, max_objects):
+    """ Split the objects updates returned by ChangeBuffer.swap() in
+    several ones, each having at most 'max_objects' objects.
+    """
+    if not max_objects:
+        yield objects
+        return
+    chunk = {}
+    n_objects = 0
+    for cls, cls_objects in objects.items():
+        for obj, attrs in cls_objects.items():
+            chunk.setdefault(cls, {})[obj] = attrs
+            n_objects += 1
+            if n_objects >= max_objects:
+                yield chunk
+                chunk = {}
+                n_objects = 0
+    if chunk:
+        yield chunk
@@ -0,0 +1,61 @@
+from alignak.log import logger
+
+#############################################################################
+
+# the field of the events sequence number:
+SEQUENCE_FIELD = 'seq'
+
+# added to the name of the change feed for the collection of its counter:
+COUNTER_SUFFIX = '_counter'
+
+
+class ChangeFeed(object):
+    """ Append an event per object updated to a capped collection, so that
+    the consumers can tail it (or resume from a sequence number) instead
+    of polling the objects collections. An event is:
+        {'seq': n, 'ts': timestamp, 'type': collection, 'key': {..},
+         'attrs': [the attributes written, ..]}
+    The sequence numbers are unique, even with several schedulers writing
+    the same feed: each flush reserves its own with a shared counter, in
+    the 'counter_collection'.
+    """
+
+    def __init__(self, collection, size, max_events=0):
+        """
+        :param size: the size of the capped collection, in bytes.
+        :param max_events: if set, the number of events it holds at most.
+        """
+        self.collection = collection
+        self.counter_collection = collection + COUNTER_SUFFIX
+        self.size = size
+        self.max_events = max_events
+        self.ready = False
+
+    def ensure(self, backend):
+        """ Create the capped collection if needed, and its counter. """
+        if not backend.create_capped(self.collection, self.size, self.max_events):
+            logger.error("The change feed %s can't be tailed", self.collection)
+        backend.create_index(self.collection, (SEQUENCE_FIELD,), True)
+        backend.create_index(self.counter_collection, ('name',), True)
+        # a feed written before its counter existed:
+        last = backend.max_value(self.collection, SEQUENCE_FIELD) or 0
+        current = backend.next_sequence(self.counter_collection, self.collection, 0)
+        if current < last:
+            backend.next_sequence(self.counter_collection, self.collection,
+                                  last - current)
+        self.ready = True
+
+    def events(self, backend, collections, timestamp):
+        """ Yield the events of the objects updates 'collections', see
+        LiveConfig.write_updates(). Their sequence numbers are reserved
+        at once, on the first one. """
+        n_events = sum(len(ops) for _, ops in collections)
+        if not n_events:
+            return
+        seq = backend.next_sequence(self.counter_collection, self.collection,
+                                    n_events) - n_events
+        for collection, ops in collections:
+            for key, values in ops:
+                seq += 1
+                yield {SEQUENCE_FIELD: seq, 'ts': timestamp, 'type': collection,
+                       'key': key, 'attrs': sorted(values)}
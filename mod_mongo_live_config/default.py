@@ -4,4 +4,102 @@ DEFAULT_DATABASE_HOST = "127.0.0.1"
 DEFAULT_DATABASE_PORT = 27017
 DEFAULT_DATABASE_NAME = "alignak_live"
 
+# if set, the mongodb:// URI used instead of the host and port:
+DEFAULT_URI = ""
+DEFAULT_MAX_POOL_SIZE = 100
+DEFAULT_CONNECT_TIMEOUT_MS = 5000
+DEFAULT_SOCKET_TIMEOUT_MS = 7500
+# the 'w' of the writes: a number of nodes ("0": not acknowledged),
+# or a mode name ("majority", ..):
+DEFAULT_WRITE_CONCERN = "1"
+# the 'w' of the live updates, empty for the write_concern one:
+DEFAULT_LIVE_WRITE_CONCERN = ""
+# wait for the writes to be in the journal:
+DEFAULT_JOURNAL = False
+
 GLOBAL_CONFIG_COLLECTION_NAME = "global_configuration"
+
+# where the documents are stored:
+#   mongo : in the mongo database.
+#   memory : in memory only (tests, benchmarks, ..).
+#   jsonfile : in files of json lines, in the 'jsonfile_dir' directory.
+DEFAULT_BACKEND = "mongo"
+
+# how the alignak objects attributes changes are intercepted:
+#   global : a single hook installed on Item, for every alignak object.
+#   per_class : a dedicated hook, precompiled, on each class we monitor.
+DEFAULT_SETATTR_HOOK = "global"
+
+# when the changes are flushed to mongo, see FlushScheduler:
+DEFAULT_FLUSH_INTERVAL_MS = 1000
+DEFAULT_MAX_LATENCY_MS = 50
+DEFAULT_MAX_PENDING_OBJECTS = 10000
+# how many objects updates are kept while mongo can't be written,
+# the least recently updated are dropped beyond (0: no limit but the
+# number of objects, as the deleted ones are forgotten anyway):
+DEFAULT_MAX_UNWRITTEN_OBJECTS = 0
+
+# where the updates which can't be written to mongo are spooled, on disk,
+# instead of being kept in memory (empty: no spool):
+DEFAULT_SPOOL_DIR = ""
+# beyond that size the oldest spooled updates are dropped:
+DEFAULT_SPOOL_MAX_SIZE_MB = 512
+DEFAULT_SPOOL_SEGMENT_SIZE_MB = 16
+
+# how the arbiter dumps the configuration objects:
+#   drop : the collections are dropped then all their documents inserted.
+#   incremental : only the changed documents are written, and the ones of
+#                 the objects which don't exist anymore are removed.
+#   swap : the documents are inserted in staging collections which then
+#          replace, at once, the live ones.
+DEFAULT_DUMP_MODE = "drop"
+
+# how many collections are dumped in parallel by the arbiter:
+DEFAULT_DUMP_WORKERS = 1
+# how many processes are used to build the documents of the dump (0: none):
+DEFAULT_DUMP_PROCESSES = 0
+# have the dump_processes encode the documents to BSON, which pymongo then
+# sends as they are (needs dump_processes, pymongo >= 3.2 and the mongo
+# backend):
+DEFAULT_RAW_DOCUMENTS = False
+
+# the writes are sent by batches of at most that many documents, and of at
+# most that many bytes (0: no bytes limit, which saves the BSON sizing):
+DEFAULT_BULK_BATCH_SIZE = 1000
+DEFAULT_BULK_MAX_BYTES = 0
+# send a batch, from a dedicated thread, while the next one is being made:
+DEFAULT_BULK_PIPELINE = False
+
+# don't write again the container (list, dict..) attributes whose content
+# is the same as the one last written:
+DEFAULT_SKIP_UNCHANGED = False
+
+# stamp the documents with the number of times they were written (_rev) and
+# when they last were (_mtime, indexed), for the consumers to get the ones
+# changed since a time:
+DEFAULT_REVISIONS = False
+
+# if set, the collection where the services are counted by state,
+# state_type, .. per host, realm and hostgroup (see summaries.py):
+DEFAULT_SUMMARIES = ""
+
+# every how many seconds the metrics summary is logged (0: never), with
+# that many most written attributes:
+DEFAULT_METRICS_INTERVAL = 60
+DEFAULT_METRICS_TOP_ATTRIBUTES = 10
+
+# if set, the capped collection where an event is appended per object
+# updated, of that size and, if set, at most that many events:
+DEFAULT_CHANGE_FEED = ""
+DEFAULT_CHANGE_FEED_SIZE_MB = 64
+DEFAULT_CHANGE_FEED_MAX_EVENTS = 0
+
+# if set, the file where the attributes changes are captured, to be
+# replayed (see benchmarks/replay_capture.py), and how many changes
+# can wait to be written to it (the oldest are dropped beyond):
+DEFAULT_CAPTURE_FILE = ""
+DEFAULT_CAPTURE_BUFFER_SIZE = 100000
+
+# the attributes written at most once every given seconds, per object,
+# as "[collection:]attribute=seconds, ..". Empty: nothing is throttled.
+DEFAULT_THROTTLE = ""
@@ -0,0 +1,79 @@
+import threading
+import time
+
+#############################################################################
+
+
+class FlushScheduler(object):
+    """ Decide when the changes recorded in a ChangeBuffer must be flushed.
+
+    A flush is due as soon as either:
+      - 'max_pending' objects have changes recorded, or
+      - the oldest recorded change is older than 'max_latency' *and*
+        the previous flush is older than 'flush_interval', or
+      - some attributes deferred by the 'throttle', if any, are due.
+    Times are in seconds.
+    """
+
+    def __init__(self, changes, flush_interval, max_latency, max_pending,
+                 throttle=None):
+        self.changes = changes
+        self.flush_interval = flush_interval
+        self.max_latency = max_latency
+        self.max_pending = max_pending
+        self.throttle = throttle
+        self.last_flush = 0
+        # set by stop(): wait() then returns at once, and always will:
+        self.stopped = threading.Event()
+
+    def next_flush_time(self):
+        """ Return the time at which the next flush is due, which can be in
+        the past, or None if there is nothing to flush.
+        """
+        changes = self.changes
+        first_change = changes.first_change_time
+        if self.max_pending and len(changes) >= self.max_pending:
+            # the first change time could be missing, see ChangeBuffer:
+            flush_time = first_change or time.time()
+        elif first_change is None:
+            flush_time = None
+        else:
+            flush_time = max(first_change + self.max_latency,
+                             self.last_flush + self.flush_interval)
+        throttle_due = self.throttle.next_due if self.throttle else None
+        if flush_time is None or (throttle_due is not None
+                                  and throttle_due < flush_time):
+            return throttle_due
+        return flush_time
+
+    def wait(self, timeout):
+        """ Wait for a flush to be due, without polling: the changes buffer
+        wakes us up when needed.
+        :return: True if a flush is due, False if 'timeout' expired before,
+            or if stop() was called.
+        """
+        wakeup = self.changes.wakeup
+        end = time.time() + timeout
+        while True:
+            # clear *before* looking at the buffer, so that a change
+            # recorded after our check will make the wait() return.
+            wakeup.clear()
+            if self.stopped.is_set():
+                return False
+            now = time.time()
+            flush_time = self.next_flush_time()
+            if flush_time is not None and flush_time <= now:
+                return True
+            if now >= end:
+                return False
+            if flush_time is None:
+                flush_time = end
+            wakeup.wait(min(flush_time, end) - now)
+
+    def stop(self):
+        """ Have wait() return, now and from now on. """
+        self.stopped.set()
+        self.changes.wakeup.set()
+
+    def flushed(self):
+        self.last_flush = time.time()
@@ -0,0 +1,152 @@
+from alignak.objects.item import Item
+
+#############################################################################
+
+from .monitored_mutable import get_monitor_type_for
+from .sanitize import types_infos
+
+#############################################################################
+
+_not_exist = object()  # a sentinel to be used..
+
+# what would be used by Item if we weren't there:
+_item_base_setattr = Item.__mro__[1].__setattr__
+
+# the setattr hooks that were in place before we installed ours,
+# so to be able to restore them with uninstall_hooks() :
+_saved_setattrs = {}
+
+SETATTR_HOOK_MODES = ('global', 'per_class')
+
+#############################################################################
+
+
+def make_global_setattr(monitor):
+    """Return the setattr hook to be installed on Item,
+    it will be called for every attribute set on every alignak object.
+    :param monitor: The object on which the changes will be retained.
+    """
+    def hooked_setattr(obj, attr, value):
+        cls = obj.__class__
+        type_infos = types_infos[cls]
+        if attr in type_infos.accepted_properties:
+            retain_change = True
+            mon_type = get_monitor_type_for(value)
+            if mon_type:
+                if not isinstance(value, mon_type):
+                    value = mon_type(value, monitor=monitor, object=obj, attr=attr)
+                else:
+                    if value._object != obj:
+                        raise RuntimeError('WHAT !? obj=%s attr=%s value._object=%s' % (
+                            obj, attr, value._object
+                        ))
+            elif value == getattr(obj, attr, _not_exist):
+                # only retain, for update, the new value if it's different
+                # than the previous one actually..
+                retain_change = False
+            if retain_change:
+                monitor.retain(cls, obj, attr, value)
+        _item_base_setattr(obj, attr, value)
+
+    return hooked_setattr
+
+#############################################################################
+
+
+# the values of these types can't be mutated in place, so comparing them
+# with the previous value is all what is needed to know if they changed:
+_scalar_types = frozenset((
+    type(None), bool, int, long, float, str, unicode,
+))
+
+
+def _make_attr_handler(monitor, cls, attr):
+    """Return the handler to be used when a non-scalar value is set to the
+    attribute 'attr' of an object of class 'cls'.
+    The handler returns the value which must actually be set on the object.
+    """
+    retain = monitor.retain
+
+    def attr_handler(obj, value):
+        mon_type = get_monitor_type_for(value)
+        if mon_type:
+            if not isinstance(value, mon_type):
+                value = mon_type(value, monitor=monitor, object=obj, attr=attr)
+            elif value._object != obj:
+                raise RuntimeError('WHAT !? obj=%s attr=%s value._object=%s' % (
+                    obj, attr, value._object
+                ))
+        elif value == getattr(obj, attr, _not_exist):
+            return value
+        retain(cls, obj, attr, value)
+        return value
+
+    return attr_handler
+
+
+def make_class_setattr(monitor, cls, infos):
+    """Return the setattr hook to be installed on the class 'cls' only.
+    Everything that can be is resolved here, once: setting an attribute
+    which isn't monitored costs a single frozenset lookup, and setting a
+    scalar value on a monitored one doesn't need any extra function call.
+    """
+    handlers = dict(
+        (attr, _make_attr_handler(monitor, cls, attr))
+        for attr in infos.accepted_properties
+    )
+    accepted = frozenset(handlers)
+    scalar_types = _scalar_types
+    retain = monitor.retain
+    base_setattr = _item_base_setattr
+
+    def class_setattr(obj, attr, value):
+        if attr in accepted:
+            if type(value) in scalar_types:
+                if value != getattr(obj, attr, _not_exist):
+                    retain(cls, obj, attr, value)
+            else:
+                value = handlers[attr](obj, value)
+        base_setattr(obj, attr, value)
+
+    class_setattr.accepted_properties = accepted
+    return class_setattr
+
+#############################################################################
+
+
+def _save_setattr(cls):
+    if cls not in _saved_setattrs:
+        _saved_setattrs[cls] = vars(cls).get('__setattr__', _not_exist)
+
+
+def install_global_hook(monitor):
+    _save_setattr(Item)
+    Item.__setattr__ = make_global_setattr(monitor)
+
+
+def install_class_hooks(monitor):
+    for cls, infos in types_infos.items():
+        _save_setattr(cls)
+        cls.__setattr__ = make_class_setattr(monitor, cls, infos)
+
+
+def install_hooks(monitor, mode='global'):
+    if mode == 'global':
+        install_global_hook(monitor)
+    elif mode == 'per_class':
+        install_class_hooks(monitor)
+    else:
+        raise ValueError("Invalid setattr hook mode: %r (expected one of: %s)"
+                         % (mode, ', '.join(SETATTR_HOOK_MODES)))
+
+
+def uninstall_hooks():
+    """Restore the setattr of the classes as they were before
+    any of the install_*() functions was called.
+    """
+    while _saved_setattrs:
+        cls, setattr_func = _saved_setattrs.popitem()
+        if setattr_func is _not_exist:
+            del cls.__setattr__
+        else:
+            cls.__setattr__ = setattr_func
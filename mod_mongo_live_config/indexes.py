@@ -0,0 +1,53 @@
+from alignak.objects.config import Config
+
+#############################################################################
+
+from .sanitize import types_infos
+
+#############################################################################
+
+
+def parse_extra_indexes(value):
+    """ Parse the 'extra_indexes' module directive.
+    It is a comma separated list of indexes, each being:
+        [collection:]field[+field..]
+    An index without collection applies to every object collection
+    (not to the global configuration one).
+    Example: "state, services:host_name+state"
+    :return: a dict: collection name (or None) -> list of fields tuples.
+    """
+    res = {}
+    for spec in value.split(','):
+        spec = spec.strip()
+        if not spec:
+            continue
+        collection, _, fields = spec.rpartition(':')
+        fields = tuple(field.strip() for field in fields.split('+'))
+        if not all(fields):
+            raise ValueError("Invalid index specification: %r" % spec)
+        res.setdefault(collection.strip() or None, []).append(fields)
+    return res
+
+
+def ensure_collection_indexes(backend, collection, cls, extra_indexes=None):
+    """ Create, if needed, and verify the indexes of 'collection', holding
+    the objects of class 'cls': the unique one on their key fields and the
+    extra ones declared for it.
+    :return: True if all the indexes are in place.
+    """
+    infos = types_infos[cls]
+    ok = backend.create_index(collection, infos.key_fields, True)
+    if extra_indexes:
+        extras = list(extra_indexes.get(infos.plural, ()))
+        if cls is not Config:
+            extras.extend(extra_indexes.get(None, ()))
+        for fields in extras:
+            ok = backend.create_index(collection, fields, False) and ok
+    return ok
+
+
+def ensure_indexes(backend, extra_indexes=None):
+    ok = True
+    for cls, infos in types_infos.items():
+        ok = ensure_collection_indexes(backend, infos.plural, cls, extra_indexes) and ok
+    return ok
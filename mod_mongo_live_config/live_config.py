@@ -3,70 +3,284 @@ from __future__ import print_function, with_statement, unicode_literals
 
 #############################################################################
 
-from collections import defaultdict, deque
-
+from collections import defaultdict
+from multiprocessing.pool import ThreadPool
+
+import datetime
+import hashlib
+import itertools
+import json
+import multiprocessing
 import sys
 import threading
 import time
 
 #############################################################################
 
-import pymongo
-from pymongo.errors import PyMongoError
-
-#############################################################################
-
 from alignak.basemodule import BaseModule
 from alignak.daemons.arbiterdaemon import Arbiter
 from alignak.objects.config import Config
-from alignak.objects import Service
+from alignak.objects.service import Service
 from alignak.log import logger
-from alignak.objects.item import Item
+from alignak.util import to_bool
 
 #############################################################################
 
 from .default import (
-    DEFAULT_DATABASE_NAME,
-    DEFAULT_DATABASE_HOST,
-    DEFAULT_DATABASE_PORT,
+    DEFAULT_BULK_BATCH_SIZE,
+    DEFAULT_BULK_MAX_BYTES,
+    DEFAULT_BULK_PIPELINE,
+    DEFAULT_CAPTURE_BUFFER_SIZE,
+    DEFAULT_CAPTURE_FILE,
+    DEFAULT_CHANGE_FEED,
+    DEFAULT_CHANGE_FEED_MAX_EVENTS,
+    DEFAULT_CHANGE_FEED_SIZE_MB,
+    DEFAULT_DUMP_MODE,
+    DEFAULT_DUMP_PROCESSES,
+    DEFAULT_DUMP_WORKERS,
+    DEFAULT_FLUSH_INTERVAL_MS,
+    DEFAULT_MAX_LATENCY_MS,
+    DEFAULT_MAX_PENDING_OBJECTS,
+    DEFAULT_MAX_UNWRITTEN_OBJECTS,
+    DEFAULT_METRICS_INTERVAL,
+    DEFAULT_METRICS_TOP_ATTRIBUTES,
+    DEFAULT_RAW_DOCUMENTS,
+    DEFAULT_REVISIONS,
+    DEFAULT_SETATTR_HOOK,
+    DEFAULT_SKIP_UNCHANGED,
+    DEFAULT_SPOOL_DIR,
+    DEFAULT_SPOOL_MAX_SIZE_MB,
+    DEFAULT_SPOOL_SEGMENT_SIZE_MB,
+    DEFAULT_SUMMARIES,
+    DEFAULT_THROTTLE,
     GLOBAL_CONFIG_COLLECTION_NAME,
 )
-from .monitored_mutable import get_monitor_type_for
+from .backends import (
+    MTIME_FIELD,
+    REVISION_FIELD,
+    BackendError,
+    BackendUnavailable,
+    WriteCounts,
+    make_backend,
+)
+from .batching import PipelinedWriter, bson_size, document_size, iter_batches
+from .capture import Capture
+from .change_buffer import (
+    ChangeBuffer,
+    UnwrittenUpdates,
+    split_objects_updates,
+)
+from .change_feed import ChangeFeed
+from .flush_scheduler import FlushScheduler
+from .metrics import Metrics, format_summary
+from .raw_documents import RAW_DOCUMENTS_SUPPORTED, encode_document, raw_document
+from .spool import Spool
+from .summaries import SUMMARY_ATTRIBUTES, Summaries
+from .throttle import Throttle, parse_throttle
+from .indexes import (
+    ensure_collection_indexes,
+    ensure_indexes,
+    parse_extra_indexes,
+)
+from .hooks import install_hooks, uninstall_hooks, SETATTR_HOOK_MODES
 from .sanitize import (
     types_infos,
     accepted_types,
-    sanitize_value,
-    get_def_attr_value,
+    get_sanitizer,
 )
+from .written_values import WrittenValues, container_types, freeze
 
 #############################################################################
 
+
 _not_exist = object()  # a sentinel to be used..
 
+# where is stored, in the documents, their fingerprint (see dump_mode):
+FINGERPRINT_FIELD = '_fingerprint'
+
+DUMP_MODES = ('drop', 'incremental', 'swap')
+
 #############################################################################
 
 
+# how many objects are sent at once to a dump_processes process:
+SANITIZE_CHUNK_SIZE = 500
+
+# what the dump_processes processes need, they get it when they are forked:
+_dump_context = {}
+
+
+def _make_documents_slice(args):
+    """ Executed by the dump_processes processes:
+    return the (key, document) of a slice of the objects of a type.
+    """
+    cls, start, stop = args
+    module = _dump_context['module']
+    infos = types_infos[cls]
+    objects = getattr(_dump_context['conf'], infos.plural)
+    res = []
+    for obj in itertools.islice(objects, start, stop):
+        dobj = module._make_dump_document(cls, infos, obj)
+        if module._raw_documents:
+            # the bytes are much cheaper to send back than the dict:
+            dobj = encode_document(dobj)
+        res.append((get_object_unique_key(obj, infos), dobj))
+    return res
+
+
+def get_bool(mod_conf, name, default):
+    value = getattr(mod_conf, name, None)
+    if value is None:
+        return default
+    return to_bool(value)
+
+
+def document_fingerprint(doc):
+    """ Return a digest of the document content. """
+    serialized = json.dumps(doc, sort_keys=True, default=repr)
+    return hashlib.md5(serialized.encode('utf-8')).hexdigest()
+
+
 def get_object_unique_key(obj, infos):
-    if isinstance(obj, Service):
-        key = {}
-        for k in ('host_name', 'service_description'):
-            key[k] = getattr(obj, k)
-    else:
-        key = {'%s_name' % infos.singular: obj.get_name()}
+    key_fields = infos.key_fields
+    if len(key_fields) == 1:
+        return {key_fields[0]: obj.get_name()}
+    key = {}
+    for k in key_fields:
+        key[k] = getattr(obj, k)
     return key
 
 #############################################################################
 
 
+class ObjectsUpdates(object):
+    """ The mongo updates built from some objects changes. """
+
+    def __init__(self):
+        # (collection name, [(key, {attr: value}), ..]):
+        self.collections = []
+        # the (obj, {attr: frozen value}) for WrittenValues, once written:
+        self.to_remember = []
+        self.n_objects = 0
+        self.n_attributes = 0
+        self.n_skipped = 0
+        # collection -> {attribute: how many objects have it written}:
+        self.attribute_counts = {}
+
+    def remember_written_values(self, written_values):
+        if written_values is None:
+            return
+        for obj, frozen_values in self.to_remember:
+            written_values.remember(obj, frozen_values)
+
+#############################################################################
+
+
 class LiveConfig(BaseModule):
 
     def __init__(self, mod_conf):
         super(LiveConfig, self).__init__(mod_conf)
-        self._host = getattr(mod_conf, 'hostname', DEFAULT_DATABASE_HOST)
-        self._port = int(getattr(mod_conf, 'port', DEFAULT_DATABASE_PORT))
-        self._db_name = getattr(mod_conf, 'db', DEFAULT_DATABASE_NAME)
+        self._backend = make_backend(mod_conf)
+        self._dump_mode = getattr(mod_conf, 'dump_mode', DEFAULT_DUMP_MODE)
+        if self._dump_mode not in DUMP_MODES:
+            raise ValueError("Invalid dump_mode: %r (expected one of: %s)" % (
+                self._dump_mode, ', '.join(DUMP_MODES)))
+        self._dump_workers = int(getattr(mod_conf, 'dump_workers',
+                                         DEFAULT_DUMP_WORKERS))
+        self._dump_processes = int(getattr(mod_conf, 'dump_processes',
+                                           DEFAULT_DUMP_PROCESSES))
+        self._bulk_batch_size = int(getattr(mod_conf, 'bulk_batch_size',
+                                            DEFAULT_BULK_BATCH_SIZE))
+        self._bulk_max_bytes = int(getattr(mod_conf, 'bulk_max_bytes',
+                                           DEFAULT_BULK_MAX_BYTES))
+        self._bulk_pipeline = get_bool(mod_conf, 'bulk_pipeline', DEFAULT_BULK_PIPELINE)
+        # with bulk_pipeline, started on the first write, see _writer():
+        self._pipelined_writer = None
+        self._pipelined_writer_lock = threading.Lock()
+        self._sanitize_pool = None
+        self._raw_documents = get_bool(mod_conf, 'raw_documents', DEFAULT_RAW_DOCUMENTS)
+        if self._raw_documents:
+            if not self._backend.accepts_raw_documents:
+                raise ValueError("raw_documents requires the mongo backend")
+            if not self._dump_processes:
+                # the arbiter would encode the documents itself, for nothing:
+                raise ValueError("raw_documents requires dump_processes")
+            if self._dump_mode == 'incremental':
+                # the documents fingerprint is added to the dict..
+                raise ValueError("raw_documents can't be used with the "
+                                 "incremental dump_mode")
+            if not RAW_DOCUMENTS_SUPPORTED:
+                logger.warning("raw_documents requires pymongo >= 3.2, ignored")
+                self._raw_documents = False
+        # the numbers of documents written since the start:
+        self.write_counts = WriteCounts()
+        self._write_counts_lock = threading.Lock()
+        self._written_values = None
+        if get_bool(mod_conf, 'skip_unchanged', DEFAULT_SKIP_UNCHANGED):
+            self._written_values = WrittenValues()
+        self._extra_indexes = parse_extra_indexes(
+            getattr(mod_conf, 'extra_indexes', ''))
+        self._revisions = get_bool(mod_conf, 'revisions', DEFAULT_REVISIONS)
+        if self._revisions:
+            # for the range queries on the modification time:
+            self._extra_indexes.setdefault(None, []).append((MTIME_FIELD,))
+        self._dump_mtime = None  # the modification time of the dumped documents
+        self._setattr_hook = getattr(mod_conf, 'setattr_hook', DEFAULT_SETATTR_HOOK)
+        if self._setattr_hook not in SETATTR_HOOK_MODES:
+            raise ValueError("Invalid setattr_hook: %r (expected one of: %s)" % (
+                self._setattr_hook, ', '.join(SETATTR_HOOK_MODES)))
         self._hooked = False
-        self._objects_updated = deque([self.make_objects_updates()])
+        self._max_pending_objects = int(getattr(
+            mod_conf, 'max_pending_objects', DEFAULT_MAX_PENDING_OBJECTS))
+        self._changes = ChangeBuffer(
+            self._max_pending_objects,
+            dict((cls, infos.attributes_index)
+                 for cls, infos in types_infos.items()))
+        self._unwritten = UnwrittenUpdates(int(getattr(
+            mod_conf, 'max_unwritten_objects', DEFAULT_MAX_UNWRITTEN_OBJECTS)))
+        self._spool = None
+        spool_dir = getattr(mod_conf, 'spool_dir', DEFAULT_SPOOL_DIR)
+        if spool_dir:
+            self._spool = Spool(
+                spool_dir,
+                int(getattr(mod_conf, 'spool_max_size_mb',
+                            DEFAULT_SPOOL_MAX_SIZE_MB)) * 1024 * 1024,
+                int(getattr(mod_conf, 'spool_segment_size_mb',
+                            DEFAULT_SPOOL_SEGMENT_SIZE_MB)) * 1024 * 1024)
+        self._throttle = None
+        throttle_conf = parse_throttle(getattr(mod_conf, 'throttle', DEFAULT_THROTTLE))
+        if throttle_conf:
+            self._throttle = Throttle(throttle_conf)
+        self.metrics = Metrics(self._changes, int(getattr(
+            mod_conf, 'metrics_top_attributes', DEFAULT_METRICS_TOP_ATTRIBUTES)))
+        self._metrics_interval = float(getattr(mod_conf, 'metrics_interval',
+                                               DEFAULT_METRICS_INTERVAL))
+        self._flush_scheduler = FlushScheduler(
+            self._changes,
+            float(getattr(mod_conf, 'flush_interval_ms',
+                          DEFAULT_FLUSH_INTERVAL_MS)) / 1000,
+            float(getattr(mod_conf, 'max_latency_ms',
+                          DEFAULT_MAX_LATENCY_MS)) / 1000,
+            self._max_pending_objects,
+            self._throttle,
+        )
+        self._change_feed = None
+        change_feed = getattr(mod_conf, 'change_feed', DEFAULT_CHANGE_FEED)
+        if change_feed:
+            self._change_feed = ChangeFeed(
+                change_feed,
+                int(getattr(mod_conf, 'change_feed_size_mb',
+                            DEFAULT_CHANGE_FEED_SIZE_MB)) * 1024 * 1024,
+                int(getattr(mod_conf, 'change_feed_max_events',
+                            DEFAULT_CHANGE_FEED_MAX_EVENTS)))
+        self._summaries = None
+        summaries = getattr(mod_conf, 'summaries', DEFAULT_SUMMARIES)
+        if summaries:
+            self._summaries = Summaries(summaries)
+        self._capture = None
+        self._capture_file = getattr(mod_conf, 'capture_file', DEFAULT_CAPTURE_FILE)
+        self._capture_buffer_size = int(getattr(mod_conf, 'capture_buffer_size',
+                                                DEFAULT_CAPTURE_BUFFER_SIZE))
         self._stop_requested = False
         self._thread = self.make_thread()
 
@@ -77,61 +291,117 @@ class LiveConfig(BaseModule):
 
     def quit(self):
         self._stop_requested = True
+        if self._hooked:
+            uninstall_hooks()
+            self._hooked = False
+        self._flush_scheduler.stop()
         if self._thread.isAlive():
             logger.debug("Waiting mongo live thread ..")
             self._thread.join()
             logger.info("mongo live thread successfully joined.")
+        if self._pipelined_writer is not None:
+            self._pipelined_writer.close()
+            self._pipelined_writer = None
+        self._backend.close()
+        if self._spool is not None:
+            self._spool.close()
+        if self._capture is not None:
+            self._capture.close()
+            self._capture = None
+            del self.retain
 
     def _thread_run(self):
-        con = None
+        backend = self._backend
+        connected = False
         while not self._stop_requested:
-            if con is None:
+            if not connected:
                 try:
-                    con = self._connect_to_mongo()
-                    db = con[self._db_name]
-                    db.collection_names()
-                except PyMongoError as err:
-                    logger.error("Could not connect to mongo: %s", err)
+                    backend.connect()
+                    ensure_indexes(backend, self._extra_indexes)
+                    if self._change_feed is not None:
+                        self._change_feed.ensure(backend)
+                    if self._summaries is not None:
+                        self._summaries.ensure(backend)
+                    connected = True
+                except BackendError as err:
+                    logger.error("Could not connect to the backend: %s", err)
+                    # don't keep the changed objects alive meanwhile:
+                    self._keep_unwritten(self.test_and_get_objects_updates())
                     time.sleep(1)
                     continue
 
+            if self._spool:
+                # the spooled updates are the oldest, they go first:
+                try:
+                    self._replay_spool()
+                except BackendUnavailable as err:
+                    logger.error("Lost connection to the backend: %s", err)
+                    connected = False
+                    continue
+                except Exception as err:
+                    # a bad record (invalid document, ..) would fail again:
+                    logger.exception("Error replaying the spool, its segment is "
+                                     "set aside as %s: %s", self._spool.quarantine(), err)
+                    continue
+
+            if not self._unwritten and not self._flush_scheduler.wait(1):
+                continue
             objects = self.test_and_get_objects_updates()
+            self._flush_scheduler.flushed()
+            if self._unwritten:
+                self._unwritten.merge(objects)
+                objects = self._unwritten.take()
             if not objects:
-                time.sleep(1)
                 continue
-            # as we don't use any lock around _objects_updated,
-            # this little sleep should ensure that no more threads
-            # will be able to use the previous self._objects_updated
-            # stored locally here in 'objects'.
-            time.sleep(0.1)
-            try:
-                self.do_updates(db, objects)
-            except Exception as err:
-                logger.exception("Fatal error updating objects in mongo: %s", err)
-                con = None
+            # keep the batches bounded, even during checks storms:
+            chunks = split_objects_updates(objects, self._max_pending_objects)
+            for chunk in chunks:
+                try:
+                    self.do_updates(chunk)
+                except BackendUnavailable as err:
+                    logger.error("Lost connection to the backend: %s", err)
+                except Exception as err:
+                    logger.exception("Error updating objects in the backend: %s", err)
+                else:
+                    continue
+                connected = False
+                # they will be written again once reconnected (or, from
+                # the spool, set aside if they fail again):
+                self._keep_unwritten(chunk)
+                for pending in chunks:
+                    self._keep_unwritten(pending)
+                break
+
+    def _keep_unwritten(self, objects):
+        if not objects:
+            return
+        if self._spool is not None:
+            updates = self.make_updates(objects)
+            self._spool.append(updates.collections)
+            # as good as written, the spool will be replayed:
+            updates.remember_written_values(self._written_values)
+            return
+        evicted = self._unwritten.evicted
+        self._unwritten.merge(objects)
+        if self._unwritten.evicted != evicted:
+            logger.warning("Too many objects updates not written to mongo, "
+                           "%s dropped so far", self._unwritten.evicted)
+
+    def _replay_spool(self):
+        t0 = time.time()
+        n_segments = len(self._spool)
+        self._spool.replay(self.write_updates)
+        logger.info("Replayed %s spool segments in %.3f secs",
+                    n_segments, time.time() - t0)
 
     def test_and_get_objects_updates(self):
-        objects = self._objects_updated[0]
+        first_change_time = self._changes.first_change_time
+        objects = self._changes.swap()
         if objects:
-            self._objects_updated.append(self.make_objects_updates())
-            self._objects_updated.popleft()
-            return objects
-        return None
-
-    @staticmethod
-    def make_objects_updates():
-        # return a dict suitable for storing the objects updated
-        # keys are Shinken objects type (Item, Host, ..)
-        # values are defaultdict(dict) :
-        #   with key: the object updated
-        #      value: a set of updated attributes
-        return defaultdict(lambda: defaultdict(set))
-
-    def _connect_to_mongo(self):
-        return pymongo.MongoClient(self._host, self._port,
-                                   connectTimeoutMS=5000,
-                                   #serverSelectionTimeoutMS=5000,
-                                   socketTimeoutMS=7500)
+            self.metrics.taken(objects, time.time() - (first_change_time or time.time()))
+        if self._throttle is not None:
+            objects = self._throttle.apply(objects, time.time())
+        return objects
 
     def hook_late_configuration(self, arbiter):
         pass
@@ -151,88 +421,268 @@ class LiveConfig(BaseModule):
 
     def do_insert(self, arbiter):
         try:
-            with self._connect_to_mongo() as conn:
-                self._do_insert(conn, arbiter)
+            # the backend stays connected, for the next dumps:
+            self._backend.connect()
+            self._do_insert(arbiter)
         except Exception as err:
             logger.exception("I got a fatal error: %s", err)
             sys.exit("I'm in devel/beta mode and I prefer to exit for now,"
                      "please open a ticket with this exception details, thx :)")
 
-    def _do_insert(self, conn, arbiter):
+    def _do_insert(self, arbiter):
         """Do that actual insert(or update) job.
         :param arbiter: The arbiter object.
         :return:
         """
-        db = conn[self._db_name]
-
-        for cls, infos in types_infos.items():
-            if cls is Config:
-                continue  # special cased below ..
-            collection = db[infos.plural]
-            collection.drop()
-            if pymongo.version >= "2.7":
-                bulkop = collection.initialize_unordered_bulk_op()
-            objects = getattr(arbiter.conf, infos.plural)
-            for obj in objects:
-                dobj = {}  # the mongo document which will be stored..
-                for attr in infos.accepted_properties:
-                    # would we use a default value for this attribute
-                    # if the object wouldn't have it ?
-                    def_val_args = get_def_attr_value(attr, cls)
-
-                    try:
-                        val = getattr(obj, attr, *def_val_args)
-                    except AttributeError:
-                        pass
-                    else:
-                        val = sanitize_value(cls, obj, attr, val)
-                        if isinstance(val, accepted_types):
-                            dobj[attr] = val
-                        else:
-                            raise RuntimeError(
-                                "I'm not sure I could handle this type of value "
-                                "and I'm in devel/beta mode,\n"
-                                "so for now I prefer to prematurely exit.\n"
-                                "type=%s, attr=%s, val=%s ; object=%s" %
-                                (type(val), attr, val, obj)
-                            )
-                # end for attr in ..
-
-                key = get_object_unique_key(obj, infos)
+        self._dump_mtime = datetime.datetime.utcnow()
+        types = [cls for cls in types_infos
+                 if cls is not Config]  # Config is special cased below ..
+        # the biggest collections first, so that the workers end together:
+        types.sort(key=lambda cls: len(getattr(arbiter.conf, types_infos[cls].plural)),
+                   reverse=True)
+
+        def dump_type(cls):
+            self._dump_type(arbiter, cls)
+
+        if self._dump_processes:
+            # the processes have to be forked once the context is set:
+            _dump_context.update(module=self, conf=arbiter.conf)
+            self._sanitize_pool = multiprocessing.Pool(self._dump_processes)
+        try:
+            if self._dump_workers > 1:
+                pool = ThreadPool(self._dump_workers)
                 try:
-                    if pymongo.version >= "2.7":
-                        bulkop.find(key).upsert().replace_one(dobj)
-                    else:
-                        collection.update(key, {"$set": dobj}, upsert=True)
-                except Exception as err:
-                    raise RuntimeError("Error on insert/update of %s-%s : %s" %
-                                       (cls, obj.get_name(), err))
+                    pool.map(dump_type, types)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                for cls in types:
+                    dump_type(cls)
+        finally:
+            if self._sanitize_pool is not None:
+                self._sanitize_pool.close()
+                self._sanitize_pool.join()
+                self._sanitize_pool = None
+                _dump_context.clear()
+
+        self._dump_global_config(arbiter)
+        if self._summaries is not None:
+            self._dump_summaries(arbiter)
+
+    def _dump_type(self, arbiter, cls):
+        t0 = time.time()
+        infos = types_infos[cls]
+        objects = getattr(arbiter.conf, infos.plural)
+        documents = self._iter_documents(cls, infos, objects)
+        counts = None
+        if self._dump_mode == 'incremental':
+            counts = self._dump_collection_incremental(cls, infos, documents)
+        elif self._dump_mode == 'swap':
+            counts = self._dump_collection_swap(cls, infos, objects, documents)
+        else:
+            counts = self._dump_collection(cls, infos, documents)
+        if objects:
+            logger.info("Dumped %s %s in %.3f secs", len(objects), infos.plural,
+                        time.time() - t0)
+        if counts is not None:
+            logger.debug("%s: %s", infos.plural, counts)
+
+    def _iter_documents(self, cls, infos, objects):
+        """ Yield the (key, document) of each of the objects.
+        With dump_processes, the documents are made by the processes pool.
+        With raw_documents, those are encoded by the processes: the
+        documents are then RawBSONDocument.
+        """
+        if self._sanitize_pool is None or len(objects) < SANITIZE_CHUNK_SIZE:
+            for obj in objects:
+                dobj = self._make_dump_document(cls, infos, obj)
+                yield get_object_unique_key(obj, infos), dobj
+            return
+        slices = [(cls, start, start + SANITIZE_CHUNK_SIZE)
+                  for start in range(0, len(objects), SANITIZE_CHUNK_SIZE)]
+        for documents in self._sanitize_pool.imap(_make_documents_slice, slices):
+            if self._raw_documents:  # encoded by the processes
+                for key, data in documents:
+                    yield key, raw_document(data)
+            else:
+                for key_dobj in documents:
+                    yield key_dobj
 
-            # end for obj in objects..
+    def _make_document(self, cls, infos, obj):
+        """ Return the mongo document for the object 'obj', of class 'cls'.
+        """
+        dobj = {}  # the mongo document which will be stored..
+        for attr, default_handler, sanitizer in infos.dump_plan.attributes:
+            val = getattr(obj, attr, _not_exist)
+            if val is _not_exist:
+                # would we use a default value for this attribute
+                # as the object doesn't have it ?
+                if default_handler is None:
+                    continue
+                val = default_handler()
+            val = sanitizer(val)
+            if isinstance(val, accepted_types):
+                dobj[attr] = val
+            else:
+                raise RuntimeError(
+                    "I'm not sure I could handle this type of value "
+                    "and I'm in devel/beta mode,\n"
+                    "so for now I prefer to prematurely exit.\n"
+                    "type=%s, attr=%s, val=%s ; object=%s" %
+                    (type(val), attr, val, obj)
+                )
+        # end for attr in ..
+        # so that the unique index on the key always applies:
+        dobj.update(get_object_unique_key(obj, infos))
+        return dobj
+
+    def _make_dump_document(self, cls, infos, obj):
+        """ Return the document of 'obj' as the dump writes it: with the
+        revisions, in a new collection (but with the incremental dump_mode,
+        where the revision follows the previous one, see
+        _dump_collection_incremental()).
+        """
+        dobj = self._make_document(cls, infos, obj)
+        if self._revisions and self._dump_mode != 'incremental':
+            self._stamp_revision(dobj)
+        return dobj
+
+    def _stamp_revision(self, dobj, revision=1):
+        """ As the dump replaces the documents, their revision and
+        modification time are set here (and not by the backend). """
+        dobj[REVISION_FIELD] = revision
+        dobj[MTIME_FIELD] = self._dump_mtime
+
+    def _ensure_indexes(self, collection, cls):
+        ensure_collection_indexes(self._backend, collection, cls, self._extra_indexes)
+
+    def _count_writes(self, counts):
+        """ Add the WriteCounts returned by a backend write to the totals. """
+        with self._write_counts_lock:
+            self.write_counts.add(counts)
+        return counts
+
+    def _writer(self):
+        """ Return the PipelinedWriter of the module, started if needed:
+        with a thread per dump worker, for the collections they dump. """
+        with self._pipelined_writer_lock:
+            if self._pipelined_writer is None:
+                self._pipelined_writer = PipelinedWriter(max(1, self._dump_workers))
+            return self._pipelined_writer
+
+    def _write_batches(self, write, items, size_of=document_size):
+        """ Give the items, by batches, to 'write': as the batches fill,
+        and, with bulk_pipeline, while the next batch is being made.
+        :param size_of: function: item -> its BSON size, for bulk_max_bytes.
+        :return: the WriteCounts of all the batches.
+        """
+        counts = WriteCounts()
+
+        def write_counted(batch):
+            counts.add(write(batch))
+
+        batches = iter_batches(items, self._bulk_batch_size, self._bulk_max_bytes,
+                               size_of)
+        if not self._bulk_pipeline:
+            for batch in batches:
+                write_counted(batch)
+        else:
+            with self._writer().session(write_counted) as writer:
+                for batch in batches:
+                    writer.put(batch)
+        return self._count_writes(counts)
+
+    def _dump_collection(self, cls, infos, documents):
+        self._backend.drop(infos.plural)
+        self._ensure_indexes(infos.plural, cls)
+        return self._write_batches(
+            lambda batch: self._backend.upsert(infos.plural, batch), documents)
+
+    def _dump_collection_incremental(self, cls, infos, documents):
+        """ Only write the documents which changed since the previous dump,
+        and remove the ones of the objects which don't exist anymore.
+        The documents changes are detected with their fingerprint.
+        """
+        backend = self._backend
+        self._ensure_indexes(infos.plural, cls)
+        key_fields = infos.key_fields
+        existing = {}
+        vanished = []
+        for doc in backend.find(infos.plural,
+                                key_fields + (FINGERPRINT_FIELD, REVISION_FIELD)):
+            doc_key = tuple(doc.get(field) for field in key_fields)
+            if doc_key in existing:
+                vanished.append(doc)  # a duplicate..
+            else:
+                existing[doc_key] = doc
 
-            if objects and pymongo.version >= "2.7":
-                # mongo requires at least one document for a bulkop.execute()
-                try:
-                    bulkop.execute()
-                except Exception as err:
-                    raise RuntimeError("Error on bulk execute for collection "
-                                       "%s : %s" % (infos.plural, err))
-        # end for cls, infos in types_infos.items()
+        counts = {'unchanged': 0, 'written': 0}
 
+        def changed():  # the (key, document) to be written
+            for key, dobj in documents:
+                fingerprint = dobj[FINGERPRINT_FIELD] = document_fingerprint(dobj)
+                previous = existing.pop(tuple(key[field] for field in key_fields), None)
+                if previous is not None and previous.get(FINGERPRINT_FIELD) == fingerprint:
+                    counts['unchanged'] += 1
+                    continue
+                counts['written'] += 1
+                if self._revisions:
+                    self._stamp_revision(dobj, 1 if previous is None else
+                                         previous.get(REVISION_FIELD, 0) + 1)
+                yield key, dobj
+
+        write_counts = self._write_batches(
+            lambda batch: backend.upsert(infos.plural, batch), changed())
+        vanished.extend(existing.values())
+        write_counts.add(self._count_writes(
+            backend.remove(infos.plural, [doc['_id'] for doc in vanished])))
+
+        logger.debug("%s: %s documents unchanged, %s written, %s removed",
+                     infos.plural, counts['unchanged'], counts['written'],
+                     len(vanished))
+        return write_counts
+
+    def _dump_collection_swap(self, cls, infos, objects, documents):
+        """ Write the documents in a staging collection which then replaces,
+        at once, the live one: so that the readers never see it empty.
+        """
+        key_fields = infos.key_fields
+        last = {}  # as the upserts would do, the last one of a key wins.
+        for idx, obj in enumerate(objects):
+            key = get_object_unique_key(obj, infos)
+            last[tuple(key[field] for field in key_fields)] = idx
+        documents = (
+            (key, dobj) for idx, (key, dobj) in enumerate(documents)
+            if last[tuple(key[field] for field in key_fields)] == idx)
+        return self._swap_collection(
+            infos.plural, documents, lambda staging: self._ensure_indexes(staging, cls))
+
+    def _swap_collection(self, collection, documents, prepare):
+        """ Replace the content of 'collection' by 'documents', written by
+        batches in a staging collection. 'prepare' is called with the
+        staging collection once filled: to build its indexes.
+        """
+        backend = self._backend
+        staging = backend.swap_begin(collection)
+        counts = self._write_batches(
+            lambda batch: backend.swap_insert(staging, batch), documents)
+        backend.swap_end(collection, staging, prepare)
+        return counts
+
+    def _dump_global_config(self, arbiter):
         # special case for the global configuration values :
-        collection = db[GLOBAL_CONFIG_COLLECTION_NAME]
-        collection.drop()
         dglobal = {}
         macros = {}  # special case for alignak macros ($XXX$)
-        for attr in types_infos[Config].accepted_properties:
-            def_val_args = get_def_attr_value(attr, Config)
-            try:
-                value = getattr(arbiter.conf, attr, *def_val_args)
-            except AttributeError:
-                continue
+        for attr, default_handler, sanitizer in types_infos[Config].dump_plan.attributes:
+            value = getattr(arbiter.conf, attr, _not_exist)
+            if value is _not_exist:
+                if default_handler is None:
+                    continue
+                value = default_handler()
             if not isinstance(value, accepted_types):
                 continue
-            value = sanitize_value(cls, obj, attr, value)
+            value = sanitizer(value)
             # special case, mongo don't accept keys starting with '$',
             # and we'll put that in a subkey of the main document.
             if attr.startswith('$') and attr.endswith('$'):
@@ -248,8 +698,39 @@ class LiveConfig(BaseModule):
                 "Houston, we have a problem..")
         dglobal['macros'] = macros
 
-        key = {'config_name': arbiter.conf.get_name()}
-        collection.update(key, dglobal, True)
+        key = get_object_unique_key(arbiter.conf, types_infos[Config])
+        dglobal.update(key)
+
+        collection = GLOBAL_CONFIG_COLLECTION_NAME
+        if self._revisions:
+            revision = 1
+            if self._dump_mode == 'incremental':  # the collection has one document
+                revision += self._backend.max_value(collection, REVISION_FIELD) or 0
+            self._stamp_revision(dglobal, revision)
+        if self._dump_mode == 'swap':
+            self._swap_collection(collection, [(key, dglobal)],
+                                  lambda staging: self._ensure_indexes(staging, Config))
+            return
+        if self._dump_mode != 'incremental':
+            self._backend.drop(collection)
+        self._ensure_indexes(collection, Config)
+        self._count_writes(self._backend.upsert(collection, [(key, dglobal)]))
+
+    def _dump_summaries(self, arbiter):
+        """ Write the summaries of all the services, which the schedulers
+        then increment. """
+        summaries = self._summaries
+        backend = self._backend
+        documents = summaries.build(arbiter.conf.services)
+        if self._dump_mode == 'swap':
+            self._swap_collection(
+                summaries.collection, documents,
+                lambda staging: summaries.create_index(backend, staging))
+            return
+        backend.drop(summaries.collection)
+        summaries.create_index(backend)
+        self._write_batches(
+            lambda batch: backend.upsert(summaries.collection, batch), documents)
 
     ########################
 
@@ -261,91 +742,147 @@ class LiveConfig(BaseModule):
         if start_thread:
             self._thread.start()
 
-        # had to declare hooked_setattr "encapsulated" here
-        # so to have access to 'self' (where we store the _objects_updated).
-        def hooked_setattr(obj, attr, value):
-            cls = obj.__class__
-            type_infos = types_infos[cls]
-            if attr in type_infos.accepted_properties:
-                retain_change = True
-                mon_type = get_monitor_type_for(value)
-                if mon_type:
-                    if not isinstance(value, mon_type):
-                        value = mon_type(value, monitor=self, object=obj, attr=attr)
-                    else:
-                        if value._object != obj:
-                            raise RuntimeError('WHAT !? obj=%s attr=%s value._object=%s' % (
-                                obj, attr, value._object
-                            ))
-                elif value == getattr(obj, attr, _not_exist):
-                    # only retain, for update, the new value if it's different
-                    # than the previous one actually..
-                    retain_change = False
-                if retain_change:
-                    self.retain(cls, obj, attr, value)
-            super(Item, obj).__setattr__(attr, value)
-
-        Item.__setattr__ = hooked_setattr
+        if self._capture_file:
+            try:
+                self._capture = Capture(
+                    self._capture_file,
+                    lambda cls, obj: get_object_unique_key(obj, types_infos[cls]),
+                    self._capture_buffer_size)
+            except (IOError, OSError, ValueError) as err:
+                logger.error("Could not capture the changes to %s: %s",
+                             self._capture_file, err)
+            else:
+                # so that the hooks, which bind it, capture too:
+                self.retain = self._retain_and_capture
+        install_hooks(self, self._setattr_hook)
 
-    def retain(self, cls, obj, attr, value):
-        self._objects_updated[-1][cls][obj].add(attr)
+    def hook_scheduler_tick(self, scheduler):
+        if not self._metrics_interval:
+            return
+        now = time.time()
+        if now - self.metrics.start_time >= self._metrics_interval:
+            logger.info("mongo live metrics: %s", format_summary(self.metrics.summary()))
 
-    def do_updates(self, db, objs_updated):
+    def retain(self, cls, obj, attr, value):
+        self._changes.add(cls, obj, attr)
 
-        n_updated = 0
-        tot_attr_updated = 0
-        if __debug__:
-            attributes_updated = set()
+    def _retain_and_capture(self, cls, obj, attr, value):
+        self._changes.add(cls, obj, attr)
+        self._capture.add(cls, obj, attr)
 
-        t0 = time.time()
+    def make_updates(self, objs_updated):
+        """ Build the mongo updates of the objects changes.
+        :param objs_updated: see ChangeBuffer.swap().
+        :return: an ObjectsUpdates.
+        """
+        updates = ObjectsUpdates()
+        written_values = self._written_values
 
         for cls, objects in objs_updated.iteritems():
             infos = types_infos[cls]
-            collection = db[infos.plural]
-            if pymongo.version >= "2.7":
-                bulkop = collection.initialize_unordered_bulk_op()
+            sanitizers = infos.sanitizers
+            ops = []
+            attribute_counts = defaultdict(int)
 
             for obj, attr_set in objects.iteritems():
                 dest = {}
-                dobj = {'$set': dest}
-
-                key = get_object_unique_key(obj, infos)
+                frozen_values = {}
 
                 for attr in attr_set:
                     try:
                         value = getattr(obj, attr)
                     except AttributeError:
                         continue
-                    dest[attr] = sanitize_value(cls, obj, attr, value)
-                    if __debug__:
-                        attributes_updated.add(attr)
-
-                tot_attr_updated += len(dest)
-
-                try:
-                    if pymongo.version >= "2.7":
-                        bulkop.find(key).upsert().update_one(dobj)
-                    else:
-                        collection.update(key, dobj, upsert=True)
-                except Exception as err:
-                    raise RuntimeError("Error on insert/update of %s : %s" %
-                                       (obj.get_name(), err))
-                n_updated += 1
+                    sanitizer = sanitizers.get(attr)
+                    if sanitizer is None:
+                        sanitizer = get_sanitizer(cls, attr)
+                    value = sanitizer(value)
+                    if written_values is not None and isinstance(value, container_types):
+                        frozen = freeze(value)
+                        if written_values.is_unchanged(obj, attr, frozen):
+                            updates.n_skipped += 1
+                            continue
+                        frozen_values[attr] = frozen
+                    dest[attr] = value
+                    attribute_counts[attr] += 1
+
+                if not dest:
+                    continue
+                updates.n_attributes += len(dest)
+                if frozen_values:
+                    updates.to_remember.append((obj, frozen_values))
+                ops.append((get_object_unique_key(obj, infos), dest))
             # end for obj, lst in objects.items()
 
-            if objects and pymongo.version >= "2.7":
-                # mongo requires at least one document for a bulkop.execute()
-                try:
-                    bulkop.execute()
-                except Exception as err:
-                    raise RuntimeError("Error on bulk execute for collection "
-                                       "%s : %s" % (infos.plural, err))
-
-        if n_updated:
-            fmt = "updated %s objects with %s attributes in mongo in %s secs"
-            args = [n_updated, tot_attr_updated, time.time() - t0]
-            if __debug__:
-                fmt += " attributes=%s"
-                args.append(attributes_updated)
-            logger.info(fmt, *args)
+            if ops:
+                updates.collections.append((infos.plural, ops))
+                updates.attribute_counts[infos.plural] = attribute_counts
+                updates.n_objects += len(ops)
+        return updates
 
+    def write_updates(self, collections):
+        """ Write the objects updates.
+        :param collections: list of (collection name, [(key, {attr: value}), ..])
+        :return: the WriteCounts of the writes.
+        """
+        counts = WriteCounts()
+
+        def write(collection, batch):
+            self.metrics.batch_written(len(batch))
+            return self._backend.update(collection, batch, self._revisions)
+
+        for collection, ops in collections:
+            counts.add(self._write_batches(
+                lambda batch, collection=collection: write(collection, batch), ops))
+
+        feed = self._change_feed
+        if feed is not None and collections:
+            if not feed.ready:
+                feed.ensure(self._backend)
+            counts.add(self._write_batches(
+                lambda batch: self._backend.insert(feed.collection, batch),
+                feed.events(self._backend, collections, time.time()), bson_size))
+        return counts
+
+    def _summaries_increments(self, objs_updated):
+        """ Return the increments of the summaries by the transitions of the
+        services updated, see Summaries.increments(). To be called before
+        the updates are written: the services collection may have to be
+        read for their previous values.
+        """
+        summaries = self._summaries
+        services = [obj for obj, attr_set in objs_updated.get(Service, {}).iteritems()
+                    if any(attr in SUMMARY_ATTRIBUTES for attr in attr_set)]
+        if not services:
+            return [], []
+        if not summaries.loaded:
+            summaries.ensure(self._backend)
+        return summaries.increments(services)
+
+    def _write_summaries(self, increments, counted):
+        """ Write the increments of the summaries, once the services updates
+        are written. """
+        counts = self._write_batches(
+            lambda batch: self._backend.increment(self._summaries.collection, batch),
+            increments)
+        self._summaries.commit(counted)
+        return counts
+
+    def do_updates(self, objs_updated):
+        t0 = time.time()
+        updates = self.make_updates(objs_updated)
+        t1 = time.time()
+        if self._summaries is not None:
+            increments, counted = self._summaries_increments(objs_updated)
+        counts = self.write_updates(updates.collections)
+        if self._summaries is not None:
+            counts.add(self._write_summaries(increments, counted))
+        t2 = time.time()
+        updates.remember_written_values(self._written_values)
+        self.metrics.flushed(updates, t1 - t0, t2 - t1, counts)
+
+        if updates.n_skipped:
+            logger.debug("skipped %s unchanged attributes", updates.n_skipped)
+        if updates.n_objects:
+            logger.debug("updated %s objects with %s attributes in %.3f secs (%s)",
+                         updates.n_objects, updates.n_attributes, t2 - t0, counts)
@@ -0,0 +1,161 @@
+import heapq
+import threading
+import time
+from collections import defaultdict
+
+#############################################################################
+
+from alignak.stats import statsmgr
+
+#############################################################################
+
+from .backends import WriteCounts
+
+#############################################################################
+
+# the prefix of the timers and counts given to the alignak statsmgr
+# (statsd). It only has incr(), which keeps their min/max/number/sum:
+STATS_PREFIX = 'mongo_live_config'
+
+
+class Metrics(object):
+    """ The activity of the live updates, accumulated over a period, until
+    taken by summary(): for the periodic summary log, to size mongo, find
+    which attributes dominate the writes, ..
+
+    The flushing thread records, the scheduler one takes the summaries:
+    the counters are protected by a lock, taken once per flush or batch.
+    The timings and the counts are also given to the alignak statsmgr: as
+    they come, and the objects pending, by type, on each summary().
+    """
+
+    def __init__(self, changes, top_attributes=10):
+        """
+        :param changes: the ChangeBuffer, for its count of intercepted
+            changes and its number of pending objects.
+        :param top_attributes: how many of the most written attributes
+            are in the summaries.
+        """
+        self._changes = changes
+        self.top_attributes = top_attributes
+        self._lock = threading.Lock()
+        self._n_changes = 0
+        # the changes intercepted so far, as given to the statsmgr:
+        self._n_changes_stats = 0
+        self._reset(time.time())
+
+    def _reset(self, now):
+        self.start_time = now
+        self.n_flushes = 0
+        # the number of objects taken with changes, by type:
+        self.objects_taken = defaultdict(int)
+        # the time the oldest change of each flush waited:
+        self.queue_time_max = 0.0
+        self.queue_time_sum = 0.0
+        self.sanitize_time = 0.0
+        self.write_time = 0.0
+        self.n_objects = 0
+        self.n_attributes = 0
+        self.n_skipped = 0
+        self.n_batches = 0
+        self.batch_documents = 0
+        self.batch_size_max = 0
+        self.write_counts = WriteCounts()
+        # (collection, attribute) -> how many times it was written:
+        self.attribute_writes = defaultdict(int)
+
+    def taken(self, objects, queue_time):
+        """ Record the objects changes taken, see ChangeBuffer.swap(), whose
+        oldest change waited 'queue_time' seconds. """
+        with self._lock:
+            for cls, cls_objects in objects.items():
+                self.objects_taken[cls.__name__] += len(cls_objects)
+            self.queue_time_max = max(self.queue_time_max, queue_time)
+            self.queue_time_sum += queue_time
+        statsmgr.incr(STATS_PREFIX + '.queue_time', queue_time)
+        n_changes = self._changes.n_changes
+        statsmgr.incr(STATS_PREFIX + '.intercepted', n_changes - self._n_changes_stats)
+        self._n_changes_stats = n_changes
+
+    def batch_written(self, size):
+        with self._lock:
+            self.n_batches += 1
+            self.batch_documents += size
+            self.batch_size_max = max(self.batch_size_max, size)
+
+    def flushed(self, updates, sanitize_time, write_time, counts):
+        """ Record a flush of the ObjectsUpdates 'updates'. """
+        with self._lock:
+            self.n_flushes += 1
+            self.sanitize_time += sanitize_time
+            self.write_time += write_time
+            self.n_objects += updates.n_objects
+            self.n_attributes += updates.n_attributes
+            self.n_skipped += updates.n_skipped
+            self.write_counts.add(counts)
+            attribute_writes = self.attribute_writes
+            for collection, attributes in updates.attribute_counts.items():
+                for attr, count in attributes.items():
+                    attribute_writes[(collection, attr)] += count
+        statsmgr.incr(STATS_PREFIX + '.flush.sanitize', sanitize_time)
+        statsmgr.incr(STATS_PREFIX + '.flush.write', write_time)
+        if counts is not None:
+            for field, count in sorted(counts.as_dict().items()):
+                if count:
+                    statsmgr.incr('%s.writes.%s' % (STATS_PREFIX, field), count)
+
+    def summary(self):
+        """ Return the metrics of the period, as a dict, and start a new one.
+        """
+        now = time.time()
+        n_changes = self._changes.n_changes
+        pending_by_type = self._changes.pending_by_type()
+        for type_name, count in sorted(pending_by_type.items()):
+            statsmgr.incr('%s.pending.%s' % (STATS_PREFIX, type_name), count)
+        with self._lock:
+            res = {
+                'period': now - self.start_time,
+                'intercepted': n_changes - self._n_changes,
+                'pending': len(self._changes),
+                'pending_by_type': pending_by_type,
+                'flushes': self.n_flushes,
+                'objects_taken': dict(self.objects_taken),
+                'queue_time_max': self.queue_time_max,
+                'queue_time_avg': (self.queue_time_sum / self.n_flushes
+                                   if self.n_flushes else 0.0),
+                'sanitize_time': self.sanitize_time,
+                'write_time': self.write_time,
+                'objects': self.n_objects,
+                'attributes': self.n_attributes,
+                'skipped': self.n_skipped,
+                'batches': self.n_batches,
+                'batch_size_avg': (float(self.batch_documents) / self.n_batches
+                                   if self.n_batches else 0.0),
+                'batch_size_max': self.batch_size_max,
+                'write_counts': self.write_counts.as_dict(),
+                'top_attributes': heapq.nlargest(
+                    self.top_attributes,
+                    (('%s.%s' % key, count)
+                     for key, count in self.attribute_writes.items()),
+                    key=lambda item: item[1]),
+            }
+            self._n_changes = n_changes
+            self._reset(now)
+        return res
+
+
+def format_summary(summary):
+    """ Return the summary() as a (single) log line. """
+    return (
+        "in %(period).0f secs: %(intercepted)s changes intercepted, "
+        "%(pending)s objects pending, %(flushes)s flushes "
+        "(queue time avg=%(queue_time_avg).3f max=%(queue_time_max).3f secs, "
+        "sanitize=%(sanitize_time).3f write=%(write_time).3f secs), "
+        "%(objects)s objects and %(attributes)s attributes written "
+        "(%(skipped)s unchanged skipped) in %(batches)s batches "
+        "(avg=%(batch_size_avg).1f max=%(batch_size_max)s) " % summary
+        + "objects pending: %s, objects taken: %s, writes: %s, top attributes: %s" % (
+            ' '.join('%s=%s' % item for item in sorted(summary['pending_by_type'].items())),
+            ' '.join('%s=%s' % item for item in sorted(summary['objects_taken'].items())),
+            ' '.join('%s=%s' % item for item in sorted(summary['write_counts'].items())),
+            ' '.join('%s=%s' % item for item in summary['top_attributes'])))
@@ -0,0 +1,21 @@
+import bson
+
+try:
+    from bson.raw_bson import RawBSONDocument
+except ImportError:  # pymongo < 3.2
+    RawBSONDocument = None
+
+#############################################################################
+
+RAW_DOCUMENTS_SUPPORTED = RawBSONDocument is not None
+
+
+def encode_document(dobj):
+    """ Return the BSON bytes of the document 'dobj'. """
+    return bson.BSON.encode(dobj)
+
+
+def raw_document(data):
+    """ Return the document of the BSON bytes 'data', as is: pymongo sends
+    it without walking, nor encoding, it again. """
+    return RawBSONDocument(data)
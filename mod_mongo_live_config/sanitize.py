@@ -20,6 +20,7 @@ else:
 
 #############################################################################
 
+from .change_buffer import AttributeIndex
 from .default import GLOBAL_CONFIG_COLLECTION_NAME
 from .monitored_mutable import Monitored_Mutable
 
@@ -93,12 +94,50 @@ _by_type_skip_attributes = {
 # various data handlers and settings to configure how the serialization
 # from alignak objects to "json-like" objects will be done.
 
+# the attributes changed by (almost) every check result. They are given the
+# lowest bits so that the changes masks stay small integers most of the time:
+_frequently_changed = (
+    'state', 'state_id', 'state_type', 'state_type_id',
+    'last_state', 'last_state_id', 'last_state_type', 'last_state_change',
+    'last_hard_state', 'last_hard_state_id', 'last_hard_state_change',
+    'last_chk', 'next_chk', 'attempt', 'has_been_checked', 'in_checking',
+    'output', 'long_output', 'perf_data', 'last_perf_data', 'return_code',
+    'latency', 'execution_time', 'u_time', 's_time', 'duration_sec',
+    'is_flapping', 'percent_state_change', 'flapping_changes',
+    'last_time_up', 'last_time_down', 'last_time_unreachable',
+    'last_time_ok', 'last_time_warning', 'last_time_critical',
+    'last_time_unknown', 'is_problem', 'is_impact',
+    'state_changed_since_impact', 'current_notification_number',
+    'last_notification', 'problem_has_been_acknowledged',
+    'in_scheduled_downtime',
+)
+
+
 class TypeInfos(object):
-    def __init__(self, singular, clss, plural, accepted_properties):
+    def __init__(self, singular, clss, plural, accepted_properties,
+                 key_fields=None):
         self.singular = singular
         self.clss = clss
         self.plural = plural
         self.accepted_properties = accepted_properties
+        # attribute -> function sanitizing its values, see compile_sanitizer():
+        self.sanitizers = {}
+        # see DumpPlan:
+        self.dump_plan = None
+        # the fields which uniquely identify an object of this type:
+        if key_fields is None:
+            key_fields = ('%s_name' % singular,)
+        self.key_fields = key_fields
+        # the bit of each attribute in the changes masks, see ChangeBuffer:
+        self.attributes_index = AttributeIndex(
+            [attr for attr in _frequently_changed if attr in accepted_properties]
+            + sorted(accepted_properties.difference(_frequently_changed)))
+
+
+_by_type_key_fields = {
+    # the types which objects aren't identified by only their name:
+    Service: ('host_name', 'service_description'),
+}
 
 
 # just to save us to recompute this every time we need to work on a
@@ -111,7 +150,8 @@ def _build_types_infos():
         accepted_properties -= set(_by_type_skip_attributes.get(cls, ()))
         accepted_properties.add('use')
         res[cls] = TypeInfos(cls.__name__.lower(), clss, plural,
-                             accepted_properties)
+                             accepted_properties,
+                             _by_type_key_fields.get(cls))
 
     # Config is a bit special (it has not "plural" class):
     ap = set(Config.properties) | set(Config.running_properties)
@@ -177,13 +217,21 @@ def get_def_attr_value(attr, cls):
     :param attr: The name of the attribute.
     :param cls: The class to which the attribute belongs to.
     """
-    handler = _def_attr_value.get(attr)
-    if not handler:
-        handler = _by_type_def_attr_value.get(cls, {}).get(attr)
+    handler = get_def_attr_handler(attr, cls)
     if handler:
         return handler(),  # NB: don't miss the ',' !
     return ()
 
+
+def get_def_attr_handler(attr, cls):
+    """ Return the handler giving the default value of the attribute 'attr'
+    of the objects of class 'cls', or None if there is no default value.
+    """
+    handler = _def_attr_value.get(attr)
+    if not handler:
+        handler = _by_type_def_attr_value.get(cls, {}).get(attr)
+    return handler
+
 #############################################################################
 
 _by_name_converter = {
@@ -241,6 +289,28 @@ _sanitizer_handlers = {
 }
 
 
+# the values of these types are directly stored as they are in mongo:
+_primitive_types = frozenset((
+    type(None),
+    bool,
+    int,
+    long,
+    float,
+    str,
+    unicode,
+    datetime.datetime,
+    datetime.time,
+))
+
+
+def _all_primitives(values):
+    primitive_types = _primitive_types
+    for value in values:
+        if type(value) not in primitive_types:
+            return False
+    return True
+
+
 def _sanitize_value(value):
     """ Sanitize a value
     :param value:
@@ -249,8 +319,13 @@ def _sanitize_value(value):
     if value is none_object:  # special case
         return None
 
-    handler = _sanitizer_handlers.get(type(value), lambda v: v)
-    value = handler(value)
+    value_type = type(value)
+    if value_type in _primitive_types:
+        return value
+
+    handler = _sanitizer_handlers.get(value_type)
+    if handler is not None:
+        value = handler(value)
 
     if isinstance(value, _alignak_objects_types):
         return value.get_name()
@@ -259,15 +334,79 @@ def _sanitize_value(value):
     # we need to recursively sanitize their value :
     if isinstance(value, Monitored_Mutable):
         base_type = value.get_base_type()
+        if _all_primitives(value):
+            return _sanitize_value(base_type(value))
         return _sanitize_value(
             base_type(_sanitize_value(subval) for subval in value))
     elif isinstance(value, (tuple, list)):
+        if _all_primitives(value):
+            # no need to sanitize its items, but a list is copied: the
+            # document must not share it with the object (which can change
+            # it while the document is still to be written, compared, ..):
+            return value if type(value) is tuple else type(value)(value)
         return type(value)(_sanitize_value(subval)
                            for subval in value)
 
     return value
 
 
+def compile_sanitizer(cls, attr):
+    """ Return the function sanitizing the values of the attribute 'attr'
+    of the objects of class 'cls'.
+    The possible converter of the attribute is resolved once here, and the
+    primitive values are returned without going through _sanitize_value().
+    """
+    converter = _by_name_converter.get(attr)
+    if not converter:
+        converter = _by_type_name_converter.get(cls, {}).get(attr)
+    primitive_types = _primitive_types
+
+    if converter:
+        def sanitizer(value):
+            value = converter(value)
+            if type(value) in primitive_types:
+                return value
+            return _sanitize_value(value)
+    else:
+        def sanitizer(value):
+            if type(value) in primitive_types:
+                return value
+            return _sanitize_value(value)
+
+    return sanitizer
+
+
+class DumpPlan(object):
+    """ What is needed to build the document of an object of a type, all
+    resolved once: 'attributes' is the ordered tuple of the
+        (attribute, default value handler or None, sanitizer)
+    of its accepted properties.
+    """
+    def __init__(self, cls, infos):
+        self.attributes = tuple(
+            (attr, get_def_attr_handler(attr, cls), infos.sanitizers[attr])
+            for attr in sorted(infos.accepted_properties)
+        )
+
+
+def _build_sanitizers_and_plans():
+    for cls, infos in types_infos.items():
+        infos.sanitizers = dict(
+            (attr, compile_sanitizer(cls, attr))
+            for attr in infos.accepted_properties
+        )
+        infos.dump_plan = DumpPlan(cls, infos)
+
+_build_sanitizers_and_plans()
+del _build_sanitizers_and_plans
+
+
+def get_sanitizer(cls, attr):
+    sanitizer = types_infos[cls].sanitizers.get(attr)
+    if sanitizer is None:
+        sanitizer = compile_sanitizer(cls, attr)
+    return sanitizer
+
+
 def sanitize_value(cls, obj, attr, value):
-    value = get_value_by_type_name_val(cls, attr, value)
-    return _sanitize_value(value)
+    return get_sanitizer(cls, attr)(value)
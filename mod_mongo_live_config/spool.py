@@ -0,0 +1,143 @@
+import os
+
+import bson
+from bson.errors import InvalidBSON
+
+#############################################################################
+
+from alignak.log import logger
+
+#############################################################################
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.bson'
+# added to the segments which could not be replayed, set aside:
+QUARANTINE_SUFFIX = '.bad'
+
+# at most this many objects updates per record:
+RECORD_MAX_UPDATES = 1000
+
+
+def _segment_number(filename):
+    if filename.startswith(SEGMENT_PREFIX) and filename.endswith(SEGMENT_SUFFIX):
+        number = filename[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]
+        if number.isdigit():
+            return int(number)
+    return None
+
+
+class Spool(object):
+    """ A write-ahead spool of the updates which could not be written to
+    mongo, so that they are neither lost nor kept in memory meanwhile.
+
+    The updates are appended, as BSON records, to segment files in
+    'directory', and replayed, in the same order, once mongo is back.
+    When the segments total more than 'max_bytes', the oldest ones are
+    dropped. The segments left by a previous run are replayed too.
+
+    The updates are a list of (collection name, [(key, {attr: value}), ..]).
+    """
+
+    def __init__(self, directory, max_bytes, segment_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.evicted = 0  # the number of segments dropped
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        numbers = [_segment_number(filename) for filename in os.listdir(directory)]
+        self._segments = sorted(number for number in numbers if number is not None)
+        self._sizes = dict((number, os.path.getsize(self._path(number)))
+                           for number in self._segments)
+        self._file = None  # the file of the last segment, when appending to it
+
+    def _path(self, number):
+        return os.path.join(self.directory,
+                            '%s%010d%s' % (SEGMENT_PREFIX, number, SEGMENT_SUFFIX))
+
+    def __len__(self):
+        """ Return the number of segments waiting to be replayed. """
+        return len(self._segments)
+
+    def size(self):
+        return sum(self._sizes.values())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def append(self, updates):
+        """ Durably add some updates at the end of the spool. """
+        data = []
+        for collection, ops in updates:
+            for start in range(0, len(ops), RECORD_MAX_UPDATES):
+                record_ops = ops[start:start + RECORD_MAX_UPDATES]
+                data.append(bson.BSON.encode({
+                    'collection': collection,
+                    'updates': [{'key': key, 'set': values}
+                                for key, values in record_ops],
+                }))
+        if not data:
+            return
+        data = b''.join(data)
+        if self._file is None or self._sizes[self._segments[-1]] >= self.segment_bytes:
+            self._new_segment()
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._sizes[self._segments[-1]] += len(data)
+        self._evict()
+
+    def _new_segment(self):
+        self.close()
+        number = self._segments[-1] + 1 if self._segments else 0
+        self._file = open(self._path(number), 'ab')
+        self._segments.append(number)
+        self._sizes[number] = 0
+
+    def _evict(self):
+        # the segment being appended to is never dropped:
+        while len(self._segments) > 1 and self.size() > self.max_bytes:
+            number = self._segments.pop(0)
+            del self._sizes[number]
+            os.remove(self._path(number))
+            self.evicted += 1
+            logger.warning("Spool %s is full, dropped its oldest segment "
+                           "(%s dropped so far)", self.directory, self.evicted)
+
+    def replay(self, write):
+        """ Give, in order, the spooled updates to 'write' and remove them.
+        If 'write' raises, the replay stops there and the exception is
+        propagated: the current segment will be replayed again, from its
+        start, by the next replay (the updates being idempotent).
+        """
+        self.close()
+        while self._segments:
+            number = self._segments[0]
+            path = self._path(number)
+            with open(path, 'rb') as fh:
+                try:
+                    for record in bson.decode_file_iter(fh):
+                        write([(record['collection'],
+                                [(op['key'], op['set']) for op in record['updates']])])
+                except InvalidBSON as err:
+                    # a record partially written (we were killed, ..):
+                    logger.error("Invalid record in spool segment %s, "
+                                 "skipping the rest of it: %s", path, err)
+            os.remove(path)
+            self._segments.pop(0)
+            del self._sizes[number]
+
+    def quarantine(self):
+        """ Set aside the first segment, which replay() could not write:
+        it is renamed with QUARANTINE_SUFFIX, to be inspected, and is not
+        replayed anymore.
+        :return: its new path.
+        """
+        self.close()
+        number = self._segments.pop(0)
+        del self._sizes[number]
+        path = self._path(number)
+        os.rename(path, path + QUARANTINE_SUFFIX)
+        return path + QUARANTINE_SUFFIX
@@ -0,0 +1,171 @@
+from collections import defaultdict
+
+#############################################################################
+
+from alignak.objects.host import Host
+from alignak.objects.service import Service
+
+#############################################################################
+
+from .sanitize import get_sanitizer, types_infos
+
+#############################################################################
+
+# the attributes of the services which are counted, per value (the strings)
+# or when true (the booleans):
+SUMMARY_ATTRIBUTES = ('state', 'state_type', 'problem_has_been_acknowledged',
+                      'in_scheduled_downtime')
+
+# the fields identifying a summary: the kind of group of services it counts
+# ('all', 'host', 'realm' or 'hostgroup') and the name of the group:
+SUMMARY_KEY_FIELDS = ('group', 'name')
+
+# the field counting all the services of the group:
+TOTAL_FIELD = 'services'
+
+
+def _field_name(value):
+    # mongo field names can't hold '.' nor start with '$':
+    return unicode(value).replace('.', '_').replace('$', '_')
+
+
+def counted_fields(values):
+    """ Return the fields of a summary counting a service of those
+    SUMMARY_ATTRIBUTES 'values', as dotted paths ('state.OK', ..). """
+    fields = [TOTAL_FIELD]
+    for attr, value in zip(SUMMARY_ATTRIBUTES, values):
+        if isinstance(value, bool):
+            if value:
+                fields.append(attr)
+        elif value is not None:
+            fields.append('%s.%s' % (attr, _field_name(value)))
+    return fields
+
+
+def service_groups(service):
+    """ Return the (group, name) of the summaries counting 'service': the one
+    of all the services, of its host and, once linked to it, of its realm
+    and of its host hostgroups. """
+    groups = [('all', ''), ('host', service.host_name)]
+    host = getattr(service, 'host', None)
+    if host is not None:
+        realm = get_sanitizer(Host, 'realm')(getattr(host, 'realm', None))
+        if realm:
+            groups.append(('realm', realm))
+        hostgroups = get_sanitizer(Host, 'hostgroups')(getattr(host, 'hostgroups', None))
+        for hostgroup in hostgroups or ():
+            if hostgroup:
+                groups.append(('hostgroup', hostgroup))
+    return groups
+
+
+def _document(group, counts):
+    """ Return the summary document of 'group', of the 'counts' by field. """
+    dobj = dict(zip(SUMMARY_KEY_FIELDS, group))
+    for path, count in counts.items():
+        parent = dobj
+        names = path.split('.')
+        for name in names[:-1]:
+            parent = parent.setdefault(name, {})
+        parent[names[-1]] = count
+    return dobj
+
+
+class Summaries(object):
+    """ Maintain the number of services by state, state_type, .. per group
+    of services (see service_groups()), in a summaries collection: so that
+    the dashboards read a document instead of aggregating the services.
+
+    The arbiter dump builds the summaries of all the services (build()),
+    then the schedulers increment them by the transitions of the services
+    (increments()): from their values last counted, which are remembered
+    by service key, after being read, once, from the services collection.
+    The key, not the Service object, so that the new objects of a reloaded
+    configuration start from what was counted for their services.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        # the values last counted, by service key (None: not yet read):
+        self._counted = None
+
+    @property
+    def loaded(self):
+        return self._counted is not None
+
+    @staticmethod
+    def values_of(service):
+        return tuple(get_sanitizer(Service, attr)(getattr(service, attr, None))
+                     for attr in SUMMARY_ATTRIBUTES)
+
+    @staticmethod
+    def _key_of(service):
+        return tuple(getattr(service, field, None)
+                     for field in types_infos[Service].key_fields)
+
+    def create_index(self, backend, collection=None):
+        return backend.create_index(collection or self.collection,
+                                    SUMMARY_KEY_FIELDS, True)
+
+    def ensure(self, backend):
+        """ Create the index of the summaries, and read the values of the
+        services, if not done yet. """
+        self.create_index(backend)
+        if self._counted is None:
+            key_fields = types_infos[Service].key_fields
+            self._counted = dict(
+                (tuple(doc.get(field) for field in key_fields),
+                 tuple(doc.get(attr) for attr in SUMMARY_ATTRIBUTES))
+                for doc in backend.find(types_infos[Service].plural,
+                                        key_fields + SUMMARY_ATTRIBUTES))
+
+    def build(self, services):
+        """ Return the (key, document) of the summaries of all the
+        'services'. """
+        counts = defaultdict(lambda: defaultdict(int))
+        for service in services:
+            fields = counted_fields(self.values_of(service))
+            for group in service_groups(service):
+                group_counts = counts[group]
+                for field in fields:
+                    group_counts[field] += 1
+        return [(dict(zip(SUMMARY_KEY_FIELDS, group)), _document(group, fields_counts))
+                for group, fields_counts in counts.items()]
+
+    def increments(self, services):
+        """ Return the increments of the summaries for the changed 'services':
+        [(key, {field: delta})], and the values to commit() once written.
+        """
+        deltas = defaultdict(lambda: defaultdict(int))
+        counted = []
+        for service in services:
+            key = self._key_of(service)
+            values = self.values_of(service)
+            previous = self._counted.get(key) if self._counted else None
+            if values == previous:
+                continue
+            changes = defaultdict(int)
+            for field in counted_fields(values):
+                changes[field] += 1
+            if previous is not None:
+                for field in counted_fields(previous):
+                    changes[field] -= 1
+            for group in service_groups(service):
+                group_deltas = deltas[group]
+                for field, delta in changes.items():
+                    group_deltas[field] += delta
+            counted.append((key, values))
+        increments = []
+        for group, group_deltas in deltas.items():
+            group_deltas = dict((field, delta)
+                                for field, delta in group_deltas.items() if delta)
+            if group_deltas:
+                increments.append((dict(zip(SUMMARY_KEY_FIELDS, group)), group_deltas))
+        return increments, counted
+
+    def commit(self, counted):
+        """ Remember the values counted by the increments written. """
+        if self._counted is None:
+            self._counted = {}
+        for key, values in counted:
+            self._counted[key] = values
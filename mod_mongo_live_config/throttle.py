@@ -0,0 +1,130 @@
+import weakref
+
+#############################################################################
+
+from .sanitize import types_infos
+
+#############################################################################
+
+
+def parse_throttle(value):
+    """ Parse the 'throttle' module directive.
+    It is a comma separated list of:
+        [collection:]attribute=seconds
+    An attribute without collection is throttled for every object type.
+    Example: "next_chk=30, last_chk=10, services:latency=60"
+    :return: a dict: collection name (or None) -> {attribute: seconds}
+    """
+    res = {}
+    for spec in value.split(','):
+        spec = spec.strip()
+        if not spec:
+            continue
+        attr, sep, seconds = spec.partition('=')
+        collection, _, attr = attr.rpartition(':')
+        try:
+            seconds = float(seconds)
+        except ValueError:
+            seconds = None
+        if not sep or not attr.strip() or seconds is None or seconds < 0:
+            raise ValueError("Invalid throttle specification: %r" % spec)
+        res.setdefault(collection.strip() or None, {})[attr.strip()] = seconds
+    return res
+
+#############################################################################
+
+
+class Throttle(object):
+    """ Limit how often some (high frequency) attributes are written.
+
+    An attribute throttled for 'n' seconds is written at most once every
+    'n' seconds per object: in between, its changes are deferred. The not
+    throttled attributes (state, state_type, ..) are never deferred, and
+    when an object is written anyway its deferred attributes are written
+    with it (coalesced) as it costs nothing more.
+    """
+
+    def __init__(self, throttle_conf):
+        plurals = dict((infos.plural, cls) for cls, infos in types_infos.items())
+        for collection in throttle_conf:
+            if collection is not None and collection not in plurals:
+                raise ValueError("Unknown collection in throttle: %r" % collection)
+        self._intervals = {}  # cls -> {attr: seconds}
+        for cls, infos in types_infos.items():
+            intervals = dict(throttle_conf.get(None, {}))
+            intervals.update(throttle_conf.get(infos.plural, {}))
+            if intervals:
+                self._intervals[cls] = intervals
+        self._last_written = weakref.WeakKeyDictionary()  # obj -> {attr: time}
+        self._deferred = {}  # cls -> WeakKeyDictionary(obj -> set(attrs))
+        # when the first deferred attribute will be due, None if none:
+        self.next_due = None
+
+    def apply(self, objects, now):
+        """ Filter the objects updates taken from a ChangeBuffer.
+        :param objects: { cls: { obj: attributes } } or None.
+        :return: the objects updates to be written now, same format.
+        """
+        res = {}
+        if objects:
+            for cls, cls_objects in objects.items():
+                intervals = self._intervals.get(cls)
+                if intervals is None:
+                    res[cls] = cls_objects
+                    continue
+                deferred = self._deferred.get(cls)
+                if deferred is None:
+                    self._deferred[cls] = deferred = weakref.WeakKeyDictionary()
+                to_write = res[cls] = {}
+                for obj, attrs in cls_objects.items():
+                    pending = deferred.pop(obj, None)
+                    if pending:
+                        attrs = pending.union(attrs)
+                    attrs = self._filter(obj, attrs, intervals, deferred, now)
+                    if attrs:
+                        to_write[obj] = attrs
+        if self.next_due is not None and self.next_due <= now:
+            self._add_due(res, now)
+        return dict((cls, cls_objects) for cls, cls_objects in res.items()
+                    if cls_objects)
+
+    def _filter(self, obj, attrs, intervals, deferred, now):
+        last_written = self._last_written.get(obj)
+        if last_written is None:
+            self._last_written[obj] = last_written = {}
+        hold = set()
+        for attr in attrs:
+            interval = intervals.get(attr)
+            if interval is not None and now < last_written.get(attr, 0) + interval:
+                hold.add(attr)
+        if hold and len(hold) == len(attrs):
+            deferred[obj] = hold
+            due = min(last_written[attr] + intervals[attr] for attr in hold)
+            if self.next_due is None or due < self.next_due:
+                self.next_due = due
+            return None
+        # the object is written: the held attributes go with it.
+        for attr in attrs:
+            if attr in intervals:
+                last_written[attr] = now
+        return attrs
+
+    def _add_due(self, res, now):
+        next_due = None
+        for cls, deferred in self._deferred.items():
+            intervals = self._intervals[cls]
+            to_write = res.setdefault(cls, {})
+            for obj, hold in list(deferred.items()):
+                if obj in to_write:
+                    continue
+                last_written = self._last_written[obj]
+                due = min(last_written.get(attr, 0) + intervals[attr]
+                          for attr in hold)
+                if due <= now:
+                    del deferred[obj]
+                    for attr in hold:
+                        last_written[attr] = now
+                    to_write[obj] = hold
+                elif next_due is None or due < next_due:
+                    next_due = due
+        self.next_due = next_due
@@ -0,0 +1,50 @@
+import weakref
+
+#############################################################################
+
+# only the (sanitized) values of these types are remembered, the others
+# are scalars which the setattr hooks already don't retain if unchanged:
+container_types = (list, tuple, dict)
+
+
+def freeze(value):
+    """ Return an immutable copy of a sanitized value, suitable for
+    comparing it later with the same value, even if mutated in between.
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(subval) for subval in value)
+    if isinstance(value, dict):
+        return frozenset((key, freeze(subval)) for key, subval in value.items())
+    return value
+
+#############################################################################
+
+_not_exist = object()  # a sentinel to be used..
+
+
+class WrittenValues(object):
+    """ Remember, per object, the last container values written to mongo,
+    so that the attributes which were retained but whose content didn't
+    actually change (an append then a pop, ..) aren't written again.
+    The objects are weakly referenced: they are forgotten when deleted.
+    """
+
+    def __init__(self):
+        self._values = weakref.WeakKeyDictionary()
+
+    def is_unchanged(self, obj, attr, frozen):
+        """ Return True if 'frozen' is the last value written for 'attr'. """
+        written = self._values.get(obj)
+        return written is not None and written.get(attr, _not_exist) == frozen
+
+    def remember(self, obj, values):
+        """ Record the values just written for 'obj'.
+        :param values: dict attr -> frozen value.
+        """
+        written = self._values.get(obj)
+        if written is None:
+            self._values[obj] = written = {}
+        written.update(values)
+
+    def __len__(self):
+        return len(self._values)
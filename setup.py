@@ -64,11 +64,14 @@ setup(
     author_email='gregory.starck@savoirfairelinux.com',
     url='https://github.com/savoirfairelinux/mod-mongo-live-config',
     license=license,
-    packages=find_packages(exclude=('tests', 'docs')),
+    packages=find_packages(exclude=('tests', 'docs', 'benchmarks')),
     install_requires=[
-        "pymongo==3.0",
+        "pymongo>=3.0",
     ],
     extras_require={
+        'raw_documents': [
+            "pymongo>=3.2",
+        ],
         'test': [
             unittest_pkg,
             'nose==1.3',
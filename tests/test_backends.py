@@ -0,0 +1,443 @@
+import datetime
+import os
+import shutil
+import tempfile
+import time
+
+import alignak.objects.module
+from alignak.objects.host import Host
+from alignak.objects.service import Service
+
+from mod_mongo_live_config.backends import BackendError, WriteCounts, make_backend
+from mod_mongo_live_config.backends.jsonfile import JsonFileBackend
+from mod_mongo_live_config.backends.memory import MemoryBackend
+from mod_mongo_live_config.backends.mongo import MongoBackend
+from mod_mongo_live_config.change_feed import ChangeFeed
+from mod_mongo_live_config.spool import Spool
+
+import test_mongo_live_config
+from test_mongo_live_config import unittest, dictconf, make_module_instance
+
+
+def without_ids(documents):
+    res = []
+    for doc in documents:
+        doc = dict(doc)
+        del doc['_id']
+        res.append(doc)
+    return sorted(res, key=lambda doc: (doc.get('host_name'),
+                                        doc.get('service_description')))
+
+
+class Test_MemoryBackend(unittest.TestCase):
+
+    def make_backend(self):
+        return MemoryBackend()
+
+    def setUp(self):
+        self.backend = self.make_backend()
+        self.backend.connect()
+
+    def tearDown(self):
+        self.backend.close()
+
+    def reloaded(self):
+        return self.backend
+
+    def test_upsert_update(self):
+        backend = self.backend
+        backend.upsert('hosts', [({'host_name': 'h1'}, {'host_name': 'h1', 'a': 1}),
+                                 ({'host_name': 'h2'}, {'host_name': 'h2', 'a': 2})])
+        backend.upsert('hosts', [({'host_name': 'h1'}, {'host_name': 'h1', 'b': 1})])
+        backend.update('hosts', [({'host_name': 'h2'}, {'b': 2}),
+                                 ({'host_name': 'h3'}, {'b': 3})])
+        expected = [{'host_name': 'h1', 'b': 1},
+                    {'host_name': 'h2', 'a': 2, 'b': 2},
+                    {'host_name': 'h3', 'b': 3}]
+        self.assertEqual(expected, without_ids(self.backend.documents('hosts')))
+        self.assertEqual(expected, without_ids(self.reloaded().documents('hosts')))
+
+    def test_increment(self):
+        backend = self.backend
+        key = {'group': 'all', 'name': ''}
+        self.assertEqual(WriteCounts(upserted=1),
+                         backend.increment('summaries', [(key, {'n': 2, 'state.OK': 2})]))
+        self.assertEqual(WriteCounts(matched=1, modified=1),
+                         backend.increment('summaries', [(key, {'state.OK': -1,
+                                                                'state.CRITICAL': 1})]))
+        expected = [{'group': 'all', 'name': '', 'n': 2,
+                     'state': {'OK': 1, 'CRITICAL': 1}}]
+        self.assertEqual(expected, without_ids(backend.documents('summaries')))
+        self.assertEqual(expected, without_ids(self.reloaded().documents('summaries')))
+
+    def test_next_sequence(self):
+        backend = self.backend
+        self.assertEqual(0, backend.next_sequence('counters', 'feed', 0))
+        self.assertEqual(3, backend.next_sequence('counters', 'feed', 3))
+        self.assertEqual(1, backend.next_sequence('counters', 'other'))
+        self.assertEqual(3, self.reloaded().next_sequence('counters', 'feed', 0))
+
+    def test_update_revisions(self):
+        backend = self.backend
+        backend.upsert('hosts', [({'host_name': 'h1'}, {'host_name': 'h1', 'a': 1})])
+        backend.update('hosts', [({'host_name': 'h1'}, {'a': 1})], revisions=True)
+        # modified, even with the same values:
+        self.assertEqual(WriteCounts(matched=1, modified=1),
+                         backend.update('hosts', [({'host_name': 'h1'}, {'a': 1})],
+                                        revisions=True))
+        backend.update('hosts', [({'host_name': 'h2'}, {'a': 2})], revisions=True)
+        hosts = dict((doc['host_name'], doc) for doc in backend.documents('hosts'))
+        self.assertEqual(2, hosts['h1']['_rev'])
+        self.assertEqual(1, hosts['h2']['_rev'])
+        self.assertIsInstance(hosts['h1']['_mtime'], datetime.datetime)
+        self.assertLessEqual(hosts['h1']['_mtime'], hosts['h2']['_mtime'])
+        reloaded = dict((doc['host_name'], doc)
+                        for doc in self.reloaded().documents('hosts'))
+        self.assertEqual(2, reloaded['h1']['_rev'])
+        self.assertIn('_mtime', reloaded['h1'])
+
+    def test_write_counts(self):
+        backend = self.backend
+        h1 = ({'host_name': 'h1'}, {'host_name': 'h1', 'a': 1})
+        self.assertEqual(WriteCounts(upserted=1), backend.upsert('hosts', [h1]))
+        self.assertEqual(WriteCounts(matched=1), backend.upsert('hosts', [h1]))
+        self.assertEqual(WriteCounts(matched=1, modified=1, upserted=1),
+                         backend.update('hosts', [({'host_name': 'h1'}, {'a': 2}),
+                                                  ({'host_name': 'h2'}, {'a': 2})]))
+        ids = [doc['_id'] for doc in backend.find('hosts', ())]
+        self.assertEqual(WriteCounts(removed=2), backend.remove('hosts', ids))
+        self.assertEqual(WriteCounts(), backend.remove('hosts', ids))
+
+    def test_capped(self):
+        backend = self.backend
+        backend.insert('feed', [{'seq': 1}])
+        self.assertTrue(backend.create_capped('feed', 1 << 20, 3))
+        self.assertEqual(WriteCounts(inserted=3),
+                         backend.insert('feed', [{'seq': seq} for seq in (2, 3, 4)]))
+        self.assertEqual([2, 3, 4], [doc['seq'] for doc in backend.documents('feed')])
+        self.assertEqual(4, backend.max_value('feed', 'seq'))
+        self.assertEqual(None, backend.max_value('feed', 'other'))
+        self.assertEqual(None, backend.max_value('nothing', 'seq'))
+        self.assertEqual([2, 3, 4], [doc['seq'] for doc
+                                     in self.reloaded().documents('feed')])
+
+    def test_values_copied(self):
+        values = {'impacts': ['a']}
+        self.backend.update('hosts', [({'host_name': 'h1'}, values)])
+        values['impacts'].append('b')
+        self.assertEqual(['a'], self.backend.documents('hosts')[0]['impacts'])
+
+    def test_find_remove(self):
+        backend = self.backend
+        backend.update('services', [
+            ({'host_name': 'h1', 'service_description': 's%s' % idx}, {'state': 'OK'})
+            for idx in range(3)])
+        docs = backend.find('services', ('service_description',))
+        self.assertEqual(3, len(docs))
+        self.assertEqual(set(['_id', 'service_description']), set(docs[0]))
+        removed = [doc['_id'] for doc in docs
+                   if doc['service_description'] != 's1']
+        backend.remove('services', removed)
+        backend.update('services', [
+            ({'host_name': 'h1', 'service_description': 's0'}, {'state': 'CRITICAL'})])
+        expected = [
+            {'host_name': 'h1', 'service_description': 's0', 'state': 'CRITICAL'},
+            {'host_name': 'h1', 'service_description': 's1', 'state': 'OK'},
+        ]
+        self.assertEqual(expected, without_ids(backend.documents('services')))
+        self.assertEqual(expected, without_ids(self.reloaded().documents('services')))
+
+    def test_swap_drop(self):
+        backend = self.backend
+        backend.upsert('hosts', [({'host_name': 'h1'}, {'host_name': 'h1'})])
+        staging = backend.swap_begin('hosts')
+        self.assertEqual(WriteCounts(inserted=1), backend.swap_insert(
+            staging, [({'host_name': 'h2'}, {'host_name': 'h2'})]))
+        # not yet in place:
+        self.assertEqual([{'host_name': 'h1'}], without_ids(backend.documents('hosts')))
+        prepared = []
+        backend.swap_end('hosts', staging, prepared.append)
+        self.assertEqual([staging], prepared)
+        self.assertEqual([{'host_name': 'h2'}], without_ids(backend.documents('hosts')))
+        self.assertEqual([{'host_name': 'h2'}],
+                         without_ids(self.reloaded().documents('hosts')))
+        self.backend.drop('hosts')
+        self.assertEqual([], self.backend.documents('hosts'))
+        self.assertEqual([], self.reloaded().documents('hosts'))
+
+
+class Test_JsonFileBackend(Test_MemoryBackend):
+
+    def make_backend(self):
+        self.directory = tempfile.mkdtemp(prefix='jsonfile')
+        return JsonFileBackend(self.directory)
+
+    def tearDown(self):
+        super(Test_JsonFileBackend, self).tearDown()
+        shutil.rmtree(self.directory)
+
+    def reloaded(self):
+        backend = JsonFileBackend(self.directory)
+        backend.connect()
+        backend.close()
+        return backend
+
+    def test_not_json_values(self):
+        now = datetime.datetime(2015, 10, 16, 12, 0)
+        self.backend.update('hosts', [({'host_name': 'h1'}, {'last_seen': now})])
+        self.assertEqual([{'host_name': 'h1', 'last_seen': str(now)}],
+                         without_ids(self.reloaded().documents('hosts')))
+
+
+class Test_Make_Backend(unittest.TestCase):
+
+    def make_conf(self, **kw):
+        dconf = dict(dictconf, module_alias='live')
+        dconf.update(kw)
+        return alignak.objects.module.Module(dconf)
+
+    def test_make_backend(self):
+        self.assertIsInstance(make_backend(self.make_conf(backend='memory')),
+                              MemoryBackend)
+        self.assertIsInstance(
+            make_backend(self.make_conf(backend='jsonfile', jsonfile_dir='/tmp/x')),
+            JsonFileBackend)
+        self.assertRaises(ValueError, make_backend, self.make_conf(backend='jsonfile'))
+        self.assertRaises(ValueError, make_backend, self.make_conf(backend='foo'))
+
+    def test_mongo_backend(self):
+        backend = make_backend(self.make_conf())
+        self.assertIsInstance(backend, MongoBackend)
+        self.assertEqual(('127.0.0.1', 27017), (backend.host, backend.port))
+        self.assertEqual({'w': 1}, backend.write_concern.document)
+        self.assertEqual({'w': 1}, backend.live_write_concern.document)
+
+        uri = 'mongodb://db1,db2/?replicaSet=rs0&readPreference=secondaryPreferred'
+        backend = make_backend(self.make_conf(
+            uri=uri, max_pool_size='10', write_concern='majority',
+            live_write_concern='0', journal='1'))
+        self.assertEqual((uri, None), (backend.host, backend.port))
+        self.assertEqual(10, backend.max_pool_size)
+        self.assertEqual({'w': 'majority', 'j': True}, backend.write_concern.document)
+        self.assertEqual({'w': 0}, backend.live_write_concern.document)
+
+        self.assertRaises(ValueError, make_backend, self.make_conf(
+            write_concern='0', journal='1'))
+
+
+class Test_Module_MemoryBackend(unittest.TestCase):
+    """ The module, end to end, with no need for a mongod. """
+
+    def make_arbiter(self, n_hosts):
+        arbiter = test_mongo_live_config.SimpleTest.make_arbiter()
+        for idx in range(n_hosts):
+            arbiter.conf.hosts.append(Host({'host_name': 'host%s' % idx}))
+            arbiter.conf.services.append(Service({
+                'host_name': 'host%s' % idx, 'service_description': 'srv'}))
+        return arbiter
+
+    def check_dump(self, **kw):
+        mod = make_module_instance(**kw)
+        backend = mod._backend
+        arbiter = self.make_arbiter(3)
+        mod.do_insert(arbiter)
+        self.assertEqual(3, len(backend.documents('hosts')))
+        self.assertEqual(3, len(backend.documents('services')))
+        self.assertEqual(1, len(backend.documents('global_configuration')))
+
+        arbiter.conf.hosts.pop()
+        arbiter.conf.hosts[0].alias = 'changed'
+        mod.do_insert(arbiter)
+        hosts = dict((doc['host_name'], doc) for doc in backend.documents('hosts'))
+        self.assertEqual(['host0', 'host1'], sorted(hosts))
+        self.assertEqual('changed', hosts['host0']['alias'])
+        self.assertIn((('host_name',), True),
+                      backend.collections['hosts'].indexes)
+        self.assertIn((('host_name', 'service_description'), True),
+                      backend.collections['services'].indexes)
+        return mod
+
+    def test_dump_drop(self):
+        self.check_dump()
+
+    def test_dump_incremental(self):
+        self.check_dump(dump_mode='incremental')
+
+    def test_dump_swap(self):
+        self.check_dump(dump_mode='swap')
+
+    def test_dump_swap_batches(self):
+        mod = self.check_dump(dump_mode='swap', bulk_batch_size='2',
+                              bulk_pipeline='1')
+        # 3 + 2 hosts, 3 + 3 services, the global configuration, twice:
+        self.assertEqual(13, mod.write_counts.inserted)
+
+    def test_dump_parallel(self):
+        self.check_dump(dump_workers='4')
+
+    def test_dump_batches(self):
+        self.check_dump(dump_mode='incremental', bulk_batch_size='2',
+                        bulk_max_bytes='200', bulk_pipeline='1')
+
+    def test_updates(self):
+        mod = make_module_instance(bulk_batch_size='1', bulk_pipeline='1')
+        arbiter = self.make_arbiter(2)
+        mod.do_insert(arbiter)
+        # the pipelined writes of the dump and of the flushes share it:
+        writer = mod._pipelined_writer
+        self.assertIsNotNone(writer)
+        mod.hook_pre_scheduler_mod_start(None, start_thread=False)
+        try:
+            mod.test_and_get_objects_updates()
+            host = arbiter.conf.hosts[1]
+            host.output = 'all is fine'
+            host.impacts = ['srv']
+            mod.do_updates(mod.test_and_get_objects_updates())
+            self.assertIs(writer, mod._pipelined_writer)
+        finally:
+            mod.quit()
+        self.assertIsNone(mod._pipelined_writer)
+        hosts = dict((doc['host_name'], doc) for doc in mod._backend.documents('hosts'))
+        self.assertEqual('all is fine', hosts['host1']['output'])
+        self.assertEqual(['srv'], hosts['host1']['impacts'])
+        self.assertEqual('', hosts['host0']['output'])
+        self.assertEqual(1, mod.write_counts.modified)
+
+    def test_revisions(self):
+        mod = make_module_instance(revisions='1', dump_mode='incremental')
+        backend = mod._backend
+        arbiter = self.make_arbiter(2)
+        mod.do_insert(arbiter)
+        first_mtime = backend.documents('hosts')[0]['_mtime']
+        arbiter.conf.hosts[0].alias = 'changed'
+        mod.do_insert(arbiter)
+        hosts = dict((doc['host_name'], doc) for doc in backend.documents('hosts'))
+        self.assertEqual(2, hosts['host0']['_rev'])
+        self.assertLess(first_mtime, hosts['host0']['_mtime'])
+        self.assertEqual(1, hosts['host1']['_rev'])
+        self.assertEqual(first_mtime, hosts['host1']['_mtime'])
+        self.assertEqual(2, backend.documents('global_configuration')[0]['_rev'])
+        self.assertIn((('_mtime',), False), backend.collections['hosts'].indexes)
+
+        mod.hook_pre_scheduler_mod_start(None, start_thread=False)
+        try:
+            mod.test_and_get_objects_updates()
+            arbiter.conf.hosts[1].output = 'all is fine'
+            mod.do_updates(mod.test_and_get_objects_updates())
+        finally:
+            mod.quit()
+        hosts = dict((doc['host_name'], doc) for doc in backend.documents('hosts'))
+        self.assertEqual(2, hosts['host1']['_rev'])
+        self.assertLess(first_mtime, hosts['host1']['_mtime'])
+
+    def test_revisions_drop(self):
+        mod = make_module_instance(revisions='1')
+        arbiter = self.make_arbiter(2)
+        mod.do_insert(arbiter)
+        mod.do_insert(arbiter)
+        self.assertEqual([1, 1], [doc['_rev']
+                                  for doc in mod._backend.documents('hosts')])
+
+    def test_spool_bad_segment(self):
+        spool_dir = tempfile.mkdtemp(prefix='spool')
+        self.addCleanup(shutil.rmtree, spool_dir)
+        spool = Spool(spool_dir, 1 << 20, 1 << 20)
+        spool.append([('hosts', [({'host_name': 'bad'}, {'output': 'x'})])])
+        spool.close()
+        mod = make_module_instance(spool_dir=spool_dir, flush_interval_ms='10',
+                                   max_latency_ms='10')
+        update = mod._backend.update
+
+        def failing_update(collection, updates, revisions=False):
+            if updates[0][0] == {'host_name': 'bad'}:
+                raise BackendError('invalid document')
+            return update(collection, updates, revisions)
+
+        mod._backend.update = failing_update
+        arbiter = self.make_arbiter(1)
+        mod.hook_pre_scheduler_mod_start(None)
+        try:
+            arbiter.conf.hosts[0].output = 'written'
+            deadline = time.time() + 5
+            while time.time() < deadline and not mod._backend.documents('hosts'):
+                time.sleep(0.01)
+        finally:
+            mod.quit()
+        # the writer thread went on, and the segment is set aside:
+        self.assertEqual(['written'], [doc['output']
+                                       for doc in mod._backend.documents('hosts')])
+        self.assertEqual(['segment-0000000000.bson.bad'], os.listdir(spool_dir))
+
+    def test_updates_error(self):
+        mod = make_module_instance(max_pending_objects='1', flush_interval_ms='10',
+                                   max_latency_ms='10')
+        update = mod._backend.update
+        calls = []
+
+        def failing_update(collection, updates, revisions=False):
+            calls.append(updates)
+            if len(calls) == 2:  # in the middle of the flush
+                raise BackendError('invalid document')
+            return update(collection, updates, revisions)
+
+        mod._backend.update = failing_update
+        arbiter = self.make_arbiter(3)
+        mod.hook_pre_scheduler_mod_start(None, start_thread=False)
+        try:
+            for host in arbiter.conf.hosts:
+                host.output = 'written'
+            mod._thread.start()
+            deadline = time.time() + 5
+            while time.time() < deadline and len(mod._backend.documents('hosts')) < 3:
+                time.sleep(0.01)
+        finally:
+            mod.quit()
+        # the chunk which failed, and the next ones, were written again:
+        self.assertEqual(['written'] * 3, [doc['output']
+                                           for doc in mod._backend.documents('hosts')])
+        self.assertGreater(len(calls), 3)
+
+    def test_change_feed(self):
+        mod = make_module_instance(change_feed='changes')
+        arbiter = self.make_arbiter(2)
+        mod.do_insert(arbiter)
+        mod.hook_pre_scheduler_mod_start(None, start_thread=False)
+        try:
+            mod.test_and_get_objects_updates()
+            host = arbiter.conf.hosts[1]
+            host.output = 'all is fine'
+            host.last_chk = 1445000000
+            service = arbiter.conf.services[0]
+            service.output = 'fine too'
+            mod.do_updates(mod.test_and_get_objects_updates())
+            service.output = 'still fine'
+            mod.do_updates(mod.test_and_get_objects_updates())
+        finally:
+            mod.quit()
+        events = sorted(mod._backend.documents('changes'), key=lambda doc: doc['seq'])
+        self.assertEqual([1, 2, 3], [event['seq'] for event in events])
+        events = dict((event['type'], event) for event in events[:2])
+        self.assertEqual({'host_name': 'host1'}, events['hosts']['key'])
+        self.assertEqual(['last_chk', 'output'], events['hosts']['attrs'])
+        self.assertEqual(['output'], events['services']['attrs'])
+
+        self.assertIn((('seq',), True), mod._backend.collections['changes'].indexes)
+
+        # another scheduler writing the same feed gets its own numbers:
+        other = ChangeFeed('changes', 1 << 20)
+        other.ensure(mod._backend)
+        updates = [('hosts', [({'host_name': 'host0'}, {'a': 1})])]
+        self.assertEqual([4], [event['seq'] for event
+                               in other.events(mod._backend, updates, 0)])
+        self.assertEqual([5], [event['seq'] for event
+                               in mod._change_feed.events(mod._backend, updates, 0)])
+
+        # a feed written before its counter, the sequence goes on after it:
+        mod._backend.drop('changes_counter')
+        other.ensure(mod._backend)
+        self.assertEqual([4], [event['seq'] for event
+                               in other.events(mod._backend, updates, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import threading
+
+from mod_mongo_live_config.batching import PipelinedWriter, iter_batches
+
+from test_mongo_live_config import unittest
+
+
+def make_items(number, size=10):
+    return [({'host_name': 'h%s' % idx}, {'output': 'x' * size})
+            for idx in range(number)]
+
+
+class Test_Iter_Batches(unittest.TestCase):
+
+    def test_batch_size(self):
+        batches = list(iter_batches(range(7), 3))
+        self.assertEqual([[0, 1, 2], [3, 4, 5], [6]], batches)
+        self.assertEqual([], list(iter_batches([], 3)))
+        self.assertEqual([list(range(7))], list(iter_batches(range(7), 0)))
+
+    def test_max_bytes(self):
+        items = make_items(10, size=100)
+        batches = list(iter_batches(items, 1000, max_bytes=300))
+        self.assertEqual(items, sum(batches, []))
+        self.assertEqual([2] * 5, [len(batch) for batch in batches])
+
+        # a document larger than max_bytes still gets its own batch:
+        batches = list(iter_batches(items[:3], 1000, max_bytes=10))
+        self.assertEqual([[item] for item in items[:3]], batches)
+
+    def test_lazy(self):
+        consumed = []
+
+        def items():
+            for idx in range(5):
+                consumed.append(idx)
+                yield idx
+
+        batches = iter_batches(items(), 2)
+        self.assertEqual([0, 1], next(batches))
+        self.assertEqual([0, 1], consumed)
+
+
+class Test_PipelinedWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.writer = PipelinedWriter()
+        self.addCleanup(self.writer.close)
+
+    def test_order(self):
+        written = []
+        writer = PipelinedWriter(depth=2)
+        with writer.session(written.append) as session:
+            for batch in iter_batches(range(100), 7):
+                session.put(batch)
+        writer.close()
+        self.assertEqual(list(range(100)), sum(written, []))
+
+    def test_sessions(self):
+        # the same threads write all the sessions:
+        writer = PipelinedWriter(threads=2)
+        threads = []
+
+        def write(batch):
+            threads.append(threading.current_thread())
+
+        for _ in range(4):
+            with writer.session(write) as session:
+                session.put([1])
+        writer.close()
+        self.assertEqual(2, len(set(threads)))
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+
+    def test_overlap(self):
+        # the next batch is made while the previous one is being written:
+        writing = threading.Event()
+        resume = threading.Event()
+
+        def write(batch):
+            writing.set()
+            resume.wait(5)
+
+        with self.writer.session(write) as session:
+            session.put([1])
+            self.assertTrue(writing.wait(5))
+            session.put([2])  # doesn't wait for the first batch to be written
+            resume.set()
+
+    def test_error(self):
+        written = []
+
+        def write(batch):
+            if batch == [2]:
+                raise ValueError("failed")
+            written.append(batch)
+
+        def run():
+            with self.writer.session(write) as session:
+                for idx in range(1, 4):
+                    session.put([idx])
+
+        # raised by put() or close(), once [2] failed:
+        self.assertRaises(ValueError, run)
+        self.assertEqual([[1]], written)
+        # the next sessions are written:
+        with self.writer.session(write) as session:
+            session.put([4])
+        self.assertEqual([[1], [4]], written)
+
+    def test_error_on_put(self):
+        def write(batch):
+            raise ValueError("failed")
+
+        def run():
+            with self.writer.session(write) as session:
+                for idx in range(100):
+                    session.put([idx])
+
+        self.assertRaises(ValueError, run)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+
+from alignak.objects.host import Host
+
+from mod_mongo_live_config.capture import MAX_STRING_SIZE, Capture, read_capture
+
+from test_mongo_live_config import unittest, make_module_instance
+
+
+class Obj(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+def key_of(cls, obj):
+    return {'name': obj.name}
+
+
+class Test_Capture(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='capture')
+        self.path = os.path.join(self.directory, 'changes.cap')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def capture(self, changes):
+        capture = Capture(self.path, key_of, interval=0.01)
+        for obj, attr in changes:
+            capture.add(Obj, obj, attr)
+        capture.close()
+
+    def read(self):
+        return [(type_name, key, attr)
+                for _, type_name, key, attr in read_capture(self.path)]
+
+    def test_read_write(self):
+        obj1, obj2 = Obj('o1'), Obj('o2')
+        self.capture([(obj1, 'state'), (obj2, 'state'), (obj1, 'output')])
+        self.assertEqual([('Obj', {'name': 'o1'}, 'state'),
+                          ('Obj', {'name': 'o2'}, 'state'),
+                          ('Obj', {'name': 'o1'}, 'output')], self.read())
+        timestamps = [timestamp for timestamp, _, _, _ in read_capture(self.path)]
+        self.assertEqual(sorted(timestamps), timestamps)
+
+    def test_appended(self):
+        self.capture([(Obj('o1'), 'state')])
+        # a record truncated by a crash is dropped:
+        with open(self.path, 'ab') as fh:
+            fh.write(b'C\x00\x01')
+        self.assertEqual([('Obj', {'name': 'o1'}, 'state')], self.read())
+        # the strings of a new capture are numbered again:
+        self.capture([(Obj('o2'), 'output')])
+        self.assertEqual([('Obj', {'name': 'o1'}, 'state'),
+                          ('Obj', {'name': 'o2'}, 'output')], self.read())
+
+    def test_not_a_capture(self):
+        with open(self.path, 'wb') as fh:
+            fh.write(b'something else')
+        self.assertRaises(ValueError, list, read_capture(self.path))
+
+    def test_ring_buffer(self):
+        capture = Capture(self.path, key_of, max_changes=2, interval=60)
+        for idx in range(5):
+            capture.add(Obj, Obj('o%s' % idx), 'state')
+        capture.close()
+        self.assertEqual(['o3', 'o4'], [key['name'] for _, key, _ in self.read()])
+
+    def test_bad_changes(self):
+        def bad_key_of(cls, obj):
+            if obj.name == 'bad':
+                raise AttributeError('name')
+            return key_of(cls, obj)
+
+        capture = Capture(self.path, bad_key_of, interval=60)
+        capture.add(Obj, Obj('bad'), 'state')
+        capture.add(Obj, Obj('o1'), 'x' * (MAX_STRING_SIZE + 1))
+        capture.add(Obj, Obj('o2'), 'state')
+        capture.close()
+        self.assertEqual([('Obj', {'name': 'o2'}, 'state')], self.read())
+
+    def test_failed_drain(self):
+        capture = Capture(self.path, key_of, interval=60)
+        fh = capture._file
+        capture._file = None  # the write fails
+        capture.add(Obj, Obj('o1'), 'state')
+        self.assertRaises(AttributeError, capture._drain)
+        capture._file = fh
+        capture.add(Obj, Obj('o1'), 'state')
+        capture.add(Obj, Obj('o2'), 'output')
+        capture.close()
+        # the strings of the failed drain are written again:
+        self.assertEqual([('Obj', {'name': 'o1'}, 'state'),
+                          ('Obj', {'name': 'o2'}, 'output')], self.read())
+        self.assertEqual(2, capture.n_written)
+
+    def test_module_capture(self):
+        mod = make_module_instance(capture_file=self.path)
+        host = Host({'host_name': 'h1'})
+        mod.hook_pre_scheduler_mod_start(None, start_thread=False)
+        try:
+            host.output = 'all is fine'
+            host.impacts = []
+            host.impacts.append('srv')
+        finally:
+            mod.quit()
+        # the list is monitored, its changes in place are captured too:
+        self.assertEqual([('Host', {'host_name': 'h1'}, 'output'),
+                          ('Host', {'host_name': 'h1'}, 'impacts'),
+                          ('Host', {'host_name': 'h1'}, 'impacts')], self.read())
+        self.assertNotIn('retain', vars(mod))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import sys
+import threading
+import weakref
+
+from alignak.objects.service import Service
+
+from mod_mongo_live_config.change_buffer import (
+    AttributeIndex,
+    ChangeBuffer,
+    UnwrittenUpdates,
+)
+from mod_mongo_live_config.sanitize import types_infos
+
+from test_mongo_live_config import unittest
+
+
+class Obj(object):
+    pass
+
+
+class Test_ChangeBuffer(unittest.TestCase):
+
+    def test_swap(self):
+        buf = ChangeBuffer()
+        self.assertIsNone(buf.swap())
+        obj = Obj()
+        buf.add(Obj, obj, 'a')
+        buf.add(Obj, obj, 'b')
+        buf.add(Obj, obj, 'a')
+        self.assertEqual(1, len(buf))
+        self.assertEqual({Obj: {obj: frozenset(['a', 'b'])}}, buf.swap())
+        self.assertEqual(0, len(buf))
+        self.assertIsNone(buf.swap())
+
+    def test_stale_count_after_swap(self):
+        buf = ChangeBuffer()
+        buf.add(Obj, Obj(), 'a')
+        buf.swap()
+        # as written back by a writer which read it before the swap:
+        buf._n_pending = 3
+        self.assertIsNone(buf.first_change_time)
+        buf.add(Obj, Obj(), 'a')
+        self.assertIsNotNone(buf.first_change_time)
+
+    def test_no_change_lost_under_concurrency(self):
+        n_writers = 8
+        n_changes = 20000
+        # 313 objects and 64 attributes per writer: as they are coprime,
+        # each change is on a different (object, attribute) pair.
+        n_attrs = 64
+        objects = [Obj() for _ in range(313)]
+        buf = ChangeBuffer()
+        received = set()
+        writers_done = threading.Event()
+
+        def writer(idx):
+            for i in range(n_changes):
+                # different writers do change the same objects:
+                buf.add(Obj, objects[i % len(objects)],
+                        'attr_%s_%s' % (idx, i % n_attrs))
+
+        def consumer():
+            while not writers_done.is_set():
+                self._collect(buf.swap(), received)
+            self._collect(buf.swap(), received)
+
+        # make the threads switch as often as possible:
+        if hasattr(sys, 'setswitchinterval'):
+            old_interval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-6)
+            restore = lambda: sys.setswitchinterval(old_interval)
+        else:
+            old_interval = sys.getcheckinterval()
+            sys.setcheckinterval(1)
+            restore = lambda: sys.setcheckinterval(old_interval)
+        try:
+            writers = [threading.Thread(target=writer, args=(idx,))
+                       for idx in range(n_writers)]
+            cons = threading.Thread(target=consumer)
+            cons.start()
+            for th in writers:
+                th.start()
+            for th in writers:
+                th.join()
+            writers_done.set()
+            cons.join()
+        finally:
+            restore()
+
+        expected = set(
+            (objects[i % len(objects)], 'attr_%s_%s' % (idx, i % n_attrs))
+            for idx in range(n_writers) for i in range(n_changes))
+        self.assertEqual(n_writers * n_changes, len(expected))
+        self.assertEqual(len(expected), len(received))
+        self.assertEqual(expected, received)
+
+    @staticmethod
+    def _collect(objects, received):
+        if not objects:
+            return
+        for obj, attrs in objects[Obj].items():
+            for attr in attrs:
+                received.add((obj, attr))
+
+    def test_per_thread_buffers_merged(self):
+        buf = ChangeBuffer()
+        obj = Obj()
+        buf.add(Obj, obj, 'a')
+        th = threading.Thread(target=buf.add, args=(Obj, obj, 'b'))
+        th.start()
+        th.join()
+        self.assertEqual({Obj: {obj: frozenset(['a', 'b'])}}, buf.swap())
+        self.assertIsNone(buf.swap())
+
+
+class Test_AttributeIndex(unittest.TestCase):
+
+    def test_bits(self):
+        index = AttributeIndex(['a', 'b'])
+        self.assertEqual(1, index.bit('a'))
+        self.assertEqual(2, index.bit('b'))
+        # unknown attributes get the next bit:
+        self.assertEqual(4, index.bit('c'))
+        self.assertEqual(3, len(index))
+        self.assertEqual(frozenset(['a', 'c']), index.names(5))
+        self.assertEqual(frozenset(), index.names(0))
+
+    def test_types_infos(self):
+        infos = types_infos[Service]
+        index = infos.attributes_index
+        self.assertEqual(len(infos.accepted_properties), len(index))
+        # the check results only change small masks:
+        for attr in ('state', 'output', 'last_chk', 'next_chk', 'latency'):
+            self.assertLess(index.bit(attr), 1 << 62)
+
+
+class Test_UnwrittenUpdates(unittest.TestCase):
+
+    def test_merge_and_take(self):
+        unwritten = UnwrittenUpdates()
+        obj1, obj2 = Obj(), Obj()
+        unwritten.merge({Obj: {obj1: frozenset(['a'])}})
+        unwritten.merge(None)
+        unwritten.merge({Obj: {obj1: frozenset(['b']), obj2: frozenset(['c'])}})
+        self.assertEqual(2, len(unwritten))
+        self.assertEqual({Obj: {obj1: frozenset(['a', 'b']),
+                                obj2: frozenset(['c'])}},
+                         unwritten.take())
+        self.assertEqual(0, len(unwritten))
+        self.assertEqual({}, unwritten.take())
+
+    def test_deleted_objects_not_kept(self):
+        unwritten = UnwrittenUpdates()
+        obj1, obj2 = Obj(), Obj()
+        ref = weakref.ref(obj2)
+        unwritten.merge({Obj: {obj1: frozenset(['a']), obj2: frozenset(['a'])}})
+        del obj2
+        self.assertIsNone(ref())
+        self.assertEqual({Obj: {obj1: frozenset(['a'])}}, unwritten.take())
+        obj3 = Obj()
+        unwritten.merge({Obj: {obj3: frozenset(['a'])}})
+        del obj3
+        unwritten.purge()
+        self.assertEqual(0, len(unwritten))
+
+    def test_eviction(self):
+        unwritten = UnwrittenUpdates(2)
+        objs = [Obj() for _ in range(3)]
+        unwritten.merge({Obj: {objs[0]: frozenset(['a'])}})
+        unwritten.merge({Obj: {objs[1]: frozenset(['a'])}})
+        # objs[0] is now the most recently updated:
+        unwritten.merge({Obj: {objs[0]: frozenset(['b'])}})
+        unwritten.merge({Obj: {objs[2]: frozenset(['a'])}})
+        self.assertEqual(1, unwritten.evicted)
+        self.assertEqual({Obj: {objs[0]: frozenset(['a', 'b']),
+                                objs[2]: frozenset(['a'])}},
+                         unwritten.take())
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from mod_mongo_live_config.change_buffer import (
+    ChangeBuffer,
+    split_objects_updates,
+)
+from mod_mongo_live_config.flush_scheduler import FlushScheduler
+
+from test_mongo_live_config import unittest
+
+
+class Obj(object):
+    pass
+
+
+class Test_FlushScheduler(unittest.TestCase):
+
+    def make_scheduler(self, flush_interval=0, max_latency=0, max_pending=0):
+        self.changes = ChangeBuffer(max_pending)
+        return FlushScheduler(self.changes, flush_interval, max_latency, max_pending)
+
+    def test_nothing_to_flush(self):
+        scheduler = self.make_scheduler()
+        t0 = time.time()
+        self.assertFalse(scheduler.wait(0.05))
+        self.assertGreaterEqual(time.time() - t0, 0.04)
+
+    def test_max_latency(self):
+        scheduler = self.make_scheduler(max_latency=0.05)
+        t0 = time.time()
+        self.changes.add(Obj, Obj(), 'attr')
+        self.assertTrue(scheduler.wait(5))
+        self.assertGreaterEqual(time.time() - t0, 0.04)
+        self.assertLess(time.time() - t0, 1)
+
+    def test_flush_interval(self):
+        scheduler = self.make_scheduler(flush_interval=0.2)
+        scheduler.flushed()
+        t0 = time.time()
+        self.changes.add(Obj, Obj(), 'attr')
+        self.assertFalse(scheduler.wait(0.05))
+        self.assertTrue(scheduler.wait(5))
+        self.assertGreaterEqual(time.time() - t0, 0.19)
+
+    def test_max_pending(self):
+        scheduler = self.make_scheduler(flush_interval=60, max_latency=60,
+                                        max_pending=3)
+        scheduler.flushed()
+        for _ in range(2):
+            self.changes.add(Obj, Obj(), 'attr')
+        self.assertFalse(scheduler.wait(0.05))
+        self.changes.add(Obj, Obj(), 'attr')
+        t0 = time.time()
+        self.assertTrue(scheduler.wait(5))
+        self.assertLess(time.time() - t0, 1)
+        self.changes.swap()
+        scheduler.flushed()
+        self.assertIsNone(scheduler.next_flush_time())
+
+    def test_max_pending_without_first_change_time(self):
+        scheduler = self.make_scheduler(flush_interval=60, max_latency=60,
+                                        max_pending=3)
+        scheduler.flushed()
+        for _ in range(3):
+            self.changes.add(Obj, Obj(), 'attr')
+        self.changes.first_change_time = None
+        self.assertTrue(scheduler.wait(5))
+
+    def test_stop(self):
+        scheduler = self.make_scheduler(max_latency=60)
+        self.changes.add(Obj, Obj(), 'attr')
+        stopper = threading.Timer(0.05, scheduler.stop)
+        stopper.start()
+        t0 = time.time()
+        self.assertFalse(scheduler.wait(5))
+        self.assertLess(time.time() - t0, 1)
+        self.assertFalse(scheduler.wait(5))  # stays stopped
+        stopper.join()
+
+    def test_split_objects_updates(self):
+        changes = ChangeBuffer()
+        objs = [Obj() for _ in range(5)]
+        for obj in objs:
+            changes.add(Obj, obj, 'attr')
+        chunks = list(split_objects_updates(changes.swap(), 2))
+        self.assertEqual([2, 2, 1], [len(chunk[Obj]) for chunk in chunks])
+        self.assertEqual(set(objs),
+                         set(obj for chunk in chunks for obj in chunk[Obj]))
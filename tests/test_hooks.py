@@ -0,0 +1,71 @@
+from alignak.objects.host import Host
+from alignak.objects.service import Service
+
+from mod_mongo_live_config import hooks
+from mod_mongo_live_config.monitored_mutable import Monitored_List
+
+from test_mongo_live_config import unittest
+
+
+class RecordingMonitor(object):
+    def __init__(self):
+        self.retained = []
+
+    def retain(self, cls, obj, attr, value):
+        self.retained.append((cls, obj, attr))
+
+
+class Test_Hooks(unittest.TestCase):
+
+    mode = 'global'
+
+    def setUp(self):
+        self.monitor = RecordingMonitor()
+        hooks.install_hooks(self.monitor, self.mode)
+
+    def tearDown(self):
+        hooks.uninstall_hooks()
+
+    def test_scalar_changes(self):
+        host = Host()
+        del self.monitor.retained[:]
+
+        host.host_name = "bla"
+        host.host_name = "bla"  # same value: not retained again
+        host.not_a_property = 42
+        self.assertEqual([(Host, host, 'host_name')], self.monitor.retained)
+
+    def test_mutable_values_get_monitored(self):
+        srv = Service()
+        del self.monitor.retained[:]
+
+        srv.impacts = []
+        self.assertIsInstance(srv.impacts, Monitored_List)
+        srv.impacts.append(42)
+        self.assertEqual([(Service, srv, 'impacts')] * 2, self.monitor.retained)
+
+    def test_uninstall(self):
+        hooks.uninstall_hooks()
+        host = Host()
+        host.host_name = "bla"
+        self.assertEqual([], self.monitor.retained)
+
+
+class Test_Class_Hooks(Test_Hooks):
+
+    mode = 'per_class'
+
+    def test_accepted_properties_are_frozen(self):
+        accepted = Host.__setattr__.accepted_properties
+        self.assertIsInstance(accepted, frozenset)
+        self.assertIn('host_name', accepted)
+
+    def test_native_reads(self):
+        # no descriptor: the attributes are read without any python call
+        self.assertNotIsInstance(vars(Host)['state'], property)
+
+
+class Test_Invalid_Hook_Mode(unittest.TestCase):
+
+    def test_invalid_mode(self):
+        self.assertRaises(ValueError, hooks.install_hooks, RecordingMonitor(), 'foo')
@@ -0,0 +1,20 @@
+from mod_mongo_live_config.indexes import parse_extra_indexes
+
+from test_mongo_live_config import unittest
+
+
+class Test_Parse_Extra_Indexes(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertEqual({}, parse_extra_indexes(''))
+
+    def test_parse(self):
+        self.assertEqual(
+            {
+                None: [('state',), ('realm',)],
+                'services': [('host_name', 'state')],
+            },
+            parse_extra_indexes(' state,realm , services:host_name + state,'))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, parse_extra_indexes, 'services:state+')
@@ -0,0 +1,121 @@
+import mock
+
+from alignak.objects.host import Host
+
+from mod_mongo_live_config.backends import WriteCounts
+from mod_mongo_live_config.change_buffer import ChangeBuffer
+from mod_mongo_live_config.live_config import ObjectsUpdates
+from mod_mongo_live_config.metrics import Metrics, format_summary
+
+import test_mongo_live_config
+from test_mongo_live_config import unittest, make_module_instance
+
+
+class Obj(object):
+    pass
+
+
+class Test_Metrics(unittest.TestCase):
+
+    def make_updates(self, attribute_counts):
+        updates = ObjectsUpdates()
+        updates.attribute_counts = attribute_counts
+        updates.n_objects = 2
+        updates.n_attributes = 3
+        return updates
+
+    def test_stats(self):
+        changes = ChangeBuffer()
+        metrics = Metrics(changes)
+        objs = [Obj(), Obj()]
+        for obj in objs:
+            changes.add(Obj, obj, 'state')
+        with mock.patch('mod_mongo_live_config.metrics.statsmgr') as statsmgr:
+            metrics.taken(changes.swap(), 0.5)
+            metrics.flushed(self.make_updates({}), 0.1, 0.2,
+                            WriteCounts(matched=2, modified=1))
+            changes.add(Obj, objs[0], 'output')
+            changes.add(Host, Host(), 'output')
+            changes.add(Obj, objs[0], 'state')
+            metrics.summary()
+            metrics.taken(changes.swap(), 0.25)
+        self.assertEqual([
+            mock.call('mongo_live_config.queue_time', 0.5),
+            mock.call('mongo_live_config.intercepted', 2),
+            mock.call('mongo_live_config.flush.sanitize', 0.1),
+            mock.call('mongo_live_config.flush.write', 0.2),
+            mock.call('mongo_live_config.writes.matched', 2),
+            mock.call('mongo_live_config.writes.modified', 1),
+            mock.call('mongo_live_config.pending.Host', 1),
+            mock.call('mongo_live_config.pending.Obj', 1),
+            mock.call('mongo_live_config.queue_time', 0.25),
+            mock.call('mongo_live_config.intercepted', 3),
+        ], statsmgr.incr.call_args_list)
+
+    def test_summary(self):
+        changes = ChangeBuffer()
+        metrics = Metrics(changes, top_attributes=2)
+        objs = [Obj(), Obj()]
+        for obj in objs:
+            changes.add(Obj, obj, 'state')
+        changes.add(Obj, objs[0], 'output')
+
+        metrics.taken(changes.swap(), 0.5)
+        metrics.batch_written(2)
+        metrics.flushed(self.make_updates({'hosts': {'state': 2, 'output': 1},
+                                           'services': {'latency': 5}}),
+                        0.1, 0.2, WriteCounts(matched=2, modified=1))
+        changes.add(Obj, objs[1], 'output')
+
+        summary = metrics.summary()
+        self.assertEqual(4, summary['intercepted'])
+        self.assertEqual(1, summary['pending'])
+        self.assertEqual({'Obj': 1}, summary['pending_by_type'])
+        self.assertEqual(1, summary['flushes'])
+        self.assertEqual({'Obj': 2}, summary['objects_taken'])
+        self.assertEqual(0.5, summary['queue_time_max'])
+        self.assertEqual((2, 3), (summary['objects'], summary['attributes']))
+        self.assertEqual((1, 2.0), (summary['batches'], summary['batch_size_avg']))
+        self.assertEqual(dict(matched=2, modified=1, upserted=0, inserted=0,
+                              removed=0),
+                         summary['write_counts'])
+        self.assertEqual([('services.latency', 5), ('hosts.state', 2)],
+                         summary['top_attributes'])
+        self.assertIn('top attributes: services.latency=5 hosts.state=2',
+                      format_summary(summary))
+        self.assertIn('objects pending: Obj=1,', format_summary(summary))
+
+        # a new period:
+        summary = metrics.summary()
+        self.assertEqual((0, 0, []), (summary['intercepted'], summary['flushes'],
+                                      summary['top_attributes']))
+
+
+class Test_Module_Metrics(unittest.TestCase):
+
+    def test_updates(self):
+        mod = make_module_instance()
+        arbiter = test_mongo_live_config.SimpleTest.make_arbiter()
+        arbiter.conf.hosts.append(Host({'host_name': 'host0'}))
+        mod.do_insert(arbiter)
+        mod.hook_pre_scheduler_mod_start(None, start_thread=False)
+        try:
+            mod.test_and_get_objects_updates()
+            mod.metrics.summary()
+            host = arbiter.conf.hosts[0]
+            host.output = 'all is fine'
+            host.output = 'still fine'
+            host.perf_data = 'rta=1ms'
+            mod.do_updates(mod.test_and_get_objects_updates())
+        finally:
+            mod.quit()
+        summary = mod.metrics.summary()
+        self.assertEqual(3, summary['intercepted'])
+        self.assertEqual({'Host': 1}, summary['objects_taken'])
+        self.assertEqual((1, 2), (summary['objects'], summary['attributes']))
+        self.assertEqual(1, summary['batches'])
+        self.assertIn(('hosts.output', 1), summary['top_attributes'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,7 +13,7 @@ from alignak.objects.host import Host
 
 import mod_mongo_live_config
 import mod_mongo_live_config.live_config
-from mod_mongo_live_config.default import DEFAULT_DATABASE_NAME
+from mod_mongo_live_config.indexes import ensure_indexes, parse_extra_indexes
 
 from setup_mongo import MongoServerInstance
 
@@ -23,6 +23,14 @@ dictconf = dict(
 )
 
 
+def make_module_instance(**kw):
+    """ Return a module instance of dictconf updated by 'kw', using the
+    memory backend unless told otherwise. """
+    dconf = dict(dictconf, module_alias='live', backend='memory')
+    dconf.update(kw)
+    return mod_mongo_live_config.get_instance(alignak.objects.module.Module(dconf))
+
+
 class NameSpace(object):
     pass
 
@@ -74,22 +82,40 @@ class SimpleTest(unittest.TestCase):
         self.assertIn('host_name', objects[Host][host],
                       'host_name should be present in the host modified keys')
 
-        conn = mod._connect_to_mongo()
-        db = conn[DEFAULT_DATABASE_NAME]
+        db = self.get_db(mod)
         hosts_collection = db['hosts']
         result = hosts_collection.find_one(dict(host_name="bla"))
         self.assertFalse(result)
 
         # this is all the job :
-        mod.do_updates(db, objects)
+        mod.do_updates(objects)
 
         result = hosts_collection.find_one(dict(host_name="bla"))
         self.assertTrue(result)
         del result['_id']
         self.assertEqual(dict(host_name='bla', alias='alias'), result)
 
-    def test_insert(self):
-        mod = self.module_instance
+    @staticmethod
+    def get_db(mod):
+        mod._backend.connect()
+        return mod._backend.db
+
+    def test_indexes(self):
+        db = self.get_db(self.module_instance)
+        extra = parse_extra_indexes('state, services:host_name+state')
+        self.assertTrue(ensure_indexes(self.module_instance._backend, extra))
+        keys = dict((tuple(infos['key']), infos.get('unique', False))
+                    for infos in db['services'].index_information().values())
+        self.assertTrue(keys[(('host_name', 1), ('service_description', 1))])
+        self.assertFalse(keys[(('state', 1),)])
+        self.assertFalse(keys[(('host_name', 1), ('state', 1))])
+        keys = [tuple(infos['key'])
+                for infos in db['hosts'].index_information().values()]
+        self.assertIn((('host_name', 1),), keys)
+        self.assertNotIn((('host_name', 1), ('state', 1)), keys)
+
+    @staticmethod
+    def make_arbiter():
         arbiter = NameSpace()
         conf = arbiter.conf = NameSpace()
         conf.get_name = lambda: "the-conf"
@@ -101,6 +127,12 @@ class SimpleTest(unittest.TestCase):
                 continue
             objects = []
             setattr(conf, infos.plural, objects)
+        return arbiter
+
+    def test_insert(self):
+        mod = self.module_instance
+        arbiter = self.make_arbiter()
+        conf = arbiter.conf
 
         # insert at least one host :
         conf.hosts.append(Host({
@@ -109,8 +141,7 @@ class SimpleTest(unittest.TestCase):
 
         mod.do_insert(arbiter)
 
-        conn = mod._connect_to_mongo()
-        db = conn[DEFAULT_DATABASE_NAME]
+        db = self.get_db(mod)
         hosts_collection = db['hosts']
 
         result = hosts_collection.find_one(dict(host_name="test_host"))
@@ -119,6 +150,63 @@ class SimpleTest(unittest.TestCase):
         del result['_id']
         self.assertEqual(expected, result)
 
+    def make_module_instance(self, **kw):
+        dconf = dictconf.copy()
+        dconf['port'] = self.mongo.mongo_port
+        dconf.update(kw)
+        return mod_mongo_live_config.get_instance(alignak.objects.module.Module(dconf))
+
+    def test_insert_incremental(self):
+        mod = self.make_module_instance(dump_mode='incremental')
+        arbiter = self.make_arbiter()
+        for name in ('host1', 'host2', 'host3'):
+            arbiter.conf.hosts.append(Host({'host_name': name}))
+        mod.do_insert(arbiter)
+
+        hosts_collection = self.get_db(mod)['hosts']
+        before = dict((doc['host_name'], doc)
+                      for doc in hosts_collection.find())
+        self.assertEqual(3, len(before))
+
+        arbiter.conf.hosts.pop()
+        arbiter.conf.hosts[0].alias = 'changed'
+        mod.do_insert(arbiter)
+
+        after = dict((doc['host_name'], doc)
+                     for doc in hosts_collection.find())
+        self.assertEqual(['host1', 'host2'], sorted(after))
+        self.assertEqual('changed', after['host1']['alias'])
+        self.assertNotEqual(before['host1']['_fingerprint'],
+                            after['host1']['_fingerprint'])
+        self.assertEqual(before['host2'], after['host2'])
+
+    def test_insert_parallel(self):
+        mod = self.make_module_instance(dump_workers='4', dump_processes='2')
+        arbiter = self.make_arbiter()
+        for idx in range(1200):  # more than one chunk for the processes
+            arbiter.conf.hosts.append(Host({'host_name': 'host%s' % idx}))
+        mod.do_insert(arbiter)
+
+        hosts_collection = self.get_db(mod)['hosts']
+        self.assertEqual(1200, hosts_collection.count())
+        self.assertTrue(hosts_collection.find_one(dict(host_name='host1199')))
+
+    def test_insert_swap(self):
+        mod = self.make_module_instance(dump_mode='swap')
+        arbiter = self.make_arbiter()
+        arbiter.conf.hosts.append(Host({'host_name': 'host1'}))
+        mod.do_insert(arbiter)
+        arbiter.conf.hosts[0].alias = 'changed'
+        mod.do_insert(arbiter)
+
+        db = self.get_db(mod)
+        docs = list(db['hosts'].find())
+        self.assertEqual(1, len(docs))
+        self.assertEqual('changed', docs[0]['alias'])
+        self.assertNotIn('hosts__next', db.collection_names())
+        self.assertIn([('host_name', 1)],
+                      [infos['key'] for infos in db['hosts'].index_information().values()])
+
     # TODO: continue
 
 
@@ -0,0 +1,41 @@
+import bson
+
+from mod_mongo_live_config.batching import document_size
+from mod_mongo_live_config.raw_documents import (
+    RAW_DOCUMENTS_SUPPORTED,
+    encode_document,
+    raw_document,
+)
+
+from test_mongo_live_config import unittest, make_module_instance
+
+
+@unittest.skipUnless(RAW_DOCUMENTS_SUPPORTED, "requires pymongo >= 3.2")
+class Test_Raw_Documents(unittest.TestCase):
+
+    def test_encode(self):
+        dobj = {'host_name': 'h1', 'impacts': ['s1', 's2'], 'state_id': 2}
+        data = encode_document(dobj)
+        self.assertEqual(dobj, bson.BSON(data).decode())
+        raw = raw_document(data)
+        self.assertEqual(data, raw.raw)
+        self.assertEqual('h1', raw['host_name'])
+        self.assertEqual(len(data), document_size(({'host_name': 'h1'}, raw)))
+        self.assertEqual(len(data), document_size(({'host_name': 'h1'}, dobj)))
+
+    def make_module_instance(self, **kw):
+        conf = dict(backend='mongo', raw_documents='1', dump_processes='2')
+        conf.update(kw)
+        return make_module_instance(**conf)
+
+    def test_module_conf(self):
+        self.assertTrue(self.make_module_instance()._raw_documents)
+        self.assertTrue(self.make_module_instance(dump_mode='swap')._raw_documents)
+        self.assertRaises(ValueError, self.make_module_instance, backend='memory')
+        self.assertRaises(ValueError, self.make_module_instance,
+                          dump_mode='incremental')
+        self.assertRaises(ValueError, self.make_module_instance, dump_processes='0')
+
+
+if __name__ == '__main__':
+    unittest.main()
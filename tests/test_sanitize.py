@@ -0,0 +1,53 @@
+from alignak.objects.host import Host
+
+from mod_mongo_live_config.monitored_mutable import Monitored_List, Monitored_Set
+from mod_mongo_live_config.sanitize import (
+    types_infos,
+    compile_sanitizer,
+    sanitize_value,
+)
+
+from test_mongo_live_config import unittest
+
+
+class Test_Sanitizers(unittest.TestCase):
+
+    def test_compiled_for_accepted_properties(self):
+        infos = types_infos[Host]
+        self.assertEqual(set(infos.accepted_properties), set(infos.sanitizers))
+
+    def test_converter(self):
+        sanitizer = compile_sanitizer(Host, 'use')
+        self.assertEqual([], sanitizer(None))
+        self.assertEqual(['tpl'], sanitizer(['tpl']))
+
+    def test_values(self):
+        host = Host({'host_name': 'bla'})
+        sanitizer = compile_sanitizer(Host, 'impacts')
+        self.assertEqual(42, sanitizer(42))
+        self.assertEqual(('a',), sanitizer(frozenset(['a'])))
+        self.assertEqual(['bla', 1], sanitizer([host, 1]))
+        primitives = [1, 'a', None]
+        sanitized = sanitizer(primitives)
+        self.assertEqual(primitives, sanitized)
+        primitives.append(2)
+        self.assertEqual([1, 'a', None], sanitized)
+        primitives = (1, 'a')
+        self.assertIs(primitives, sanitizer(primitives))
+
+    def test_monitored_values(self):
+        host = Host({'host_name': 'bla'})
+        value = Monitored_List([host, 2], monitor=None, object=host, attr='impacts')
+        sanitized = sanitize_value(Host, host, 'impacts', value)
+        self.assertIs(list, type(sanitized))
+        self.assertEqual(['bla', 2], sanitized)
+        value = Monitored_Set([2], monitor=None, object=host, attr='impacts')
+        self.assertEqual((2,), sanitize_value(Host, host, 'impacts', value))
+
+    def test_dump_plan(self):
+        plan = types_infos[Host].dump_plan
+        attrs = [attr for attr, _, _ in plan.attributes]
+        self.assertEqual(sorted(types_infos[Host].accepted_properties), attrs)
+        defaults = dict((attr, default) for attr, default, _ in plan.attributes)
+        self.assertEqual([], defaults['use']())
+        self.assertIsNone(defaults['host_name'])
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+
+from mod_mongo_live_config.spool import Spool
+
+from test_mongo_live_config import unittest
+
+
+def make_updates(first, number, collection='hosts'):
+    return [(collection, [({'host_name': 'h%s' % idx}, {'state': 'UP', 'idx': idx})
+                          for idx in range(first, first + number)])]
+
+
+class Test_Spool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='spool')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def replayed(self, spool):
+        res = []
+        spool.replay(res.extend)
+        return res
+
+    def test_replay_in_order(self):
+        spool = Spool(self.directory, 1 << 20, 100)
+        spool.append(make_updates(0, 10))
+        spool.append(make_updates(10, 10, 'services'))
+        spool.append([])
+        self.assertGreater(len(spool), 1)
+        res = self.replayed(spool)
+        self.assertEqual(
+            [('hosts', make_updates(0, 10)[0][1]),
+             ('services', make_updates(10, 10)[0][1])],
+            res)
+        self.assertEqual(0, len(spool))
+        self.assertEqual([], os.listdir(self.directory))
+        self.assertEqual([], self.replayed(spool))
+
+    def test_replayed_by_next_run(self):
+        spool = Spool(self.directory, 1 << 20, 1 << 20)
+        spool.append(make_updates(0, 5))
+        spool.close()
+        spool = Spool(self.directory, 1 << 20, 1 << 20)
+        self.assertEqual(1, len(spool))
+        spool.append(make_updates(5, 5))
+        self.assertEqual([('hosts', make_updates(0, 5)[0][1]),
+                          ('hosts', make_updates(5, 5)[0][1])],
+                         self.replayed(spool))
+
+    def test_replay_interrupted(self):
+        spool = Spool(self.directory, 1 << 20, 1 << 20)
+        spool.append(make_updates(0, 5))
+
+        def failing_write(collections):
+            raise IOError('mongo is away')
+
+        with self.assertRaises(IOError):
+            spool.replay(failing_write)
+        self.assertEqual(1, len(spool))
+        self.assertEqual([('hosts', make_updates(0, 5)[0][1])],
+                         self.replayed(spool))
+
+    def test_quarantine(self):
+        spool = Spool(self.directory, 1 << 20, 100)
+        spool.append(make_updates(0, 10))
+        spool.append(make_updates(10, 10))
+        n_segments = len(spool)
+        path = spool.quarantine()
+        self.assertTrue(path.endswith('.bad'))
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(n_segments - 1, len(spool))
+        self.assertEqual([('hosts', make_updates(10, 10)[0][1])], self.replayed(spool))
+        # not replayed by a next run either:
+        self.assertEqual(0, len(Spool(self.directory, 1 << 20, 100)))
+
+    def test_oldest_segments_evicted(self):
+        spool = Spool(self.directory, 3000, 1000)
+        for idx in range(10):
+            spool.append(make_updates(idx * 10, 10))
+        self.assertGreater(spool.evicted, 0)
+        self.assertLessEqual(spool.size(), 3000 + 1000)
+        res = self.replayed(spool)
+        # the most recent updates are kept:
+        self.assertEqual(make_updates(90, 10)[0][1], res[-1][1])
+
+    def test_truncated_segment(self):
+        spool = Spool(self.directory, 1 << 20, 1 << 20)
+        spool.append(make_updates(0, 5))
+        spool.append(make_updates(5, 5))
+        spool.close()
+        path = os.path.join(self.directory, os.listdir(self.directory)[0])
+        with open(path, 'r+b') as fh:
+            fh.truncate(os.path.getsize(path) - 10)
+        spool = Spool(self.directory, 1 << 20, 1 << 20)
+        self.assertEqual([('hosts', make_updates(0, 5)[0][1])],
+                         self.replayed(spool))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+from alignak.objects.host import Host
+from alignak.objects.service import Service
+
+from mod_mongo_live_config.backends.memory import MemoryBackend
+from mod_mongo_live_config.summaries import Summaries, counted_fields, service_groups
+
+import test_mongo_live_config
+from test_mongo_live_config import unittest, make_module_instance
+
+
+def make_service(host_name, description, state='OK'):
+    srv = Service({'host_name': host_name, 'service_description': description})
+    srv.state = state
+    srv.state_type = 'HARD'
+    srv.problem_has_been_acknowledged = False
+    srv.in_scheduled_downtime = False
+    return srv
+
+
+class Test_Summaries(unittest.TestCase):
+
+    def test_counted_fields(self):
+        self.assertEqual(['services', 'state.CRITICAL', 'state_type.SOFT',
+                          'problem_has_been_acknowledged'],
+                         counted_fields(('CRITICAL', 'SOFT', True, False)))
+        self.assertEqual(['services', 'state.a_b'],
+                         counted_fields(('a.b', None, None, None)))
+
+    def test_service_groups(self):
+        srv = make_service('h1', 's1')
+        self.assertEqual([('all', ''), ('host', 'h1')], service_groups(srv))
+        srv.host = Host({'host_name': 'h1'})
+        srv.host.realm = 'r1'
+        srv.host.hostgroups = ['hg1', 'hg2']
+        self.assertEqual([('all', ''), ('host', 'h1'), ('realm', 'r1'),
+                          ('hostgroup', 'hg1'), ('hostgroup', 'hg2')],
+                         service_groups(srv))
+
+    def test_build(self):
+        services = [make_service('h1', 's1'), make_service('h1', 's2', 'CRITICAL'),
+                    make_service('h2', 's1')]
+        services[1].problem_has_been_acknowledged = True
+        summaries = dict(((key['group'], key['name']), dobj)
+                         for key, dobj in Summaries('summaries').build(services))
+        self.assertEqual({'group': 'host', 'name': 'h1', 'services': 2,
+                          'state': {'OK': 1, 'CRITICAL': 1}, 'state_type': {'HARD': 2},
+                          'problem_has_been_acknowledged': 1},
+                         summaries[('host', 'h1')])
+        self.assertEqual(3, summaries[('all', '')]['services'])
+        self.assertEqual({'OK': 2, 'CRITICAL': 1}, summaries[('all', '')]['state'])
+
+    def test_increments(self):
+        backend = MemoryBackend()
+        srv1, srv2 = make_service('h1', 's1'), make_service('h1', 's2')
+        backend.upsert('services', [
+            ({'host_name': 'h1', 'service_description': 's1'},
+             {'host_name': 'h1', 'service_description': 's1', 'state': 'WARNING',
+              'state_type': 'HARD', 'problem_has_been_acknowledged': False,
+              'in_scheduled_downtime': False})])
+        summaries = Summaries('summaries')
+        summaries.ensure(backend)
+        # srv1 was WARNING in the services collection, srv2 isn't there:
+        increments, counted = summaries.increments([srv1, srv2])
+        increments = dict(((key['group'], key['name']), deltas)
+                          for key, deltas in increments)
+        self.assertEqual({'state.WARNING': -1, 'state.OK': 2, 'services': 1,
+                          'state_type.HARD': 1}, increments[('host', 'h1')])
+        summaries.commit(counted)
+
+        srv1.state = 'CRITICAL'
+        srv1.in_scheduled_downtime = True
+        increments, counted = summaries.increments([srv1, srv2])
+        self.assertEqual([({'group': 'all', 'name': ''},
+                           {'state.OK': -1, 'state.CRITICAL': 1,
+                            'in_scheduled_downtime': 1})],
+                         [(key, deltas) for key, deltas in increments
+                          if key['group'] == 'all'])
+        self.assertEqual([('h1', 's1')], [key for key, _ in counted])
+
+        # not committed (not written), so counted again:
+        self.assertEqual(2, len(summaries.increments([srv1])[0]))
+
+    def test_increments_reloaded(self):
+        summaries = Summaries('summaries')
+        summaries.ensure(MemoryBackend())
+        srv = make_service('h1', 's1')
+        increments, counted = summaries.increments([srv])
+        self.assertEqual(1, dict((key['group'], deltas)
+                                 for key, deltas in increments)['all']['services'])
+        summaries.commit(counted)
+        # the object of a reloaded configuration, for the same service:
+        srv = make_service('h1', 's1')
+        self.assertEqual([], summaries.increments([srv])[0])
+        srv.state = 'CRITICAL'
+        increments, counted = summaries.increments([srv])
+        self.assertEqual([({'group': 'all', 'name': ''},
+                           {'state.OK': -1, 'state.CRITICAL': 1})],
+                         [(key, deltas) for key, deltas in increments
+                          if key['group'] == 'all'])
+
+
+class Test_Module_Summaries(unittest.TestCase):
+
+    def make_arbiter(self):
+        arbiter = test_mongo_live_config.SimpleTest.make_arbiter()
+        for idx in range(3):
+            arbiter.conf.services.append(
+                make_service('host%s' % (idx % 2), 'srv%s' % idx))
+        return arbiter
+
+    def summaries(self, mod):
+        return dict(((doc['group'], doc['name']), doc)
+                    for doc in mod._backend.documents('summaries'))
+
+    def check_updates(self, **kw):
+        mod = make_module_instance(summaries='summaries', **kw)
+        arbiter = self.make_arbiter()
+        mod.do_insert(arbiter)
+        summaries = self.summaries(mod)
+        self.assertEqual(3, summaries[('all', '')]['services'])
+        self.assertEqual({'OK': 2}, summaries[('host', 'host0')]['state'])
+        self.assertIn((('group', 'name'), True),
+                      mod._backend.collections['summaries'].indexes)
+
+        mod.hook_pre_scheduler_mod_start(None, start_thread=False)
+        try:
+            mod.test_and_get_objects_updates()
+            srv = arbiter.conf.services[0]
+            srv.state = 'CRITICAL'
+            srv.output = 'down'
+            arbiter.conf.services[1].output = 'unrelated'
+            mod.do_updates(mod.test_and_get_objects_updates())
+            summaries = self.summaries(mod)
+            self.assertEqual({'OK': 1, 'CRITICAL': 1},
+                             summaries[('host', 'host0')]['state'])
+            self.assertEqual({'OK': 2, 'CRITICAL': 1}, summaries[('all', '')]['state'])
+            self.assertEqual({'OK': 1}, summaries[('host', 'host1')]['state'])
+
+            srv.state = 'OK'
+            srv.problem_has_been_acknowledged = True
+            mod.do_updates(mod.test_and_get_objects_updates())
+        finally:
+            mod.quit()
+        summaries = self.summaries(mod)
+        self.assertEqual({'OK': 2, 'CRITICAL': 0}, summaries[('host', 'host0')]['state'])
+        self.assertEqual(1, summaries[('all', '')]['problem_has_been_acknowledged'])
+        self.assertEqual(3, summaries[('all', '')]['services'])
+
+    def test_updates(self):
+        self.check_updates()
+
+    def test_updates_swap(self):
+        self.check_updates(dump_mode='swap')
@@ -0,0 +1,86 @@
+from alignak.objects.host import Host
+from alignak.objects.service import Service
+
+from mod_mongo_live_config.change_buffer import ChangeBuffer
+from mod_mongo_live_config.flush_scheduler import FlushScheduler
+from mod_mongo_live_config.throttle import Throttle, parse_throttle
+
+from test_mongo_live_config import unittest
+
+
+class Test_Parse_Throttle(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual({}, parse_throttle(''))
+        self.assertEqual(
+            {None: {'next_chk': 30, 'last_chk': 10},
+             'services': {'latency': 60.5}},
+            parse_throttle(' next_chk=30, last_chk=10,services:latency=60.5 ,'))
+
+    def test_invalid(self):
+        for value in ('next_chk', 'next_chk=', '=30', 'next_chk=abc',
+                      'next_chk=-1'):
+            with self.assertRaises(ValueError):
+                parse_throttle(value)
+
+    def test_unknown_collection(self):
+        with self.assertRaises(ValueError):
+            Throttle(parse_throttle('foos:bar=1'))
+
+
+class Test_Throttle(unittest.TestCase):
+
+    def setUp(self):
+        self.throttle = Throttle(parse_throttle('next_chk=30, services:latency=60'))
+        self.host = Host({'host_name': 'h1'})
+        self.srv = Service({'host_name': 'h1', 'service_description': 's1'})
+
+    def test_first_write_not_deferred(self):
+        objects = {Host: {self.host: frozenset(['next_chk'])}}
+        self.assertEqual({Host: {self.host: frozenset(['next_chk'])}},
+                         self.throttle.apply(objects, 1000))
+        self.assertIsNone(self.throttle.next_due)
+
+    def test_deferred_then_due(self):
+        self.throttle.apply({Host: {self.host: frozenset(['next_chk'])}}, 1000)
+        self.assertEqual({}, self.throttle.apply(
+            {Host: {self.host: frozenset(['next_chk'])}}, 1010))
+        self.assertEqual(1030, self.throttle.next_due)
+        self.assertEqual({}, self.throttle.apply(None, 1029))
+        self.assertEqual({Host: {self.host: set(['next_chk'])}},
+                         self.throttle.apply(None, 1030))
+        self.assertIsNone(self.throttle.next_due)
+        # it has just been written:
+        self.assertEqual({}, self.throttle.apply(
+            {Host: {self.host: frozenset(['next_chk'])}}, 1040))
+
+    def test_coalesced(self):
+        self.throttle.apply({Host: {self.host: frozenset(['next_chk'])}}, 1000)
+        self.throttle.apply({Host: {self.host: frozenset(['next_chk'])}}, 1010)
+        # a state change goes out at once, with the deferred attribute:
+        self.assertEqual({Host: {self.host: set(['next_chk', 'state'])}},
+                         self.throttle.apply(
+                             {Host: {self.host: frozenset(['state'])}}, 1011))
+        # .. and so isn't due anymore:
+        self.assertEqual({}, self.throttle.apply(None, 1030))
+
+    def test_per_collection(self):
+        self.throttle.apply({Host: {self.host: frozenset(['latency'])},
+                             Service: {self.srv: frozenset(['latency'])}}, 1000)
+        self.assertEqual(
+            {Host: {self.host: frozenset(['latency'])}},
+            self.throttle.apply({Host: {self.host: frozenset(['latency'])},
+                                 Service: {self.srv: frozenset(['latency'])}}, 1001))
+
+    def test_scheduler_wakes_up_when_due(self):
+        changes = ChangeBuffer()
+        scheduler = FlushScheduler(changes, 60, 60, 0, self.throttle)
+        self.assertIsNone(scheduler.next_flush_time())
+        self.throttle.apply({Host: {self.host: frozenset(['next_chk'])}}, 1000)
+        self.throttle.apply({Host: {self.host: frozenset(['next_chk'])}}, 1001)
+        self.assertEqual(1030, scheduler.next_flush_time())
+        self.assertTrue(scheduler.wait(0.01))
+
+
+if __name__ == '__main__':
+    unittest.main()
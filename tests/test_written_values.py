@@ -0,0 +1,40 @@
+import gc
+
+from mod_mongo_live_config.written_values import WrittenValues, freeze
+
+from test_mongo_live_config import unittest
+
+
+class Obj(object):
+    pass
+
+
+class Test_WrittenValues(unittest.TestCase):
+
+    def test_freeze(self):
+        value = [1, {'a': [2, 3]}]
+        frozen = freeze(value)
+        value[1]['a'].append(4)
+        self.assertNotEqual(frozen, freeze(value))
+        value[1]['a'].pop()
+        self.assertEqual(frozen, freeze(value))
+        hash(frozen)
+
+    def test_is_unchanged(self):
+        written = WrittenValues()
+        obj = Obj()
+        value = freeze(['a', 'b'])
+        self.assertFalse(written.is_unchanged(obj, 'attr', value))
+        written.remember(obj, {'attr': value})
+        self.assertTrue(written.is_unchanged(obj, 'attr', freeze(['a', 'b'])))
+        self.assertFalse(written.is_unchanged(obj, 'attr', freeze(['a'])))
+        self.assertFalse(written.is_unchanged(obj, 'other', value))
+
+    def test_objects_are_weakly_referenced(self):
+        written = WrittenValues()
+        obj = Obj()
+        written.remember(obj, {'attr': ()})
+        self.assertEqual(1, len(written))
+        del obj
+        gc.collect()
+        self.assertEqual(0, len(written))